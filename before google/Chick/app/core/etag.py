@@ -0,0 +1,40 @@
+# app/core/etag.py
+"""
+讀取型 API 的 weak ETag / If-None-Match。
+
+用法（endpoint 裡，先算 ETag 再決定要不要跑查詢）：
+
+    etag = make_etag("me", state_version, today)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+"""
+from __future__ import annotations
+import hashlib
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """把會影響回應內容的東西串起來做成 weak ETag（W/"..."）。"""
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 用 weak comparison（忽略 W/ 前綴）。"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    target = _opaque(etag)
+    return any(_opaque(t) == target for t in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
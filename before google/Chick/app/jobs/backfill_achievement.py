@@ -0,0 +1,157 @@
+# app/jobs/backfill_achievement.py
+"""
+新上架一個成就之後，把「已經符合條件」的人一次補發（不用等他們下次運動）。
+
+    python -m app.jobs.backfill_achievement --code run_100km
+    python -m app.jobs.backfill_achievement --code run_100km --chunk-users 10000
+    python -m app.jobs.backfill_achievement --code run_100km --restart   # 進度歸零從頭再跑
+
+依 user_id 範圍一段一段做，每段一個 transaction：
+  1. 用 achievements.CONDITION_SQL 的條件 SQL 找出這段裡符合、還沒有這個成就的人
+  2. INSERT IGNORE 一次寫進 user_achievements（uq_user_achievement 擋重複）
+  3. 獎勵：金幣 add_ledger_entries、EXP award_exp_bulk，key 跟線上解鎖一樣是
+     achievement:{user_id}:{achievement_id}，線上同時解鎖也不會重複發
+  4. 進度（job_watermarks 的 achievement_backfill:{code}）跟結果一起 commit
+
+中斷後直接重跑會從上次 commit 的地方接著做；同一個成就同時跑兩份，第二份會在進度列上等。
+補發的 EXP 讓人升級的話，level 條件的成就等他下次活動時才會補上。
+"""
+from __future__ import annotations
+import argparse
+import time
+from datetime import datetime
+from sqlalchemy import exists, func, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.economy import Achievement, UserAchievement
+from app.models.user import User
+from app.services.achievements import CONDITION_SQL
+from app.services.achievement_stats import bump_unlock_count
+from app.services.exp_ledger import award_exp_bulk
+from app.services.ledger import add_ledger_entries
+from app.services.user_state import mark_user_changed
+from app.services.watermark import lock_watermark, set_watermark
+
+
+def _watermark_name(code: str) -> str:
+    return f"achievement_backfill:{code}"
+
+
+def _qualifying_user_ids(db: Session, achievement: Achievement, lo: int, hi: int) -> list[int]:
+    cond = CONDITION_SQL[achievement.condition_type](achievement.condition_value, lo, hi).subquery()
+    stmt = (
+        select(cond.c.user_id)
+        .where(
+            ~exists().where(
+                UserAchievement.user_id == cond.c.user_id,
+                UserAchievement.achievement_id == achievement.id,
+            )
+        )
+        .order_by(cond.c.user_id.asc())
+    )
+    return [int(uid) for uid in db.execute(stmt).scalars().all()]
+
+
+def _unlock_chunk(db: Session, achievement: Achievement, user_ids: list[int]) -> int:
+    now = datetime.utcnow()
+    res = db.execute(
+        mysql_insert(UserAchievement)
+        .values([{"user_id": uid, "achievement_id": achievement.id, "unlocked_at": now} for uid in user_ids])
+        .prefix_with("IGNORE")
+    )
+
+    def rewards(delta: int) -> list[dict]:
+        return [
+            {
+                "user_id": uid,
+                "delta": delta,
+                "source": "achievement",
+                "ref_id": achievement.id,
+                "idempotency_key": f"achievement:{uid}:{achievement.id}",
+            }
+            for uid in user_ids
+        ]
+
+    # 金幣先、EXP 後（鎖 user_balances 再鎖 users，跟購買流程同順序）
+    if achievement.reward_coins:
+        add_ledger_entries(db, rewards(achievement.reward_coins))
+    if achievement.reward_exp:
+        award_exp_bulk(db, rewards(achievement.reward_exp))
+    for uid in user_ids:
+        mark_user_changed(db, uid)
+    unlocked = int(res.rowcount or 0)
+    bump_unlock_count(db, achievement.id, unlocked)
+    return unlocked
+
+
+def backfill_achievement(
+    db: Session,
+    code: str,
+    *,
+    chunk_users: int = 5000,
+    restart: bool = False,
+) -> dict:
+    achievement = db.query(Achievement).filter(Achievement.code == code).one_or_none()
+    if achievement is None:
+        raise SystemExit(f"achievement {code!r} not found")
+    if achievement.condition_type not in CONDITION_SQL:
+        raise SystemExit(f"condition_type {achievement.condition_type!r} has no SQL condition")
+    db.expunge(achievement)  # 之後每段 commit 都不用重讀
+
+    name = _watermark_name(code)
+    if restart:
+        lock_watermark(db, name)
+        set_watermark(db, name, 0)
+        db.commit()
+
+    max_user_id = int(db.query(func.coalesce(func.max(User.id), 0)).scalar() or 0)
+    db.rollback()
+
+    report = {"chunks": 0, "scanned_to": 0, "qualified": 0, "unlocked": 0}
+    while True:
+        lo = lock_watermark(db, name)
+        if lo >= max_user_id:
+            db.rollback()
+            report["scanned_to"] = lo
+            break
+        hi = min(lo + chunk_users, max_user_id)
+
+        user_ids = _qualifying_user_ids(db, achievement, lo, hi)
+        if user_ids:
+            report["unlocked"] += _unlock_chunk(db, achievement, user_ids)
+        set_watermark(db, name, hi)
+        db.commit()
+
+        report["chunks"] += 1
+        report["qualified"] += len(user_ids)
+        report["scanned_to"] = hi
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="新成就上架後整批補發給已符合條件的人")
+    parser.add_argument("--code", required=True, help="achievements.code")
+    parser.add_argument("--chunk-users", type=int, default=5000, help="每段幾個 user_id")
+    parser.add_argument("--restart", action="store_true", help="進度歸零從頭再跑")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        report = backfill_achievement(db, args.code, chunk_users=args.chunk_users, restart=args.restart)
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - t0
+    rate = report["unlocked"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"chunks={report['chunks']} scanned_to={report['scanned_to']} "
+        f"qualified={report['qualified']} unlocked={report['unlocked']} "
+        f"({elapsed:.1f}s, {rate:.0f} unlocks/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# app/jobs/backfill_activity.py
+"""
+用既有的 checkins / runs 補 user_activity_days，再從它重建 user_streaks、
+user_activity_years（上線時跑一次；重跑也安全）。
+
+    python -m app.jobs.backfill_activity
+    python -m app.jobs.backfill_activity --batch-size 20000
+    python -m app.jobs.backfill_activity --state-only
+
+activity days：依 id 範圍分批 INSERT IGNORE ... SELECT，每批一個 commit，
+不用把資料搬到 Python 這邊。
+streaks / 年度點陣圖：依 user_id 分批讀日期，算完整批 upsert（點陣圖直接覆蓋）。
+"""
+from __future__ import annotations
+import argparse
+import time
+from datetime import date, timedelta
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.economy import (
+    Checkin, CheckinStatus, Run, RunStatus,
+    UserActivityDay, UserStreak, UserActivityYear,
+)
+from app.services.chicken_status import day_bit, YEAR_BITMAP_BYTES
+
+
+def _max_id(db: Session, model) -> int:
+    return int(db.query(func.coalesce(func.max(model.id), 0)).scalar() or 0)
+
+
+def _backfill_days(db: Session, model, select_stmt_for_range, batch_size: int) -> int:
+    inserted = 0
+    last_id = 0
+    max_id = _max_id(db, model)
+    while last_id < max_id:
+        upper = last_id + batch_size
+        stmt = (
+            insert(UserActivityDay)
+            .from_select(["user_id", "day"], select_stmt_for_range(last_id, upper))
+            .prefix_with("IGNORE")
+        )
+        inserted += db.execute(stmt).rowcount or 0
+        db.commit()
+        last_id = upper
+    return inserted
+
+
+def backfill_activity_days(db: Session, *, batch_size: int = 10000) -> dict:
+    def checkin_days(lo: int, hi: int):
+        return (
+            db.query(Checkin.user_id, func.date(Checkin.started_at))
+            .filter(
+                Checkin.id > lo,
+                Checkin.id <= hi,
+                Checkin.status.in_([CheckinStatus.verified, CheckinStatus.awarded]),
+            )
+            .distinct()
+            .statement
+        )
+
+    def run_days(lo: int, hi: int):
+        return (
+            db.query(Run.user_id, func.date(Run.created_at))
+            .filter(
+                Run.id > lo,
+                Run.id <= hi,
+                Run.status == RunStatus.awarded,
+            )
+            .distinct()
+            .statement
+        )
+
+    return {
+        "checkin_days": _backfill_days(db, Checkin, checkin_days, batch_size),
+        "run_days": _backfill_days(db, Run, run_days, batch_size),
+    }
+
+
+def _streak_of(days: list[date]) -> dict:
+    """days 已排序（舊 → 新）：回傳到最後一天為止的 current、歷史最長 longest。"""
+    current = longest = 0
+    prev = None
+    for d in days:
+        current = current + 1 if prev is not None and d == prev + timedelta(days=1) else 1
+        longest = max(longest, current)
+        prev = d
+    return {"current_streak": current, "longest_streak": longest, "last_active_day": prev}
+
+
+def _year_bitmaps(days: list[date]) -> dict[int, bytes]:
+    bitmaps: dict[int, bytearray] = {}
+    for d in days:
+        buf = bitmaps.setdefault(d.year, bytearray(YEAR_BITMAP_BYTES))
+        idx, mask = day_bit(d)
+        buf[idx] |= mask
+    return {y: bytes(b) for y, b in bitmaps.items()}
+
+
+def rebuild_activity_state(db: Session, *, batch_users: int = 1000) -> int:
+    """依 user_activity_days 重算每個人的 user_streaks / user_activity_years，回傳處理的人數。"""
+    done = 0
+    last_user_id = 0
+    while True:
+        user_ids = [
+            int(uid)
+            for (uid,) in (
+                db.query(UserActivityDay.user_id)
+                .filter(UserActivityDay.user_id > last_user_id)
+                .group_by(UserActivityDay.user_id)
+                .order_by(UserActivityDay.user_id.asc())
+                .limit(batch_users)
+                .all()
+            )
+        ]
+        if not user_ids:
+            break
+
+        days_by_user: dict[int, list[date]] = {}
+        for uid, d in (
+            db.query(UserActivityDay.user_id, UserActivityDay.day)
+            .filter(UserActivityDay.user_id >= user_ids[0], UserActivityDay.user_id <= user_ids[-1])
+            .order_by(UserActivityDay.user_id.asc(), UserActivityDay.day.asc())
+            .all()
+        ):
+            days_by_user.setdefault(int(uid), []).append(d)
+
+        values = [{"user_id": uid, **_streak_of(days)} for uid, days in days_by_user.items()]
+        stmt = mysql_insert(UserStreak).values(values)
+        stmt = stmt.on_duplicate_key_update(
+            current_streak=stmt.inserted.current_streak,
+            longest_streak=stmt.inserted.longest_streak,
+            last_active_day=stmt.inserted.last_active_day,
+        )
+        db.execute(stmt)
+
+        years = [
+            {"user_id": uid, "year": y, "bits": bits}
+            for uid, days in days_by_user.items()
+            for y, bits in _year_bitmaps(days).items()
+        ]
+        stmt = mysql_insert(UserActivityYear).values(years)
+        stmt = stmt.on_duplicate_key_update(bits=stmt.inserted.bits)
+        db.execute(stmt)
+        db.commit()
+
+        done += len(values)
+        last_user_id = user_ids[-1]
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="補 user_activity_days")
+    parser.add_argument("--batch-size", type=int, default=10000, help="每批處理幾個 checkins / runs id")
+    parser.add_argument("--batch-users", type=int, default=1000, help="重建 streak / 點陣圖時每批幾個人")
+    parser.add_argument(
+        "--state-only",
+        action="store_true",
+        help="只從 user_activity_days 重建 user_streaks / user_activity_years",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        if not args.state_only:
+            report = backfill_activity_days(db, batch_size=args.batch_size)
+            print(
+                f"activity_days inserted: checkins={report['checkin_days']} runs={report['run_days']} "
+                f"({time.perf_counter() - t0:.1f}s)"
+            )
+        users = rebuild_activity_state(db, batch_users=args.batch_users)
+    finally:
+        db.close()
+
+    print(f"user_streaks / user_activity_years rebuilt: users={users} ({time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
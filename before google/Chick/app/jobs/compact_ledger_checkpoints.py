@@ -0,0 +1,149 @@
+# app/jobs/compact_ledger_checkpoints.py
+"""
+背景 compactor：幫 ledger 長的使用者寫新的餘額檢查點。
+
+    python -m app.jobs.compact_ledger_checkpoints
+    python -m app.jobs.compact_ledger_checkpoints --min-rows 200 --batch-size 500
+
+只處理「建立超過 --lag-minutes 分鐘」的 ledger 列（見 ledger.safe_max_ledger_id）：
+checkpoint 一旦寫下就不會再改，所以要留一段安全距離。
+"""
+from __future__ import annotations
+import argparse
+from datetime import datetime
+from sqlalchemy import func, and_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.economy import CoinsLedger, CoinsBalanceCheckpoint
+from app.services.ledger import safe_max_ledger_id
+
+
+def _next_user_ids(db: Session, last_user_id: int, batch_size: int) -> list[int]:
+    rows = (
+        db.query(CoinsLedger.user_id)
+        .filter(CoinsLedger.user_id > last_user_id)
+        .group_by(CoinsLedger.user_id)
+        .order_by(CoinsLedger.user_id.asc())
+        .limit(batch_size)
+        .all()
+    )
+    return [int(r[0]) for r in rows]
+
+
+def _compact_users(db: Session, user_ids: list[int], safe_max_id: int, min_rows: int) -> int:
+    """對這批 user 寫 checkpoint，回傳寫入筆數。"""
+    latest = (
+        db.query(
+            CoinsBalanceCheckpoint.user_id.label("user_id"),
+            func.max(CoinsBalanceCheckpoint.as_of_id).label("as_of_id"),
+        )
+        .filter(CoinsBalanceCheckpoint.user_id.in_(user_ids))
+        .group_by(CoinsBalanceCheckpoint.user_id)
+        .subquery()
+    )
+
+    # 每個人「上一個 checkpoint 之後 ~ safe_max_id」的那一段
+    tails = (
+        db.query(
+            CoinsLedger.user_id,
+            func.max(CoinsLedger.id),
+            func.coalesce(func.sum(CoinsLedger.delta), 0),
+        )
+        .outerjoin(latest, latest.c.user_id == CoinsLedger.user_id)
+        .filter(
+            CoinsLedger.user_id.in_(user_ids),
+            CoinsLedger.id > func.coalesce(latest.c.as_of_id, 0),
+            CoinsLedger.id <= safe_max_id,
+        )
+        .group_by(CoinsLedger.user_id)
+        .having(func.count(CoinsLedger.id) >= min_rows)
+        .all()
+    )
+    if not tails:
+        return 0
+
+    base = {
+        int(uid): int(bal)
+        for uid, bal in (
+            db.query(CoinsBalanceCheckpoint.user_id, CoinsBalanceCheckpoint.balance)
+            .join(
+                latest,
+                and_(
+                    latest.c.user_id == CoinsBalanceCheckpoint.user_id,
+                    latest.c.as_of_id == CoinsBalanceCheckpoint.as_of_id,
+                ),
+            )
+            .all()
+        )
+    }
+
+    now = datetime.utcnow()
+    values = [
+        {
+            "user_id": int(uid),
+            "as_of_id": int(max_id),
+            "balance": base.get(int(uid), 0) + int(tail_sum),
+            "created_at": now,
+        }
+        for uid, max_id, tail_sum in tails
+    ]
+    db.execute(mysql_insert(CoinsBalanceCheckpoint).values(values).prefix_with("IGNORE"))
+    db.commit()
+    return len(values)
+
+
+def compact_checkpoints(
+    db: Session,
+    *,
+    min_rows: int = 100,
+    batch_size: int = 500,
+    lag_minutes: int = 10,
+) -> dict:
+    """
+    依 user_id 分批，checkpoint 之後累積超過 min_rows 筆的人才寫新 checkpoint。
+    """
+    safe_max_id = safe_max_ledger_id(db, lag_minutes)
+    scanned = 0
+    written = 0
+    last_user_id = 0
+
+    if safe_max_id:
+        while True:
+            user_ids = _next_user_ids(db, last_user_id, batch_size)
+            if not user_ids:
+                break
+            scanned += len(user_ids)
+            written += _compact_users(db, user_ids, safe_max_id, min_rows)
+            last_user_id = user_ids[-1]
+
+    return {"safe_max_id": safe_max_id, "scanned_users": scanned, "checkpoints_written": written}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="寫 coins_ledger 餘額檢查點")
+    parser.add_argument("--min-rows", type=int, default=100, help="checkpoint 之後至少幾筆才寫新的")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--lag-minutes", type=int, default=10)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = compact_checkpoints(
+            db,
+            min_rows=args.min_rows,
+            batch_size=args.batch_size,
+            lag_minutes=args.lag_minutes,
+        )
+    finally:
+        db.close()
+
+    print(
+        f"safe_max_id={report['safe_max_id']} "
+        f"scanned={report['scanned_users']} written={report['checkpoints_written']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# app/jobs/rebuild_achievement_stats.py
+"""
+從 user_achievements / users 重算成就稀有度的計數（achievement_stats、global_counters 的 total_users / total_unlocks）。
+
+    python -m app.jobs.rebuild_achievement_stats             # 只回報差異
+    python -m app.jobs.rebuild_achievement_stats --fix       # 覆寫（上線第一次也用這個建立計數）
+
+這裡是整張表 COUNT(*) GROUP BY，只在上線 / 修資料時跑，平常計數由寫入端 +N。
+跑的當下有人解鎖的話，差異可能差個 1、2，寫入量低的時候再跑一次即可。
+"""
+from __future__ import annotations
+import argparse
+import time
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.economy import AchievementStat, GlobalCounter, UserAchievement
+from app.models.user import User
+from app.services.achievement_stats import TOTAL_UNLOCKS, TOTAL_USERS
+
+
+def rebuild_achievement_stats(db: Session, *, fix: bool = False) -> dict:
+    expected = {
+        int(aid): int(cnt)
+        for aid, cnt in (
+            db.query(UserAchievement.achievement_id, func.count(UserAchievement.id))
+            .group_by(UserAchievement.achievement_id)
+            .all()
+        )
+    }
+    current = {
+        int(aid): int(cnt)
+        for aid, cnt in db.query(AchievementStat.achievement_id, AchievementStat.unlock_count).all()
+    }
+    total_users = int(db.query(func.count(User.id)).scalar() or 0)
+    stored_users = int(
+        db.query(GlobalCounter.value).filter(GlobalCounter.name == TOTAL_USERS).scalar() or 0
+    )
+    total_unlocks = sum(expected.values())
+    stored_unlocks = int(
+        db.query(GlobalCounter.value).filter(GlobalCounter.name == TOTAL_UNLOCKS).scalar() or 0
+    )
+
+    drift = {
+        aid: (current.get(aid, 0), expected.get(aid, 0))
+        for aid in sorted(set(expected) | set(current))
+        if current.get(aid, 0) != expected.get(aid, 0)
+    }
+
+    if fix and (drift or stored_users != total_users or stored_unlocks != total_unlocks):
+        now = datetime.utcnow()
+        if drift:
+            stmt = mysql_insert(AchievementStat).values([
+                {"achievement_id": aid, "unlock_count": want, "updated_at": now}
+                for aid, (_, want) in drift.items()
+            ])
+            db.execute(stmt.on_duplicate_key_update(unlock_count=stmt.inserted.unlock_count, updated_at=now))
+        stmt = mysql_insert(GlobalCounter).values([
+            {"name": TOTAL_USERS, "value": total_users, "updated_at": now},
+            {"name": TOTAL_UNLOCKS, "value": total_unlocks, "updated_at": now},
+        ])
+        db.execute(stmt.on_duplicate_key_update(value=stmt.inserted.value, updated_at=now))
+        db.commit()
+    else:
+        db.rollback()
+
+    return {
+        "achievements": len(set(expected) | set(current)),
+        "drift": drift,
+        "total_users": (stored_users, total_users),
+        "total_unlocks": (stored_unlocks, total_unlocks),
+        "fixed": fix,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="重算成就稀有度計數")
+    parser.add_argument("--fix", action="store_true", help="以 user_achievements / users 為準覆寫")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        report = rebuild_achievement_stats(db, fix=args.fix)
+    finally:
+        db.close()
+
+    for aid, (have, want) in report["drift"].items():
+        print(f"  achievement_id={aid} stored={have} expected={want}")
+    have, want = report["total_users"]
+    have_unlocks, want_unlocks = report["total_unlocks"]
+    print(
+        f"achievements={report['achievements']} drift={len(report['drift'])} "
+        f"total_users stored={have} expected={want} "
+        f"total_unlocks stored={have_unlocks} expected={want_unlocks}{' (fixed)' if args.fix else ''} "
+        f"({time.perf_counter() - t0:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
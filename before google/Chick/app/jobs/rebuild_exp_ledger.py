@@ -0,0 +1,141 @@
+# app/jobs/rebuild_exp_ledger.py
+"""
+exp_ledger 的開帳 / 對帳工具。
+
+    python -m app.jobs.rebuild_exp_ledger            # 開帳 + 回報差異
+    python -m app.jobs.rebuild_exp_ledger --fix      # 另外用 ledger 總和修正 users.exp / level
+
+上線前的 EXP 只存在 users.exp，沒有流水帳：
+第一次跑會幫每個人補一筆 source="opening_balance" 的開帳（key = opening_balance:{user_id}），
+金額 = users.exp - 目前 ledger 總和，之後 SUM(exp_ledger.delta) 就等於 users.exp。
+已經開過帳的人，兩邊對不上就只回報；加 --fix 才以 ledger 為準覆寫 users.exp / level。
+
+依 id 分批，每批先 SELECT ... FOR UPDATE 鎖住那批 users（award_exp 也是先鎖 users），
+所以跑的時候有人在拿 EXP 也不會算錯，只是那批會等一下。
+"""
+from __future__ import annotations
+import argparse
+import time
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.economy import ExpLedger
+from app.models.user import User
+from app.services.level import calc_levels_from_exp
+
+OPENING_SOURCE = "opening_balance"
+
+
+def _opening_key(user_id: int) -> str:
+    return f"{OPENING_SOURCE}:{user_id}"
+
+
+def _rebuild_batch(db: Session, users: list[tuple[int, int]], fix: bool) -> dict:
+    user_ids = [uid for uid, _ in users]
+    sums = {
+        int(uid): int(total)
+        for uid, total in (
+            db.query(ExpLedger.user_id, func.coalesce(func.sum(ExpLedger.delta), 0))
+            .filter(ExpLedger.user_id.in_(user_ids))
+            .group_by(ExpLedger.user_id)
+            .all()
+        )
+    }
+    opened = {
+        int(uid)
+        for (uid,) in (
+            db.query(ExpLedger.user_id)
+            .filter(ExpLedger.idempotency_key.in_([_opening_key(uid) for uid in user_ids]))
+            .all()
+        )
+    }
+
+    now = datetime.utcnow()
+    openings: list[dict] = []
+    drift: list[tuple[int, int]] = []  # (user_id, ledger 總和)
+    for uid, exp in users:
+        diff = exp - sums.get(uid, 0)
+        if uid not in opened:
+            # 開帳：就算 diff 是 0 也記一筆，代表這個人已經開過帳
+            openings.append({
+                "user_id": uid,
+                "delta": diff,
+                "source": OPENING_SOURCE,
+                "ref_id": None,
+                "idempotency_key": _opening_key(uid),
+                "created_at": now,
+            })
+        elif diff != 0:
+            drift.append((uid, sums.get(uid, 0)))
+
+    if openings:
+        db.execute(mysql_insert(ExpLedger).values(openings).prefix_with("IGNORE"))
+
+    fixed = 0
+    if fix and drift:
+        levels = calc_levels_from_exp([max(0, total) for _, total in drift])
+        for (uid, total), level in zip(drift, levels):
+            db.query(User).filter(User.id == uid).update(
+                {
+                    User.exp: max(0, total),
+                    User.level: level,
+                    User.state_version: User.state_version + 1,
+                },
+                synchronize_session=False,
+            )
+            fixed += 1
+
+    return {"opened": len(openings), "drift": len(drift), "fixed": fixed}
+
+
+def rebuild_exp_ledger(db: Session, *, batch_size: int = 1000, fix: bool = False) -> dict:
+    report = {"users": 0, "opened": 0, "drift": 0, "fixed": 0}
+    last_id = 0
+    while True:
+        rows = (
+            db.query(User.id, User.exp)
+            .filter(User.id > last_id)
+            .order_by(User.id.asc())
+            .limit(batch_size)
+            .with_for_update()
+            .all()
+        )
+        if not rows:
+            db.rollback()
+            break
+
+        users = [(int(uid), int(exp or 0)) for uid, exp in rows]
+        batch = _rebuild_batch(db, users, fix)
+        db.commit()
+
+        report["users"] += len(users)
+        for k in ("opened", "drift", "fixed"):
+            report[k] += batch[k]
+        last_id = users[-1][0]
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="exp_ledger 開帳 / 對帳")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--fix", action="store_true", help="以 exp_ledger 為準修正 users.exp / level")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        report = rebuild_exp_ledger(db, batch_size=args.batch_size, fix=args.fix)
+    finally:
+        db.close()
+
+    print(
+        f"users={report['users']} opened={report['opened']} drift={report['drift']} "
+        f"fixed={report['fixed']} ({time.perf_counter() - t0:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# app/jobs/rebuild_user_stats.py
+"""
+從來源表重算 user_stats，和目前的累計數字比對。
+
+    python -m app.jobs.rebuild_user_stats            # 只回報差異
+    python -m app.jobs.rebuild_user_stats --fix      # 回報並覆寫（上線第一次也用這個建立 user_stats）
+
+依 user_id 範圍分批，每批對每張來源表各跑一個 GROUP BY user_id：
+    checkins（verified / awarded）、runs（awarded，次數 + 距離）、
+    training_logs（volume 加總）、item_usages、purchases
+
+跑的當下有人在運動 / 購買的話，那幾個人可能出現一閃而過的差異；
+--fix 請在寫入量低的時候跑（跟 reconcile_balances 一樣）。
+"""
+from __future__ import annotations
+import argparse
+import time
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.economy import (
+    Checkin, CheckinStatus, Run, RunStatus,
+    TrainingLog, ItemUsage, Purchase, UserStats,
+)
+from app.models.user import User
+from app.services.user_stats import STAT_FIELDS
+
+
+def _grouped(db: Session, user_col, value, filters, lo: int, hi: int) -> dict[int, object]:
+    return {
+        int(uid): v
+        for uid, v in (
+            db.query(user_col, value)
+            .filter(user_col >= lo, user_col <= hi, *filters)
+            .group_by(user_col)
+            .all()
+        )
+    }
+
+
+def _expected(db: Session, lo: int, hi: int) -> dict[int, dict]:
+    sources = {
+        "total_checkins": _grouped(
+            db, Checkin.user_id, func.count(Checkin.id),
+            [Checkin.status.in_([CheckinStatus.verified, CheckinStatus.awarded])], lo, hi,
+        ),
+        "total_runs": _grouped(
+            db, Run.user_id, func.count(Run.id), [Run.status == RunStatus.awarded], lo, hi,
+        ),
+        "total_distance_km": _grouped(
+            db, Run.user_id, func.coalesce(func.sum(Run.distance_km), 0), [Run.status == RunStatus.awarded], lo, hi,
+        ),
+        "total_training_volume": _grouped(
+            db, TrainingLog.user_id, func.coalesce(func.sum(TrainingLog.volume), 0), [], lo, hi,
+        ),
+        "items_used": _grouped(db, ItemUsage.user_id, func.count(ItemUsage.id), [], lo, hi),
+        "purchases": _grouped(db, Purchase.user_id, func.count(Purchase.id), [], lo, hi),
+    }
+    user_ids = set().union(*(s.keys() for s in sources.values()))
+    return {
+        uid: {
+            "total_checkins": int(sources["total_checkins"].get(uid, 0)),
+            "total_runs": int(sources["total_runs"].get(uid, 0)),
+            "total_distance_km": Decimal(sources["total_distance_km"].get(uid, 0)),
+            "total_training_volume": int(sources["total_training_volume"].get(uid, 0)),
+            "items_used": int(sources["items_used"].get(uid, 0)),
+            "purchases": int(sources["purchases"].get(uid, 0)),
+        }
+        for uid in user_ids
+    }
+
+
+def _current(db: Session, lo: int, hi: int) -> dict[int, dict]:
+    return {
+        int(row.user_id): {name: getattr(row, name) for name in STAT_FIELDS}
+        for row in db.query(UserStats).filter(UserStats.user_id >= lo, UserStats.user_id <= hi).all()
+    }
+
+
+def _zero() -> dict:
+    return {name: (Decimal("0") if name == "total_distance_km" else 0) for name in STAT_FIELDS}
+
+
+def rebuild_user_stats(db: Session, *, batch_users: int = 1000, fix: bool = False) -> dict:
+    max_user_id = int(db.query(func.coalesce(func.max(User.id), 0)).scalar() or 0)
+    checked = 0
+    mismatched = 0
+    fixed = 0
+    samples: list[tuple[int, dict, dict]] = []
+
+    lo = 1
+    while lo <= max_user_id:
+        hi = lo + batch_users - 1
+        expected = _expected(db, lo, hi)
+        current = _current(db, lo, hi)
+
+        wrong: list[dict] = []
+        for uid in sorted(set(expected) | set(current)):
+            want = expected.get(uid, _zero())
+            have = current.get(uid, _zero())
+            checked += 1
+            if any(Decimal(str(want[k])) != Decimal(str(have[k])) for k in STAT_FIELDS):
+                mismatched += 1
+                if len(samples) < 10:
+                    samples.append((uid, have, want))
+                wrong.append({"user_id": uid, **want})
+
+        if fix and wrong:
+            now = datetime.utcnow()
+            stmt = mysql_insert(UserStats).values([{**w, "updated_at": now} for w in wrong])
+            stmt = stmt.on_duplicate_key_update(
+                updated_at=now,
+                **{name: stmt.inserted[name] for name in STAT_FIELDS},
+            )
+            db.execute(stmt)
+            db.commit()
+            fixed += len(wrong)
+        else:
+            db.rollback()
+
+        lo = hi + 1
+
+    return {"checked": checked, "mismatched": mismatched, "fixed": fixed, "samples": samples}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="驗證 / 重算 user_stats")
+    parser.add_argument("--batch-users", type=int, default=1000, help="每批幾個 user_id")
+    parser.add_argument("--fix", action="store_true", help="以來源表為準覆寫 user_stats")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        report = rebuild_user_stats(db, batch_users=args.batch_users, fix=args.fix)
+    finally:
+        db.close()
+
+    for uid, have, want in report["samples"]:
+        diff = {k: (have[k], want[k]) for k in STAT_FIELDS if Decimal(str(have[k])) != Decimal(str(want[k]))}
+        print(f"  user_id={uid} (stored, expected)={diff}")
+    print(
+        f"checked={report['checked']} mismatched={report['mismatched']} fixed={report['fixed']} "
+        f"({time.perf_counter() - t0:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
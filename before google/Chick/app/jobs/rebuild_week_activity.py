@@ -0,0 +1,100 @@
+# app/jobs/rebuild_week_activity.py
+"""
+用既有的 checkins / runs 重建 user_week_activity（上線時跑一次；重跑也安全）。
+
+    python -m app.jobs.rebuild_week_activity
+    python -m app.jobs.rebuild_week_activity --batch-users 2000
+    python -m app.jobs.rebuild_week_activity --since 2024-01-01
+
+依 user_id 範圍分批：每批在 DB 端 GROUP BY (user_id, 週一) 算次數，
+兩張表的結果合併後整批 upsert（直接覆蓋 count），所以重跑不會重複累加。
+跑的當下剛好有新的打卡 / 跑步時，那一週可能少算一次，離峰跑或事後再跑一次即可。
+"""
+from __future__ import annotations
+import argparse
+import time
+from datetime import date, datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.economy import Checkin, CheckinStatus, Run, RunStatus, UserWeekActivity
+from app.models.user import User
+
+
+def _week_counts(db: Session, col_user, col_time, filters, lo: int, hi: int, since: datetime | None):
+    """[lo, hi] 這批 user 每週的次數：[(user_id, week_start, count)]。"""
+    day = func.date(col_time)
+    week_start = func.subdate(day, func.weekday(day))
+    q = db.query(col_user, week_start, func.count()).filter(col_user >= lo, col_user <= hi, *filters)
+    if since is not None:
+        q = q.filter(col_time >= since)
+    return q.group_by(col_user, week_start).all()
+
+
+def rebuild_week_activity(db: Session, *, batch_users: int = 1000, since: date | None = None) -> dict:
+    since_dt = datetime(since.year, since.month, since.day) if since else None
+    max_user_id = int(db.query(func.coalesce(func.max(User.id), 0)).scalar() or 0)
+
+    users = 0
+    rows_written = 0
+    lo = 1
+    while lo <= max_user_id:
+        hi = lo + batch_users - 1
+        counts: dict[tuple[int, date], int] = {}
+
+        for uid, ws, n in _week_counts(
+            db, Checkin.user_id, Checkin.started_at,
+            [Checkin.status.in_([CheckinStatus.verified, CheckinStatus.awarded])],
+            lo, hi, since_dt,
+        ):
+            key = (int(uid), ws)
+            counts[key] = counts.get(key, 0) + int(n)
+
+        for uid, ws, n in _week_counts(
+            db, Run.user_id, Run.created_at,
+            [Run.status == RunStatus.awarded],
+            lo, hi, since_dt,
+        ):
+            key = (int(uid), ws)
+            counts[key] = counts.get(key, 0) + int(n)
+
+        if counts:
+            values = [
+                {"user_id": uid, "week_start": ws, "count": n}
+                for (uid, ws), n in counts.items()
+            ]
+            stmt = mysql_insert(UserWeekActivity).values(values)
+            stmt = stmt.on_duplicate_key_update(count=stmt.inserted.count)
+            db.execute(stmt)
+            db.commit()
+            users += len({uid for uid, _ in counts})
+            rows_written += len(values)
+
+        lo = hi + 1
+
+    return {"users": users, "weeks_written": rows_written}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="重建 user_week_activity")
+    parser.add_argument("--batch-users", type=int, default=1000, help="每批幾個 user_id")
+    parser.add_argument("--since", type=date.fromisoformat, default=None, help="只重建這天（含）之後的週，YYYY-MM-DD，建議給週一")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        report = rebuild_week_activity(db, batch_users=args.batch_users, since=args.since)
+    finally:
+        db.close()
+
+    print(
+        f"user_week_activity rebuilt: users={report['users']} weeks={report['weeks_written']} "
+        f"({time.perf_counter() - t0:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
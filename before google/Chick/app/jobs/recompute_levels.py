@@ -0,0 +1,96 @@
+# app/jobs/recompute_levels.py
+"""
+改了 LEVEL_CONFIG / MAX_LEVEL 之後，用新的等級曲線重算所有人的 users.level。
+
+    python -m app.jobs.recompute_levels
+    python -m app.jobs.recompute_levels --batch-size 5000
+    python -m app.jobs.recompute_levels --dry-run     # 只算會變幾個人，不寫
+
+依 id 順序一批一批讀 (id, exp, level)，用 level.calc_levels_from_exp 整批換算，
+只把等級真的變了的列用一次 executemany 的 UPDATE 寫回，順便 state_version +1（ETag 失效）。
+UPDATE 條件帶著讀到的 exp：讀完之後那個人剛好又拿到 EXP 的話，
+award_exp 已經用新曲線算好 level，這裡就跳過不蓋掉。
+"""
+from __future__ import annotations
+import argparse
+import time
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.user import User
+from app.services.level import calc_levels_from_exp
+
+_users = User.__table__
+
+
+def _update_stmt():
+    return (
+        update(_users)
+        .where(_users.c.id == bindparam("b_id"), _users.c.exp == bindparam("b_exp"))
+        .values(level=bindparam("b_level"), state_version=_users.c.state_version + 1)
+    )
+
+
+def recompute_levels(db: Session, *, batch_size: int = 2000, dry_run: bool = False) -> dict:
+    scanned = 0
+    changed = 0
+    updated = 0
+    last_id = 0
+    stmt = _update_stmt()
+
+    while True:
+        rows = (
+            db.query(User.id, User.exp, User.level)
+            .filter(User.id > last_id)
+            .order_by(User.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+
+        levels = calc_levels_from_exp([exp for _, exp, _ in rows])
+        params = [
+            {"b_id": uid, "b_exp": exp or 0, "b_level": new_level}
+            for (uid, exp, old_level), new_level in zip(rows, levels)
+            if old_level != new_level
+        ]
+
+        scanned += len(rows)
+        changed += len(params)
+        if params and not dry_run:
+            updated += db.execute(stmt, params).rowcount or 0
+            db.commit()
+        else:
+            db.rollback()  # 放掉讀取的 snapshot
+
+        last_id = rows[-1].id
+
+    return {"scanned": scanned, "changed": changed, "updated": updated}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="用目前的等級曲線重算 users.level")
+    parser.add_argument("--batch-size", type=int, default=2000, help="每批幾個 user")
+    parser.add_argument("--dry-run", action="store_true", help="只統計，不寫回")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        report = recompute_levels(db, batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - t0
+    rate = report["scanned"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"scanned={report['scanned']} changed={report['changed']} updated={report['updated']}"
+        f"{' (dry run)' if args.dry_run else ''} "
+        f"({elapsed:.1f}s, {rate:.0f} users/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# app/jobs/reconcile_balances.py
+"""
+對帳工具：用 coins_ledger 批次重算每個人的餘額，和 user_balances 比對。
+
+    python -m app.jobs.reconcile_balances            # 只回報差異
+    python -m app.jobs.reconcile_balances --fix      # 回報並修正（上線第一次也用這個建立餘額表）
+
+--fix 會直接覆寫餘額，請在寫入量低的時候跑；
+只回報的模式隨時可以跑（同時有人在寫的話，可能出現一閃而過的差異）。
+"""
+from __future__ import annotations
+import argparse
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.economy import CoinsLedger, UserBalance
+
+
+def _ledger_totals_after(db: Session, last_user_id: int, batch_size: int) -> list[tuple[int, int]]:
+    rows = (
+        db.query(CoinsLedger.user_id, func.coalesce(func.sum(CoinsLedger.delta), 0))
+        .filter(CoinsLedger.user_id > last_user_id)
+        .group_by(CoinsLedger.user_id)
+        .order_by(CoinsLedger.user_id.asc())
+        .limit(batch_size)
+        .all()
+    )
+    return [(int(uid), int(total)) for uid, total in rows]
+
+
+def _cached_balances(db: Session, lo: int, hi: int | None) -> dict[int, int]:
+    """撈 (lo, hi] 區間的 user_balances；hi=None 代表到最後。"""
+    q = db.query(UserBalance.user_id, UserBalance.balance).filter(UserBalance.user_id > lo)
+    if hi is not None:
+        q = q.filter(UserBalance.user_id <= hi)
+    return {int(uid): int(bal) for uid, bal in q.all()}
+
+
+def reconcile_balances(db: Session, *, fix: bool = False, batch_size: int = 1000) -> dict:
+    """
+    依 user_id 分批：
+      - ledger 有、餘額表沒有 → missing
+      - 兩邊數字不同        → mismatch
+      - 餘額表有、ledger 沒有且不為 0 → orphan
+    回傳統計，drift 只列出前 50 筆方便看。
+    """
+    checked = 0
+    drift: list[dict] = []
+    drift_count = 0
+    fixed = 0
+    last_user_id = 0
+
+    while True:
+        totals = _ledger_totals_after(db, last_user_id, batch_size)
+        hi = totals[-1][0] if len(totals) == batch_size else None
+        cached = _cached_balances(db, last_user_id, hi)
+        expected = dict(totals)
+        in_ledger = set(expected)
+
+        # ledger 沒有紀錄、但餘額表有值的 user，正確餘額是 0
+        for uid in cached:
+            expected.setdefault(uid, 0)
+
+        to_fix: list[dict] = []
+        for uid, want in sorted(expected.items()):
+            checked += 1
+            have = cached.get(uid)
+            if have == want or (have is None and want == 0):
+                continue
+
+            drift_count += 1
+            if len(drift) < 50:
+                drift.append({
+                    "user_id": uid,
+                    "kind": "missing" if have is None else ("orphan" if uid not in in_ledger else "mismatch"),
+                    "cached": have,
+                    "ledger": want,
+                })
+            to_fix.append({"user_id": uid, "balance": want, "updated_at": datetime.utcnow()})
+
+        if fix and to_fix:
+            stmt = mysql_insert(UserBalance).values(to_fix)
+            stmt = stmt.on_duplicate_key_update(
+                balance=stmt.inserted.balance,
+                updated_at=stmt.inserted.updated_at,
+            )
+            db.execute(stmt)
+            db.commit()
+            fixed += len(to_fix)
+
+        if hi is None:
+            break
+        last_user_id = hi
+
+    return {
+        "checked_users": checked,
+        "drift_users": drift_count,
+        "fixed_users": fixed,
+        "drift_sample": drift,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="coins_ledger ↔ user_balances 對帳")
+    parser.add_argument("--fix", action="store_true", help="把 user_balances 改成 ledger 重算的值")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = reconcile_balances(db, fix=args.fix, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+    print(f"checked={report['checked_users']} drift={report['drift_users']} fixed={report['fixed_users']}")
+    for d in report["drift_sample"]:
+        print(f"  user_id={d['user_id']} kind={d['kind']} cached={d['cached']} ledger={d['ledger']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# app/jobs/rollover_weekly_challenges.py
+"""
+換週時整批先建好每個活躍使用者的每週挑戰（每個 active 範本一列），請求路徑就不用在週一早上搶著建列。
+
+    python -m app.jobs.rollover_weekly_challenges                 # 本週
+    python -m app.jobs.rollover_weekly_challenges --next          # 下週（週日晚上先跑）
+    python -m app.jobs.rollover_weekly_challenges --week 2025-06-02 --active-days 60
+
+活躍 = 最近 --active-days 天內登入過，或這段期間內有運動紀錄（user_week_activity）。
+依 user_id 範圍分段，每段一個 INSERT IGNORE ... SELECT 再 commit；
+uq_weekly_challenge_user_week 擋重複，所以中斷後重跑、或跟請求路徑的補建同時發生都沒關係。
+每段也順便把已經結束的週併進 user_challenge_stats（完成率的分子分母，見 challenges.fold_closed_weeks），
+有併到的人（fold_closed_weeks 回傳的 user_id）state_version +1（/challenges/history 的 ETag 失效）。
+
+沒被涵蓋到的人（很久沒來）在這週第一次有事件時才補建；週中新增範本後重跑一次本週，已經有列的人會補上新範本那一列。
+"""
+from __future__ import annotations
+import argparse
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import exists, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.db import SessionLocal
+from app.models.economy import UserWeekActivity
+from app.models.user import User
+from app.services.challenges import current_week_start, ensure_week_challenges, fold_closed_weeks
+from app.services.chicken_status import week_start_of
+
+
+def _active_users(lo: int, hi: int, since: date):
+    cutoff = datetime(since.year, since.month, since.day)
+    return select(User.id.label("user_id")).where(
+        User.id > lo,
+        User.id <= hi,
+        or_(
+            User.last_login_at >= cutoff,
+            exists().where(
+                UserWeekActivity.user_id == User.id,
+                UserWeekActivity.week_start >= week_start_of(since),
+            ),
+        ),
+    )
+
+
+def rollover_weekly_challenges(
+    db: Session,
+    week_start: date,
+    *,
+    active_days: int = 28,
+    chunk_users: int = 5000,
+) -> dict:
+    since = datetime.utcnow().date() - timedelta(days=active_days)
+    # 只併「已經結束」的週：--next 先建下週的時候，本週還沒結束
+    close_before = current_week_start()
+    max_user_id = int(db.query(func.coalesce(func.max(User.id), 0)).scalar() or 0)
+    db.rollback()
+
+    chunks = 0
+    created = 0
+    folded = 0
+    lo = 0
+    while lo < max_user_id:
+        hi = min(lo + chunk_users, max_user_id)
+        folded_ids = fold_closed_weeks(db, lo, hi, close_before)
+        if folded_ids:
+            folded += len(folded_ids)
+            db.execute(
+                update(User)
+                .where(User.id.in_(folded_ids))
+                .values(state_version=User.state_version + 1)
+                .execution_options(synchronize_session=False)
+            )
+        created += ensure_week_challenges(db, _active_users(lo, hi, since), week_start)
+        db.commit()
+        chunks += 1
+        lo = hi
+    return {
+        "week_start": week_start,
+        "chunks": chunks,
+        "created": created,
+        "folded": folded,
+        "max_user_id": max_user_id,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="換週時整批建立每週挑戰")
+    parser.add_argument("--week", type=date.fromisoformat, default=None, help="哪一週（任一天，會換成週一）")
+    parser.add_argument("--next", action="store_true", help="建下週的（換週前先跑）")
+    parser.add_argument("--active-days", type=int, default=28, help="最近幾天有登入 / 運動算活躍")
+    parser.add_argument("--chunk-users", type=int, default=5000, help="每段幾個 user_id")
+    args = parser.parse_args()
+
+    week_start = week_start_of(args.week) if args.week else current_week_start()
+    if args.next:
+        week_start += timedelta(days=7)
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        report = rollover_weekly_challenges(
+            db, week_start, active_days=args.active_days, chunk_users=args.chunk_users
+        )
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - t0
+    rate = report["created"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"week_start={report['week_start']} chunks={report['chunks']} created={report['created']} "
+        f"folded={report['folded']} "
+        f"({elapsed:.1f}s, {rate:.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# app/jobs/rollup_economy.py
+"""
+把 coins_ledger 增量彙總到 economy_daily_rollups（建議 cron 每 10~15 分鐘跑一次）。
+
+    python -m app.jobs.rollup_economy
+    python -m app.jobs.rollup_economy --batch-size 20000 --lag-minutes 10
+"""
+from __future__ import annotations
+import argparse
+
+from app.core.db import SessionLocal
+from app.services.economy_rollup import run_rollup
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="金幣經濟日報彙總")
+    parser.add_argument("--batch-size", type=int, default=5000, help="每批處理幾個 ledger id")
+    parser.add_argument("--lag-minutes", type=int, default=10)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = run_rollup(db, batch_size=args.batch_size, lag_minutes=args.lag_minutes)
+    finally:
+        db.close()
+
+    print(f"watermark={report['watermark']} safe_max_id={report['safe_max_id']} batches={report['batches']}")
+
+
+if __name__ == "__main__":
+    main()
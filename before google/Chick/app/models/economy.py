@@ -1,5 +1,5 @@
 # path: app/models/economy.py
-from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Enum, DECIMAL, Index, ForeignKey, Date
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Enum, DECIMAL, Index, ForeignKey, Date, UniqueConstraint, BINARY, Boolean
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
 from datetime import datetime
@@ -27,7 +27,75 @@ class CoinsLedger(Base):
     ref_id = Column(BigInteger, nullable=True)
     idempotency_key = Column(String(64), nullable=True)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
-    __table_args__ = (Index("idx_coins_user_created", "user_id", "created_at"),)
+    __table_args__ = (
+        Index("idx_coins_user_created", "user_id", "created_at"),
+        # checkpoint 之後的那一段用 (user_id, id) 範圍掃
+        Index("idx_coins_user_id", "user_id", "id"),
+        # 冪等：同一個 key 只會入帳一次（寫入用 INSERT IGNORE）
+        UniqueConstraint("idempotency_key", name="uq_coins_idempotency_key"),
+    )
+
+class ExpLedger(Base):
+    """
+    EXP 的流水帳（跟 coins_ledger 同樣的做法）：只新增不修改，idempotency_key 擋重複發放。
+    users.exp / users.level 是它的快取，由 exp_ledger.award_exp 在同一個 transaction 更新。
+    """
+    __tablename__ = "exp_ledger"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False)
+    delta = Column(Integer, nullable=False)
+    source = Column(String(32), nullable=False)
+    ref_id = Column(BigInteger, nullable=True)
+    idempotency_key = Column(String(64), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (
+        Index("idx_exp_user_id", "user_id", "id"),
+        UniqueConstraint("idempotency_key", name="uq_exp_idempotency_key"),
+    )
+
+class UserBalance(Base):
+    """
+    每個使用者目前的金幣餘額（由 coins_ledger 寫入時同一個 transaction 一起更新）。
+    coins_ledger 仍然是唯一真相，這張表只是快取，可以用 reconcile 工具重算。
+    """
+    __tablename__ = "user_balances"
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    balance = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class CoinsBalanceCheckpoint(Base):
+    """
+    餘額檢查點：到 coins_ledger.id = as_of_id（含）為止的總和。
+    讀餘額時只要加總 as_of_id 之後的 ledger；由背景 compactor 批次寫入，寫了就不改。
+    """
+    __tablename__ = "coins_balance_checkpoints"
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    as_of_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    balance = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class EconomyDailyRollup(Base):
+    """
+    coins_ledger 依「日期（UTC）× source」彙總：發出去多少（minted）、花掉多少（burned）。
+    由 rollup job 依 job_watermarks 增量更新，後台曲線直接讀這張表。
+    """
+    __tablename__ = "economy_daily_rollups"
+    day = Column(Date, primary_key=True)
+    source = Column(String(32), primary_key=True)
+    minted = Column(BigInteger, nullable=False, default=0)
+    burned = Column(BigInteger, nullable=False, default=0)
+    entries = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class JobWatermark(Base):
+    """
+    背景工作的進度（high-water mark），例如已經彙總到哪一個 ledger id。
+    更新進度跟寫結果放在同一個 transaction，job 中斷後重跑不會重算也不會漏算。
+    """
+    __tablename__ = "job_watermarks"
+    name = Column(String(64), primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
 class Checkin(Base):
     __tablename__ = "checkins"
@@ -64,6 +132,64 @@ class Run(Base):
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     __table_args__ = (Index("idx_runs_user_created", "user_id", "created_at"),)
 
+class UserActivityDay(Base):
+    """
+    使用者「有運動」的日期（UTC），一天一列。
+    打卡 verified / 跑步 awarded 時寫入，streak 與火焰牆只讀需要的那幾天。
+    """
+    __tablename__ = "user_activity_days"
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    day = Column(Date, primary_key=True)
+
+class UserWeekActivity(Base):
+    """
+    每人每週的有效運動次數（week_start = 該週週一，UTC）。
+    打卡 verified / 跑步 awarded 時 +1，get_weekly_activity_count 只查一列。
+    """
+    __tablename__ = "user_week_activity"
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    week_start = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class UserStreak(Base):
+    """
+    每人的連續運動狀態，在「新的一天有運動」時 O(1) 更新。
+    current_streak 是「到 last_active_day 為止」連續幾天；
+    讀的時候如果 last_active_day 不是今天就當 0（見 chicken_status.get_current_streak）。
+    """
+    __tablename__ = "user_streaks"
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    current_streak = Column(Integer, nullable=False, default=0)
+    longest_streak = Column(Integer, nullable=False, default=0)
+    last_active_day = Column(Date, nullable=True)
+
+class UserActivityYear(Base):
+    """
+    每人每年一列的運動點陣圖：366 bits（46 bytes），第 n 天（1 月 1 日 = 0）有運動就是 1。
+    bit 順序由高到低：第 n 天 → bits[n // 8] 的 0x80 >> (n % 8)。
+    火焰牆一次讀好幾年也只有幾列。
+    """
+    __tablename__ = "user_activity_years"
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    bits = Column(BINARY(46), nullable=False)
+
+class UserStats(Base):
+    """
+    每人的累計數字（成就條件、個人頁用），跟造成變化的事件同一個 transaction 累加。
+    來源表（checkins / runs / training_logs / item_usages / purchases）仍然是真相，
+    可以用 rebuild_user_stats 驗證 / 重算。
+    """
+    __tablename__ = "user_stats"
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    total_checkins = Column(Integer, nullable=False, default=0)
+    total_runs = Column(Integer, nullable=False, default=0)
+    total_distance_km = Column(DECIMAL(12, 3), nullable=False, default=0)
+    total_training_volume = Column(BigInteger, nullable=False, default=0)
+    items_used = Column(Integer, nullable=False, default=0)
+    purchases = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 class TrainingLog(Base):
     __tablename__ = "training_logs"
 
@@ -136,6 +262,9 @@ class InventoryItem(Base):
 
     item = relationship("StoreItem")
 
+    # 一人一種道具一列，購買時用 upsert 加數量
+    __table_args__ = (UniqueConstraint("user_id", "item_id", name="uq_inventory_user_item"),)
+
 class Purchase(Base):
     __tablename__ = "purchases"
     id = Column(BigInteger, primary_key=True, autoincrement=True)
@@ -152,6 +281,16 @@ class ItemUsage(Base):
     exp_gain = Column(Integer, nullable=False)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     
+class CatalogVersion(Base):
+    """
+    靜態目錄（store_items / achievements）的版本號，改了內容就 +1。
+    每個 worker 的 catalog 快取定期比對它，變了才重載（見 services/catalog.py）。
+    """
+    __tablename__ = "catalog_versions"
+    name = Column(String(32), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 class Achievement(Base):
     __tablename__ = "achievements"
     id = Column(BigInteger, primary_key=True, autoincrement=True)
@@ -173,6 +312,44 @@ class UserAchievement(Base):
     unlocked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
     achievement = relationship("Achievement")
+    __table_args__ = (UniqueConstraint("user_id", "achievement_id", name="uq_user_achievement"),)
+
+
+class AchievementStat(Base):
+    """
+    每個成就有幾個人解鎖（稀有度的分子），寫 user_achievements 時同一個 transaction +N。
+    分母是 global_counters 的 total_users。
+    """
+    __tablename__ = "achievement_stats"
+    achievement_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    unlock_count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class GlobalCounter(Base):
+    """全站計數（例如 total_users），事件發生時 +N，讀的時候 PK 一列。"""
+    __tablename__ = "global_counters"
+    name = Column(String(32), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class ChallengeTemplate(Base):
+    """
+    每週挑戰的範本：active 的範本每週各產生一列 weekly_challenges（同一週可以同時有好幾個挑戰）。
+    condition_type 見 services/challenges.py 的 CHALLENGE_CONDITIONS。
+    """
+    __tablename__ = "challenge_templates"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    code = Column(String(64), nullable=False, unique=True)
+    title = Column(String(64), nullable=False)
+    description = Column(String(255), nullable=True)
+    condition_type = Column(String(32), nullable=False)
+    condition_value = Column(Integer, nullable=False)
+    reward_coins = Column(Integer, nullable=False, default=0)
+    reward_exp = Column(Integer, nullable=False, default=0)
+    active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 
 class WeeklyChallenge(Base):
     __tablename__ = "weekly_challenges"
@@ -180,6 +357,7 @@ class WeeklyChallenge(Base):
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     week_start = Column(Date, nullable=False)
+    template_id = Column(BigInteger, ForeignKey("challenge_templates.id"), nullable=False)
     
     # ✅ 新增
     title = Column(String(64), nullable=False, default="本週挑戰")
@@ -191,3 +369,30 @@ class WeeklyChallenge(Base):
     reward_coins = Column(Integer, nullable=False, default=0)
     reward_exp = Column(Integer, nullable=False, default=0)
     completed_at = Column(DateTime, nullable=True)
+
+    # 目前進度：事件發生時在同一個 transaction 裡累加（或取較大值），跟 condition_value 比就知道有沒有達成
+    progress = Column(DECIMAL(14, 3), nullable=False, default=0)
+    __table_args__ = (
+        UniqueConstraint("user_id", "week_start", "template_id", name="uq_weekly_challenge_user_week_template"),
+    )
+
+
+class UserChallengeStats(Base):
+    """
+    每人的每週挑戰統計，讀的時候一列，不用掃所有週。
+    - completed_total / weeks_completed / *_week_run：挑戰完成時 +1（見 challenges.record_challenge_completions）
+      「完成的一週」= 那週至少完成一個挑戰；run 是連續幾週
+    - closed_*：已經結束的週（<= closed_through_week）共發了幾個、完成了幾個，
+      由 rollover job 換週時整批併進來，完成率 = closed_completed / closed_challenges
+    """
+    __tablename__ = "user_challenge_stats"
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    completed_total = Column(Integer, nullable=False, default=0)
+    weeks_completed = Column(Integer, nullable=False, default=0)
+    current_week_run = Column(Integer, nullable=False, default=0)
+    longest_week_run = Column(Integer, nullable=False, default=0)
+    last_completed_week = Column(Date, nullable=True)
+    closed_challenges = Column(Integer, nullable=False, default=0)
+    closed_completed = Column(Integer, nullable=False, default=0)
+    closed_through_week = Column(Date, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -1,6 +1,6 @@
 # path: app/models/user.py
 from datetime import datetime
-from sqlalchemy import Integer, String, DateTime
+from sqlalchemy import Integer, BigInteger, String, DateTime
 from sqlalchemy.orm import Mapped, mapped_column
 from app.core.db import Base
 
@@ -31,3 +31,6 @@ class User(Base):
     # ★ 重點：和 MySQL DATETIME 對齊，不要 timezone=True
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), default=utcnow_naive)
     last_login_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=False), nullable=True)
+
+    # 🔹 /me 看得到的狀態每變一次就 +1（user_state.mark_user_changed），拿來做 ETag
+    state_version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
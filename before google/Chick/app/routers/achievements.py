@@ -1,12 +1,16 @@
 # app/routers/achievements.py
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
 from datetime import datetime
 
 from app.core.db import get_db
 from app.core.deps import get_current_user_id
-from app.models.economy import Achievement, UserAchievement
+from app.core.etag import etag_matches, not_modified
+from app.models.economy import UserAchievement
+from app.services.achievements import achievement_catalog, get_condition_values
+from app.services.achievement_stats import rarity_cache
+from app.services.user_state import user_etag
 
 from pydantic import BaseModel
 from typing import Optional
@@ -20,13 +24,28 @@ class AchievementRow(BaseModel):
     description: Optional[str]
     unlocked: bool
     unlocked_at: Optional[datetime]
+    unlock_count: int
+    rarity_percent: Optional[float]   # 幾 % 的玩家有這個成就；還沒有玩家時是 None
 
 @router.get("/my", response_model=list[AchievementRow])
 def my_achievements(
+    request: Request,
+    response: Response,
     user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db),
 ):
-    achs = db.query(Achievement).all()
+    catalog, catalog_version = achievement_catalog.get_versioned(db)
+    # 稀有度的版本是 DB 的 total_users / total_unlocks，每個 worker 算出來的 ETag 一樣
+    rarity = rarity_cache.get(db)
+    etag = user_etag(
+        db, user_id, "achievements_my", catalog_version, rarity.total_users, rarity.total_unlocks
+    )
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    if etag:
+        response.headers["ETag"] = etag
+
+    achs = catalog.items
     ua_map = {
         ua.achievement_id: ua
         for ua in db.query(UserAchievement).filter(UserAchievement.user_id == user_id).all()
@@ -43,6 +62,79 @@ def my_achievements(
                 description=a.description,
                 unlocked=ua is not None,
                 unlocked_at=ua.unlocked_at if ua else None,
+                unlock_count=rarity.counts.get(a.id, 0),
+                rarity_percent=rarity.percent(a.id),
+            )
+        )
+    return result
+
+
+class AchievementProgressRow(BaseModel):
+    id: int
+    code: str
+    name: str
+    description: Optional[str]
+    condition_type: str
+    current_value: int
+    target_value: int
+    percent: float
+    unlocked: bool
+    unlocked_at: Optional[datetime]
+
+
+@router.get("/progress", response_model=list[AchievementProgressRow])
+def my_achievement_progress(
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """
+    每個成就目前的數值 / 目標 / 百分比。
+    成就定義來自目錄快取，數值讀 users + user_stats + user_streaks 一列，
+    再加 user_achievements 一次（idx user_id），跟成就數量無關。
+    已解鎖的一律 100%（streak 之類的數值之後可能掉回去）。
+    """
+    catalog, catalog_version = achievement_catalog.get_versioned(db)
+    # streak 跟日期有關，ETag 帶上今天
+    etag = user_etag(
+        db, user_id, "achievements_progress", catalog_version, datetime.utcnow().date()
+    )
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    if etag:
+        response.headers["ETag"] = etag
+
+    values = get_condition_values(db, user_id)
+    unlocked_at = {
+        aid: at
+        for aid, at in (
+            db.query(UserAchievement.achievement_id, UserAchievement.unlocked_at)
+            .filter(UserAchievement.user_id == user_id)
+            .all()
+        )
+    }
+
+    result: list[AchievementProgressRow] = []
+    for a in catalog.items:
+        current = values.get(a.condition_type, 0)
+        at = unlocked_at.get(a.id)
+        if at is not None or a.condition_value <= 0:
+            percent = 100.0
+        else:
+            percent = round(min(100.0, current * 100.0 / a.condition_value), 1)
+        result.append(
+            AchievementProgressRow(
+                id=a.id,
+                code=a.code,
+                name=a.name,
+                description=a.description,
+                condition_type=a.condition_type,
+                current_value=current,
+                target_value=a.condition_value,
+                percent=percent,
+                unlocked=at is not None,
+                unlocked_at=at,
             )
         )
     return result
@@ -0,0 +1,106 @@
+# app/routers/admin.py
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+
+from app.core.db import get_db
+from app.core.deps import get_current_user_id
+from app.models.user import User
+from app.schemas.economy import EconomySupplyOut, EconomyDayPoint, EconomySourcePoint
+from app.services.purchase import purchase_metrics
+from app.services.economy_rollup import get_supply_curve
+from app.services.user_state import me_summary_cache
+from app.services.catalog import CATALOGS, bump_catalog_version
+from app.services.achievements import achievement_catalog  # noqa: F401  註冊 achievements 目錄
+from app.services.challenges import challenge_template_catalog  # noqa: F401  註冊 challenge_templates 目錄
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def require_admin(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+) -> int:
+    """只有 users.status = 'admin' 的帳號可以打 /admin/*"""
+    status = db.query(User.status).filter(User.id == user_id).scalar()
+    if status != "admin":
+        raise HTTPException(status_code=403, detail="admin only")
+    return user_id
+
+
+@router.get("/metrics/purchases")
+def purchase_contention_metrics(_: int = Depends(require_admin)):
+    """
+    這個 worker 的購買 / 搶鎖統計（多個 uvicorn worker 時每個各自計算）。
+    """
+    return purchase_metrics.snapshot()
+
+
+@router.get("/metrics/me_cache")
+def me_cache_metrics(_: int = Depends(require_admin)):
+    """
+    這個 worker 的 /me 摘要快取命中率（多個 uvicorn worker 時每個各自計算）。
+    """
+    return me_summary_cache.snapshot()
+
+
+@router.get("/metrics/catalogs")
+def catalog_cache_metrics(_: int = Depends(require_admin)):
+    """
+    這個 worker 的目錄快取狀態：version、命中、查 version 次數、重載次數與耗時。
+    """
+    return {name: c.snapshot() for name, c in CATALOGS.items()}
+
+
+@router.post("/catalog/{name}/bump")
+def bump_catalog(
+    name: str,
+    _: int = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """
+    改完 store_items / achievements 之後打這支：version +1，
+    所有 worker 在下一次檢查（最多幾秒）時重載。
+    """
+    catalog = CATALOGS.get(name)
+    if catalog is None:
+        raise HTTPException(status_code=404, detail=f"unknown catalog: {name}")
+    bump_catalog_version(db, name)
+    db.commit()
+    catalog.invalidate()
+    return {"name": name, "version": catalog.version(db)}
+
+
+@router.get("/economy/supply", response_model=EconomySupplyOut)
+def economy_supply(
+    start: date | None = None,
+    end: date | None = None,
+    _: int = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """
+    每天各 source 發出 / 回收多少金幣（讀 economy_daily_rollups，不掃 ledger）。
+    預設最近 30 天；最多一次查 366 天。
+    資料只到 rollup job 最後一次跑的地方（約晚 10~15 分鐘）。
+    """
+    end = end or datetime.utcnow().date()
+    start = start or (end - timedelta(days=29))
+    if start > end or (end - start).days > 365:
+        raise HTTPException(status_code=400, detail="invalid date range (max 366 days)")
+
+    by_day: dict[date, list[EconomySourcePoint]] = {}
+    for r in get_supply_curve(db, start, end):
+        by_day.setdefault(r.day, []).append(
+            EconomySourcePoint(source=r.source, minted=r.minted, burned=r.burned, entries=r.entries)
+        )
+
+    days: list[EconomyDayPoint] = []
+    cur = start
+    while cur <= end:
+        sources = by_day.get(cur, [])
+        minted = sum(p.minted for p in sources)
+        burned = sum(p.burned for p in sources)
+        days.append(EconomyDayPoint(date=cur, minted=minted, burned=burned, net=minted - burned, sources=sources))
+        cur = cur + timedelta(days=1)
+
+    return EconomySupplyOut(start_date=start, end_date=end, days=days)
@@ -13,6 +13,8 @@ from app.core.security import (
 )
 from app.models.user import User
 from app.models.refresh_token import RefreshToken
+from app.services.achievement_stats import bump_total_users
+from app.services.user_state import mark_user_changed
 
 router = APIRouter(tags=["auth"])
 
@@ -51,9 +53,11 @@ def guest_login(payload: GuestIn, request: Request, db: Session = Depends(get_db
         # 確保 user.id 取得
         db.flush()           # 發出 INSERT，取得自增 id
         db.refresh(user)     # 重新載入 -> user.id 一定有值
+        bump_total_users(db)  # 成就稀有度的分母
         db.commit()
     else:
         user.last_login_at = now
+        mark_user_changed(db, user.id)  # /me 有 last_login_at
         db.commit()
         db.refresh(user)     # 讓 user 欄位最新（保險）
 
@@ -1,14 +1,22 @@
 # app/routers/challenges.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import date, datetime
+import base64
 
 from app.core.db import get_db
 from app.core.deps import get_current_user_id
-from app.models.user import User
-from app.services.challenges import get_or_create_this_week_challenge
-from app.services.chicken_status import get_weekly_activity_count
+from app.core.etag import etag_matches, not_modified
+from app.models.economy import WeeklyChallenge
+from app.services.challenges import (
+    challenge_template_catalog,
+    get_challenge_summary,
+    get_this_week_challenges,
+)
+from app.services.chicken_status import get_week_range_utc
+from app.services.user_state import user_etag
 
 from pydantic import BaseModel
 from typing import Optional
@@ -19,6 +27,7 @@ router = APIRouter(prefix="/challenges", tags=["challenges"])
 
 class WeeklyChallengeRow(BaseModel):
     week_start: str
+    template_id: int
     title: str
     description: Optional[str]
     condition_type: str
@@ -26,38 +35,144 @@ class WeeklyChallengeRow(BaseModel):
 
     target_count: int
     current_count: int
+    progress: float
     reward_coins: int
     reward_exp: int
     completed: bool
     completed_at: Optional[datetime]
 
 
-@router.get("/weekly", response_model=WeeklyChallengeRow)
-def get_weekly_challenge(
-    user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db),
-):
-    # 撈 user
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # 取得或建立本週挑戰
-    wc = get_or_create_this_week_challenge(db, user)
-
-    # 本週目前活動次數
-    current_count = get_weekly_activity_count(db, user_id)
-
+def _to_row(wc: WeeklyChallenge) -> WeeklyChallengeRow:
+    progress = float(wc.progress or 0)
     return WeeklyChallengeRow(
         week_start=str(wc.week_start),
+        template_id=wc.template_id,
         title=wc.title,
         description=wc.description,
         condition_type=wc.condition_type,
         condition_value=wc.condition_value,
         target_count=wc.target_count,
-        current_count=current_count,
+        current_count=int(progress),
+        progress=progress,
         reward_coins=wc.reward_coins,
         reward_exp=wc.reward_exp,
         completed=(wc.completed_at is not None),
         completed_at=wc.completed_at,
     )
+
+
+def _this_week_rows(request: Request, response: Response, user_id: int, db: Session, name: str):
+    # ETag = state_version + 本週（跨週就是新的挑戰）+ 範本版本（還沒建列的人看到的是範本內容）
+    week_start, _ = get_week_range_utc()
+    templates, templates_version = challenge_template_catalog.get_versioned(db)
+    etag = user_etag(db, user_id, name, week_start.date(), templates_version)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    # 本週挑戰（唯讀；rollover job 還沒建到的人回傳範本內容、進度 0）
+    return [_to_row(wc) for wc in get_this_week_challenges(db, user_id, templates)]
+
+
+@router.get("/weekly", response_model=WeeklyChallengeRow)
+def get_weekly_challenge(
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """本週第一個挑戰（舊版 client 用；同時有好幾個挑戰請用 /challenges/weekly/all）。"""
+    rows = _this_week_rows(request, response, user_id, db, "challenges_weekly")
+    if isinstance(rows, Response):
+        return rows
+    if not rows:
+        raise HTTPException(status_code=404, detail="No weekly challenge")
+    return rows[0]
+
+
+@router.get("/weekly/all", response_model=list[WeeklyChallengeRow])
+def get_weekly_challenges(
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """本週所有挑戰和進度（一次索引查詢，跟挑戰數量無關）。"""
+    return _this_week_rows(request, response, user_id, db, "challenges_weekly_all")
+
+
+class ChallengeSummary(BaseModel):
+    completion_rate: Optional[float]      # 已結束的週：完成的挑戰 / 發出的挑戰；還沒有結束的週時是 None
+    closed_challenges: int
+    closed_completed: int
+    completed_total: int                  # 含本週
+    weeks_completed: int                  # 至少完成一個挑戰的週數
+    current_week_run: int                 # 目前連續完成幾週（上週、本週都沒完成就是 0）
+    longest_week_run: int
+    last_completed_week: Optional[date]
+
+
+class ChallengeHistoryOut(BaseModel):
+    summary: ChallengeSummary
+    items: list[WeeklyChallengeRow]
+    next_cursor: Optional[str] = None     # 沒有下一頁就是 None
+
+
+def _encode_cursor(week_start: date, template_id: int) -> str:
+    raw = f"{week_start.isoformat()}|{template_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[date, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ws, template_id = raw.split("|", 1)
+        return date.fromisoformat(ws), int(template_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+@router.get("/history", response_model=ChallengeHistoryOut)
+def challenge_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """
+    過去的每週挑戰（新到舊）+ 統計。
+
+    - 用 (week_start, template_id) 當 cursor 往下翻，走 uq_weekly_challenge_user_week_template，
+      翻到多深都只讀 limit 筆；第一頁不帶 cursor，之後把 next_cursor 原封不動帶回來
+    - summary 讀 user_challenge_stats 一列（完成時 / 換週時增量維護），不會掃所有週
+    """
+    # summary 的 current_week_run 跟「現在是哪一週」有關（跨週沒完成就歸零），ETag 帶上本週
+    week_start, _ = get_week_range_utc()
+    etag = user_etag(db, user_id, "challenges_history", week_start.date(), limit, cursor)
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    if etag:
+        response.headers["ETag"] = etag
+
+    q = db.query(WeeklyChallenge).filter(WeeklyChallenge.user_id == user_id)
+    if cursor:
+        c_ws, c_tid = _decode_cursor(cursor)
+        q = q.filter(or_(
+            WeeklyChallenge.week_start < c_ws,
+            and_(WeeklyChallenge.week_start == c_ws, WeeklyChallenge.template_id < c_tid),
+        ))
+
+    # 多拿一筆判斷還有沒有下一頁
+    rows = q.order_by(WeeklyChallenge.week_start.desc(), WeeklyChallenge.template_id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return ChallengeHistoryOut(
+        summary=ChallengeSummary(**get_challenge_summary(db, user_id)),
+        items=[_to_row(wc) for wc in rows],
+        next_cursor=_encode_cursor(rows[-1].week_start, rows[-1].template_id) if has_more else None,
+    )
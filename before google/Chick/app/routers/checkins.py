@@ -1,10 +1,11 @@
 # path: app/routers/checkins.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from starlette import status
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from app.core.db import get_db
 from app.core.deps import get_current_user_id
+from app.core.etag import etag_matches, not_modified
 from app.models.economy import Checkin, CheckinStatus
 from app.schemas.economy import (
     CheckinStartIn, CheckinStartOut, CheckinHeartbeatIn,
@@ -12,14 +13,18 @@ from app.schemas.economy import (
 )
 from app.services.ledger import add_ledger_entry
 from app.models.user import User
-from app.services.level import apply_exp_and_update
+from app.services.exp_ledger import award_exp
 from app.services.chicken_status import (
+    get_current_streak,
     get_weekly_activity_count,
     calc_chicken_status,
     chicken_exp_multiplier,
 )
 from app.services.achievements import check_and_unlock_achievements
-from app.services.challenges import check_weekly_challenge
+from app.services.challenges import bump_challenge_progress, check_weekly_challenge
+from app.services.activity import record_activity
+from app.services.user_stats import bump_stats
+from app.services.user_state import mark_user_changed, user_etag
 from app.models.gym import Gym
 
 from sqlalchemy import text
@@ -58,6 +63,7 @@ def checkin_start(payload: CheckinStartIn, user_id: int = Depends(get_current_us
         gym_id=gym.id
     )
     db.add(row)
+    mark_user_changed(db, user_id)  # 今天打卡狀態變成 started
     db.commit()
     db.refresh(row)
     return CheckinStartOut(checkin_id=row.id, status=row.status, started_at=row.started_at)
@@ -132,6 +138,7 @@ def checkin_rewind_start(
 
     # （accum_minutes 暫時不用動，單純靠 last_tick_at 就能假裝時間過很久）
 
+    mark_user_changed(db, user_id)  # started_at 可能被調到前一天
     db.commit()
     db.refresh(row)
 
@@ -145,6 +152,16 @@ def checkin_rewind_start(
         ended_at=row.ended_at,
     )
     
+def _bump_checkin_challenges(db: Session, user_id: int, row: Checkin) -> None:
+    # 要在 record_activity 之後呼叫（streak 才是更新過的）
+    bump_challenge_progress(
+        db, user_id, row.started_at.date(),
+        weekly_activity_count=1,
+        checkin_minutes=row.accum_minutes or 0,
+        streak_days=get_current_streak(db, user_id),
+    )
+
+
 @router.post("/end", response_model=CheckinEndOut)
 def checkin_end(payload: CheckinEndIn, user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
     row = db.query(Checkin).filter(
@@ -163,6 +180,7 @@ def checkin_end(payload: CheckinEndIn, user_id: int = Depends(get_current_user_i
     row.end_lng = payload.lng
     row.ended_at = now
     row.status = CheckinStatus.ended
+    mark_user_changed(db, user_id)
 
     # --- 再跑一次累積邏輯（避免使用者沒打最後一個 heartbeat）---
     last = row.last_tick_at or row.started_at
@@ -198,7 +216,15 @@ def checkin_end(payload: CheckinEndIn, user_id: int = Depends(get_current_user_i
         # 今天已經獲得過獎勵了，這次就算過關但不再給幣
         row.status = CheckinStatus.verified
         row.reason = "DAILY_LIMIT_REACHED"
+        record_activity(db, user_id, row.started_at)
+        bump_stats(db, user_id, total_checkins=1)
+        _bump_checkin_challenges(db, user_id, row)
         db.commit()
+
+        # 沒發幣也算運動，週挑戰的進度可能剛好達標
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            check_weekly_challenge(db, user, row.started_at.date())
         return CheckinEndOut(verified=True, dwell_minutes=row.accum_minutes, coins_awarded=0)
 
     # --- 計算獎勵金幣（以 5 分鐘為單位，最多 40 分）---
@@ -207,6 +233,9 @@ def checkin_end(payload: CheckinEndIn, user_id: int = Depends(get_current_user_i
     coins = units * COINS_PER_5_MIN   # 依你設的常數調整
 
     row.status = CheckinStatus.verified
+    record_activity(db, user_id, row.started_at)
+    bump_stats(db, user_id, total_checkins=1)
+    _bump_checkin_challenges(db, user_id, row)
     db.commit()
 
     awarded = add_ledger_entry(
@@ -234,12 +263,12 @@ def checkin_end(payload: CheckinEndIn, user_id: int = Depends(get_current_user_i
             multiplier = chicken_exp_multiplier(status)     # 0.5 / 1.0 / 1.5
 
             exp_gain = int(base_exp * multiplier)
-            apply_exp_and_update(user, exp_gain)
+            award_exp(db, user, exp_gain, "checkin", row.id, f"checkin:{row.id}")
             db.commit()
             
-            # 🔹 新增：週挑戰 & 成就
-            check_weekly_challenge(db, user)
-            check_and_unlock_achievements(db, user)
+            # 🔹 新增：週挑戰 & 成就（跟 _bump_checkin_challenges 一樣算打卡開始那週）
+            check_weekly_challenge(db, user, row.started_at.date())
+            check_and_unlock_achievements(db, user, "checkin")
             
     return CheckinEndOut(verified=True, dwell_minutes=row.accum_minutes, coins_awarded=awarded)
 
@@ -256,7 +285,12 @@ def checkin_latest(user_id: int = Depends(get_current_user_id), db: Session = De
     )
 
 @router.get("/history", response_model=list[CheckinRow])
-def checkin_history(limit: int = 50, offset: int = 0, user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def checkin_history(request: Request, response: Response, limit: int = 50, offset: int = 0, user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    etag = user_etag(db, user_id, "checkins_history", limit, offset)
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    if etag:
+        response.headers["ETag"] = etag
     rows = db.query(Checkin).filter(Checkin.user_id == user_id).order_by(Checkin.id.desc()).offset(offset).limit(limit).all()
     return [
         CheckinRow(
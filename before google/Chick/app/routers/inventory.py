@@ -5,8 +5,10 @@ from sqlalchemy.orm import Session
 from app.core.db import get_db
 from app.core.deps import get_current_user_id
 from app.models.economy import InventoryItem, StoreItem, ItemUsage
+from app.services.catalog import store_catalog
+from app.services.user_stats import bump_stats
 from app.schemas.economy import InventoryItemRow, UseItemIn, UseItemResult
-from app.services.level import apply_exp_and_update
+from app.services.exp_ledger import award_exp
 from app.models.user import User
 from app.services.chicken_status import (
     get_weekly_activity_count,
@@ -58,7 +60,7 @@ def use_item(
         raise HTTPException(status_code=400, detail="item not in inventory")
 
     # 找道具資料
-    item = db.query(StoreItem).filter(StoreItem.id == payload.item_id).first()
+    item = store_catalog.get(db).by_id.get(payload.item_id)
     if not item:
         raise HTTPException(status_code=404, detail="item not found")
 
@@ -81,26 +83,23 @@ def use_item(
     # 3) 實際吃到的小雞 EXP
     exp_gain = int(base_exp * multiplier)
 
-    # 使用一次：背包數量 -1
+    # 使用一次：背包數量 -1 + 使用紀錄（存「實際拿到的 EXP」）+ 加 EXP，同一個 commit
     inv.quantity -= 1
-    db.commit()
-
-    # 實際加到 user.exp / level
-    apply_exp_and_update(user, exp_gain)
-    db.commit()
-    db.refresh(user)
-
-    # 🔹 在這裡檢查成就（例如 Level 達到幾級）
-    check_and_unlock_achievements(db, user)  
-    
-    # 紀錄使用紀錄（存「實際拿到的 EXP」）
     usage = ItemUsage(
         user_id=user_id,
         item_id=item.id,
         exp_gain=exp_gain,
     )
     db.add(usage)
+    db.flush()
+    bump_stats(db, user_id, items_used=1)
+
+    award_exp(db, user, exp_gain, "item_use", usage.id, f"item_use:{usage.id}")
     db.commit()
+    db.refresh(user)
+
+    # 🔹 在這裡檢查成就（例如 Level 達到幾級）
+    check_and_unlock_achievements(db, user, "item_use")
 
     remaining_qty = max(inv.quantity, 0)
 
@@ -1,22 +1,26 @@
 # app/routers/me.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, date
+from typing import Literal, Optional
 from pydantic import BaseModel, Field
+import base64
 
 from app.core.db import get_db
 from app.core.deps import get_current_user_id
-from app.services.ledger import get_coins_balance
-from app.schemas.economy import MeSummary
-from app.models.economy import Checkin, CheckinStatus
+from app.core.etag import etag_matches, make_etag, not_modified
+from app.schemas.economy import MeSummary, CoinsLedgerRow, CoinsHistoryOut
+from app.models.economy import Checkin, CoinsLedger
 from app.models.user import User
-from app.services.level import calc_exp_progress
 from app.services.chicken_status import (
-    get_weekly_activity_count,
-    calc_chicken_status,
-    get_all_activity_dates,
-    calc_current_streak,
+    get_activity_dates_between,
+    get_activity_bitmaps,
+    bitmap_days,
 )
+from app.services.level import LEVEL_CURVE_FINGERPRINT
+from app.services.me_summary import get_me_summary_cached, today_checkin_status
+from app.services.user_state import get_state_version, mark_user_changed, user_etag
 
 router = APIRouter(prefix="/me", tags=["me"])
 
@@ -37,6 +41,7 @@ def rename_chicken(
         raise HTTPException(status_code=404, detail="user not found")
 
     user.chicken_name = payload.name.strip()
+    mark_user_changed(db, user_id)
     db.commit()
     db.refresh(user)
 
@@ -51,89 +56,144 @@ class ActivityCalendarOut(BaseModel):
     end_date: date
     days: list[ActivityDay]
 
+class ActivityYearBits(BaseModel):
+    year: int
+    bits: str  # base64，366 bits，第 n 天 → byte n//8 的 0x80 >> (n%8)
+
+class ActivityRange(BaseModel):
+    start: date
+    end: date  # 含
+
+class ActivityCalendarCompactOut(BaseModel):
+    from_year: int
+    to_year: int
+    encoding: Literal["bitmap", "ranges"]
+    years: Optional[list[ActivityYearBits]] = None
+    ranges: Optional[list[ActivityRange]] = None
+
+# compact 版一次最多回幾年
+MAX_COMPACT_YEARS = 10
+
 def get_today_checkin_status(db: Session, user_id: int) -> str:
     """
     檢查今天是否有打卡，以及狀態為何（started/verified/awarded）
     """
-    today = datetime.utcnow().date()
     latest = (
-        db.query(Checkin)
+        db.query(Checkin.status, Checkin.started_at)
         .filter(Checkin.user_id == user_id)
         .order_by(Checkin.id.desc())
         .first()
     )
-
-    if (
-        latest
-        and latest.started_at
-        and latest.started_at.date() == today
-        and latest.status in (
-            CheckinStatus.started,
-            CheckinStatus.verified,
-            CheckinStatus.awarded,
-        )
-    ):
-        return latest.status.name
-
-    return "none"
+    if not latest:
+        return "none"
+    return today_checkin_status(latest.status, latest.started_at, datetime.utcnow().date())
 
 
 @router.get("", response_model=MeSummary)
 def read_me(
+    request: Request,
+    response: Response,
     user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db),
 ):
-    # 1) 撈 user 看 exp / level / status / last_login_at
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    # ETag = state_version + 今天（streak / 今天打卡狀態跨日會變）+ 等級曲線（同 user_etag）
+    state_version = get_state_version(db, user_id)
+    if state_version is None:
+        raise HTTPException(status_code=404, detail="user not found")
+    today = datetime.utcnow().date()
+    etag = make_etag(user_id, state_version, "me", today, LEVEL_CURVE_FINGERPRINT)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    # user / 餘額 / 今天打卡 / 本週次數 / streak 一條 SQL 拿完（見 services/me_summary.py），
+    # 結果放在行程內快取；快取用的 state_version 跟上面 ETag 的不同就重讀（別的 worker 寫過）
+    summary = get_me_summary_cached(db, user_id, state_version, today)
+    if summary is None:
         raise HTTPException(status_code=404, detail="user not found")
+    return summary
+
+
+def _encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
 
-    # 2) 金幣餘額
-    coins = get_coins_balance(db, user_id)
-
-    # 3) 今天打卡狀態
-    today_status = get_today_checkin_status(db, user_id)
-
-    # 4) 本週運動次數 & 小雞狀態
-    weekly_count = get_weekly_activity_count(db, user_id)
-    chicken_status = calc_chicken_status(weekly_count)
-
-    # 5) 連續運動天數（streak）
-    activity_dates = get_all_activity_dates(db, user_id)
-    current_streak = calc_current_streak(activity_dates)
-    
-    # 6) 計算等級 + 經驗值進度
-    total_exp = user.exp or 0
-    progress = calc_exp_progress(total_exp)
-
-
-    # 7) 組出回傳
-    return MeSummary(
-        user_id=user_id,
-        status=user.status if user.status in ("guest", "user", "admin") else "guest",
-        coins=coins,
-        today_checkin_status=today_status,
-        last_login_at=user.last_login_at,
-        
-        # ✅ 新增：回傳小雞名字，沒有就給一個預設顯示文字
-        chicken_name=user.chicken_name or "無名小雞（稀有）",
-        
-         # ✅ 總 EXP & 等級（等級用計算的，確保跟 EXP 一致）
-        exp=progress["current_exp"],
-        level=progress["level"],
-
-        # ✅ 你要的兩個數字：目前 / 需要
-        exp_in_current_level=progress["exp_in_current_level"],       # 分子：目前
-        exp_for_next_level=progress["required_for_next_level"],     # 分母：這一級總共需要
-        exp_remaining_to_next_level=progress["remain_to_next_level"],
-        chicken_status=chicken_status,
-        weekly_activity_count=weekly_count,
-        current_streak=current_streak,
+
+@router.get("/coins/history", response_model=CoinsHistoryOut)
+def coins_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = None,
+    source: list[str] | None = Query(None),
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """
+    錢包明細（新到舊）。
+
+    - 用 (created_at, id) 當 cursor 往下翻，不用 OFFSET，走 idx_coins_user_created，
+      翻到多深都只讀 limit 筆。
+    - 第一頁不帶 cursor；之後把回傳的 next_cursor 原封不動帶回來，None 代表沒了。
+    - source 可以帶多個：?source=checkin&source=run
+    """
+    etag = user_etag(db, user_id, "coins_history", limit, cursor, ",".join(sorted(source or [])))
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    if etag:
+        response.headers["ETag"] = etag
+
+    q = db.query(
+        CoinsLedger.id,
+        CoinsLedger.delta,
+        CoinsLedger.source,
+        CoinsLedger.ref_id,
+        CoinsLedger.created_at,
+    ).filter(CoinsLedger.user_id == user_id)
+
+    if source:
+        q = q.filter(CoinsLedger.source.in_(source))
+
+    if cursor:
+        c_at, c_id = _decode_cursor(cursor)
+        q = q.filter(or_(
+            CoinsLedger.created_at < c_at,
+            and_(CoinsLedger.created_at == c_at, CoinsLedger.id < c_id),
+        ))
+
+    # 多拿一筆判斷還有沒有下一頁
+    rows = q.order_by(CoinsLedger.created_at.desc(), CoinsLedger.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return CoinsHistoryOut(
+        items=[
+            CoinsLedgerRow(
+                id=r.id,
+                delta=r.delta,
+                source=r.source,
+                ref_id=r.ref_id,
+                created_at=r.created_at,
+            )
+            for r in rows
+        ],
+        next_cursor=_encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
     )
 
 
 @router.get("/activity_calendar", response_model=ActivityCalendarOut)
 def get_activity_calendar(
+    request: Request,
+    response: Response,
     days: int = 60,
     user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db),
@@ -145,16 +205,22 @@ def get_activity_calendar(
     - active = True 的日子，表示：
         - 有成功打卡（verified / awarded）
         - 或有成功跑步（awarded）
-      這個邏輯由 get_all_activity_dates 幫你算好。
+      這個邏輯由 user_activity_days（打卡 / 跑步成功時寫入）幫你算好。
     """
     if days < 1 or days > 365:
-        raise HTTPException(statuws_code=400, detail="days must be between 1 and 365")
+        raise HTTPException(status_code=400, detail="days must be between 1 and 365")
 
     today = datetime.utcnow().date()
     start_date = today - timedelta(days=days - 1)
 
-    # 這個會回傳「所有有運動的日期」，是個 set[date]
-    activity_dates = get_all_activity_dates(db, user_id)
+    etag = user_etag(db, user_id, "activity_calendar", days, today)
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    if etag:
+        response.headers["ETag"] = etag
+
+    # 只讀這段期間「有運動的日期」，是個 set[date]
+    activity_dates = get_activity_dates_between(db, user_id, start_date, today)
 
     day_list: list[ActivityDay] = []
     cur = start_date
@@ -170,3 +236,55 @@ def get_activity_calendar(
         end_date=today,
         days=day_list,
     )
+
+@router.get("/activity_calendar/compact", response_model=ActivityCalendarCompactOut)
+def get_activity_calendar_compact(
+    request: Request,
+    response: Response,
+    from_year: Optional[int] = None,
+    to_year: Optional[int] = None,
+    encoding: Literal["bitmap", "ranges"] = "bitmap",
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """
+    火焰牆的精簡版：直接讀 user_activity_years（一年一列）。
+
+    - from_year / to_year：預設今年，最多一次 10 年
+    - encoding=bitmap：每年一段 base64 點陣圖，沒運動的年份不回
+    - encoding=ranges：連續有運動的日子合併成 [start, end]（舊 → 新）
+    """
+    this_year = datetime.utcnow().year
+    to_year = to_year or this_year
+    from_year = from_year or to_year
+    if from_year > to_year or to_year - from_year + 1 > MAX_COMPACT_YEARS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"year range must be 1 to {MAX_COMPACT_YEARS} years",
+        )
+
+    etag = user_etag(db, user_id, "activity_calendar_compact", from_year, to_year, encoding)
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    if etag:
+        response.headers["ETag"] = etag
+
+    bitmaps = get_activity_bitmaps(db, user_id, from_year, to_year)
+    out = ActivityCalendarCompactOut(from_year=from_year, to_year=to_year, encoding=encoding)
+
+    if encoding == "bitmap":
+        out.years = [
+            ActivityYearBits(year=y, bits=base64.b64encode(bitmaps[y]).decode("ascii"))
+            for y in sorted(bitmaps)
+        ]
+        return out
+
+    ranges: list[ActivityRange] = []
+    for y in sorted(bitmaps):
+        for d in bitmap_days(y, bitmaps[y]):
+            if ranges and ranges[-1].end + timedelta(days=1) == d:
+                ranges[-1].end = d
+            else:
+                ranges.append(ActivityRange(start=d, end=d))
+    out.ranges = ranges
+    return out
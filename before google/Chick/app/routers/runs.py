@@ -1,22 +1,27 @@
 # path: app/routers/runs.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
 from datetime import datetime
 from random import randint
 from app.core.db import get_db
 from app.core.deps import get_current_user_id
+from app.core.etag import etag_matches, not_modified
 from app.models.economy import Run, RunStatus
 from app.schemas.economy import RunSummaryIn, RunSummaryOut, RunRow
 from app.services.ledger import add_ledger_entry
 from app.models.user import User
-from app.services.level import apply_exp_and_update
+from app.services.exp_ledger import award_exp
 from app.services.chicken_status import (
+    get_current_streak,
     get_weekly_activity_count,
     calc_chicken_status,
     chicken_exp_multiplier,
 )
 from app.services.achievements import check_and_unlock_achievements
-from app.services.challenges import check_weekly_challenge
+from app.services.challenges import bump_challenge_progress, check_weekly_challenge
+from app.services.activity import record_activity
+from app.services.user_stats import bump_stats
+from app.services.user_state import mark_user_changed, user_etag
 
 router = APIRouter(prefix="/runs", tags=["runs"])
 MAX_VALID_SPEED = 20.0  # km/h
@@ -34,6 +39,7 @@ def runs_summary(payload: RunSummaryIn, user_id: int = Depends(get_current_user_
             created_at=datetime.utcnow()
         )
         db.add(row)
+        mark_user_changed(db, user_id)  # /runs/history 會多一筆 rejected
         db.commit()
         return RunSummaryOut(coins_awarded=0, status=row.status)
 
@@ -50,6 +56,14 @@ def runs_summary(payload: RunSummaryIn, user_id: int = Depends(get_current_user_
         created_at=datetime.utcnow()
     )
     db.add(row)
+    record_activity(db, user_id, row.created_at)
+    bump_stats(db, user_id, total_runs=1, total_distance_km=payload.distance_km)
+    bump_challenge_progress(
+        db, user_id, row.created_at.date(),
+        weekly_activity_count=1,
+        run_distance_km=payload.distance_km,
+        streak_days=get_current_streak(db, user_id),
+    )
     db.commit()
     db.refresh(row)
 
@@ -57,6 +71,7 @@ def runs_summary(payload: RunSummaryIn, user_id: int = Depends(get_current_user_
         db=db, user_id=user_id, delta=coins,
         source="run", ref_id=row.id, idempotency_key=f"run:{row.id}"
     )
+    db.commit()
     # ✅ 跑步給 EXP（只有真的有發幣時才給）
     if coins > 0:
         user = db.query(User).filter(User.id == user_id).first()
@@ -71,17 +86,22 @@ def runs_summary(payload: RunSummaryIn, user_id: int = Depends(get_current_user_
 
             # 乘上倍率後的實際 EXP
             exp_gain = int(base_exp * multiplier)
-            apply_exp_and_update(user, exp_gain)
+            award_exp(db, user, exp_gain, "run", row.id, f"run:{row.id}")
             db.commit()
             
             # 🔹 新增：週挑戰 & 成就
-            check_weekly_challenge(db, user)
-            check_and_unlock_achievements(db, user)
+            check_weekly_challenge(db, user, row.created_at.date())
+            check_and_unlock_achievements(db, user, "run")
             
     return RunSummaryOut(coins_awarded=coins, status=row.status)
 
 @router.get("/history", response_model=list[RunRow])
-def runs_history(limit: int = 50, offset: int = 0, user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def runs_history(request: Request, response: Response, limit: int = 50, offset: int = 0, user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    etag = user_etag(db, user_id, "runs_history", limit, offset)
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    if etag:
+        response.headers["ETag"] = etag
     rows = db.query(Run).filter(Run.user_id == user_id).order_by(Run.id.desc()).offset(offset).limit(limit).all()
     return [
         RunRow(
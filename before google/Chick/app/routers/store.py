@@ -1,18 +1,27 @@
 # app/routers/store.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
 from app.core.deps import get_current_user_id
-from app.models.economy import StoreItem, InventoryItem, Purchase
+from app.core.etag import make_etag, etag_matches, not_modified
 from app.schemas.economy import StoreItemRow, PurchaseCreate, PurchaseResult
-from app.services.ledger import add_ledger_entry, get_coins_balance
+from app.models.user import User
+from app.services.achievements import check_and_unlock_achievements
+from app.services.catalog import store_catalog
+from app.services.purchase import purchase_item as do_purchase, NotEnoughCoins, PurchaseBusy
 
 router = APIRouter(prefix="/store", tags=["store"])
 
 @router.get("/items", response_model=list[StoreItemRow])
-def list_store_items(db: Session = Depends(get_db)):
-    rows = db.query(StoreItem).order_by(StoreItem.id.asc()).all()
+def list_store_items(request: Request, response: Response, db: Session = Depends(get_db)):
+    # 目錄在行程內快取（services/catalog.py），ETag 就是目錄的 version
+    catalog, version = store_catalog.get_versioned(db)
+    etag = make_etag("store_items", version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
     return [
         StoreItemRow(
             id=r.id,
@@ -22,7 +31,7 @@ def list_store_items(db: Session = Depends(get_db)):
             exp_max=r.exp_max,
             description=r.description,
         )
-        for r in rows
+        for r in catalog.items
     ]
 
 @router.post("/purchase", response_model=PurchaseResult)
@@ -31,53 +40,33 @@ def purchase_item(
     user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db),
 ):
-    item = db.query(StoreItem).filter(StoreItem.id == payload.item_id).first()
+    item = store_catalog.get(db).by_id.get(payload.item_id)
     if not item:
         raise HTTPException(status_code=404, detail="item not found")
 
-    coins_before = get_coins_balance(db, user_id)
-    if coins_before < item.price_coins:
-        raise HTTPException(status_code=400, detail="not enough coins")
-
-    # 1) 建立購買紀錄（紀錄花錢）
-    purchase = Purchase(
-        user_id=user_id,
+    result = PurchaseResult(
         item_id=item.id,
+        item_name=item.name,
         coins_spent=item.price_coins,
+        coins_after=0,
     )
-    db.add(purchase)
-    db.commit()
-    db.refresh(purchase)
-
-    # 2) 背包 +1（有就加，沒有就新建）
-    inv = db.query(InventoryItem).filter(
-        InventoryItem.user_id == user_id,
-        InventoryItem.item_id == item.id,
-    ).first()
-
-    if not inv:
-        inv = InventoryItem(user_id=user_id, item_id=item.id, quantity=1)
-        db.add(inv)
-    else:
-        inv.quantity += 1
-
-    db.commit()
 
-    # 3) 金幣總帳扣款
-    add_ledger_entry(
-        db=db,
-        user_id=user_id,
-        delta=-item.price_coins,
-        source="purchase",
-        ref_id=purchase.id,
-        idempotency_key=f"purchase:{purchase.id}",
-    )
+    # 鎖餘額 → 購買紀錄 → 背包 +1 → 扣款，一次 commit
+    try:
+        _, result.coins_after = do_purchase(db, user_id, item)
+    except NotEnoughCoins:
+        raise HTTPException(status_code=400, detail="not enough coins")
+    except PurchaseBusy as e:
+        # 同一個人的購買在搶鎖，什麼都沒扣；client 照 Retry-After 重送即可
+        raise HTTPException(
+            status_code=503,
+            detail="purchase busy, retry later",
+            headers={"Retry-After": str(e.retry_after_seconds)},
+        )
 
-    coins_after = get_coins_balance(db, user_id)
+    # 購買次數類的成就（沒有這類成就時不會多做事）
+    user = db.query(User).filter(User.id == user_id).first()
+    if user:
+        check_and_unlock_achievements(db, user, "purchase")
 
-    return PurchaseResult(
-        item_id=item.id,
-        item_name=item.name,
-        coins_spent=item.price_coins,
-        coins_after=coins_after,
-    )
+    return result
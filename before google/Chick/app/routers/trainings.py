@@ -1,5 +1,5 @@
 # path: app/routers/trainings.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta, date
@@ -7,11 +7,17 @@ from decimal import Decimal
 
 from app.core.db import get_db
 from app.core.deps import get_current_user_id
+from app.core.etag import etag_matches, not_modified
 from app.models.economy import TrainingLog
 from app.schemas.economy import (
     TrainingLogCreate, TrainingLogRow,
     TrainingStatsOut, TrainingStatsPoint,
 )
+from app.services.user_state import mark_user_changed, user_etag
+from app.services.user_stats import bump_stats
+from app.services.achievements import check_and_unlock_achievements
+from app.services.challenges import bump_challenge_progress, check_weekly_challenge
+from app.models.user import User
 
 router = APIRouter(prefix="/trainings", tags=["trainings"])
 
@@ -40,9 +46,17 @@ def create_training_log(
         created_at=now,
     )
     db.add(row)
+    bump_stats(db, user_id, total_training_volume=volume)
+    bump_challenge_progress(db, user_id, now.date(), training_volume=volume)
+    mark_user_changed(db, user_id)
     db.commit()
     db.refresh(row)
 
+    user = db.query(User).filter(User.id == user_id).first()
+    if user:
+        check_weekly_challenge(db, user, now.date())
+        check_and_unlock_achievements(db, user, "training")
+
     return TrainingLogRow(
         id=row.id,
         exercise_name=row.exercise_name,
@@ -55,11 +69,19 @@ def create_training_log(
 
 @router.get("/logs/history", response_model=list[TrainingLogRow])
 def training_logs_history(
+    request: Request,
+    response: Response,
     limit: int = 50,
     offset: int = 0,
     user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db),
 ):
+    etag = user_etag(db, user_id, "training_logs_history", limit, offset)
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    if etag:
+        response.headers["ETag"] = etag
+
     rows = (
         db.query(TrainingLog)
         .filter(TrainingLog.user_id == user_id)
@@ -30,6 +30,37 @@ class MeSummary(BaseModel):
     # 🔹 新增：目前連續運動天數
     current_streak: int
 
+# /me/coins/history（錢包明細）
+class CoinsLedgerRow(BaseModel):
+    id: int
+    delta: int
+    source: str
+    ref_id: Optional[int] = None
+    created_at: datetime
+
+class CoinsHistoryOut(BaseModel):
+    items: list[CoinsLedgerRow]
+    next_cursor: Optional[str] = None  # 沒有下一頁就是 None
+
+# /admin/economy/supply（金幣發行 / 回收曲線）
+class EconomySourcePoint(BaseModel):
+    source: str
+    minted: int
+    burned: int
+    entries: int
+
+class EconomyDayPoint(BaseModel):
+    date: date
+    minted: int
+    burned: int
+    net: int
+    sources: list[EconomySourcePoint]
+
+class EconomySupplyOut(BaseModel):
+    start_date: date
+    end_date: date
+    days: list[EconomyDayPoint]
+
 # 打卡
 class CheckinStartIn(BaseModel):
     lat: Optional[float] = Field(None, ge=-90, le=90)
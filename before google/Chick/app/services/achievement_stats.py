@@ -0,0 +1,115 @@
+# app/services/achievement_stats.py
+"""
+成就稀有度：「X% 的玩家有這個成就」。
+
+- 分子 achievement_stats.unlock_count：寫 user_achievements 時同一個 transaction +N，
+  同時 global_counters 的 total_unlocks 也 +N（全部成就的解鎖數加總）
+- 分母 global_counters 的 total_users：建立新帳號時 +1
+- total_users / total_unlocks 就是稀有度的版本（跟目錄的 catalog_versions 一樣放在 DB）：
+  每次讀先 PK 查這兩列，ETag 用它們，所有 worker 算出來的一樣；
+  行程內快取的那份跟這兩個數字一樣才用，不一樣就重讀 achievement_stats（全部成就一個 PK 掃描），
+  不用對 user_achievements 做 COUNT(*) GROUP BY
+- 計數跟實際資料對不上的話（上線前的資料、手動改資料），跑 python -m app.jobs.rebuild_achievement_stats --fix
+"""
+from __future__ import annotations
+import threading
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.models.economy import AchievementStat, GlobalCounter
+
+TOTAL_USERS = "total_users"
+TOTAL_UNLOCKS = "total_unlocks"
+
+
+def bump_unlock_count(db: Session, achievement_id: int, n: int = 1) -> None:
+    """這個成就多了 n 個人解鎖（不 commit）；total_unlocks 一起 +n。"""
+    if n == 0:
+        return
+    now = datetime.utcnow()
+    stmt = mysql_insert(AchievementStat).values(achievement_id=achievement_id, unlock_count=n, updated_at=now)
+    stmt = stmt.on_duplicate_key_update(
+        unlock_count=AchievementStat.__table__.c.unlock_count + n,
+        updated_at=now,
+    )
+    db.execute(stmt)
+    bump_counter(db, TOTAL_UNLOCKS, n)
+
+
+def bump_counter(db: Session, name: str, n: int = 1) -> None:
+    """global_counters 的 name 加 n（不 commit）。"""
+    if n == 0:
+        return
+    now = datetime.utcnow()
+    stmt = mysql_insert(GlobalCounter).values(name=name, value=n, updated_at=now)
+    stmt = stmt.on_duplicate_key_update(
+        value=GlobalCounter.__table__.c.value + n,
+        updated_at=now,
+    )
+    db.execute(stmt)
+
+
+def bump_total_users(db: Session, n: int = 1) -> None:
+    bump_counter(db, TOTAL_USERS, n)
+
+
+class Rarity(NamedTuple):
+    total_users: int              # global_counters.total_users
+    counts: dict[int, int]        # achievement_id -> unlock_count
+    total_unlocks: int            # global_counters.total_unlocks；跟 total_users 一起當版本（ETag）
+
+    def percent(self, achievement_id: int) -> float | None:
+        if self.total_users <= 0:
+            return None
+        return round(min(100.0, self.counts.get(achievement_id, 0) * 100.0 / self.total_users), 1)
+
+
+def get_rarity_totals(db: Session) -> tuple[int, int]:
+    """(total_users, total_unlocks)：global_counters 兩列（PK 查一次）。"""
+    values = dict(
+        db.query(GlobalCounter.name, GlobalCounter.value)
+        .filter(GlobalCounter.name.in_([TOTAL_USERS, TOTAL_UNLOCKS]))
+        .all()
+    )
+    return int(values.get(TOTAL_USERS) or 0), int(values.get(TOTAL_UNLOCKS) or 0)
+
+
+def _load_rarity(db: Session, total_users: int, total_unlocks: int) -> Rarity:
+    counts = {
+        int(aid): int(cnt)
+        for aid, cnt in db.query(AchievementStat.achievement_id, AchievementStat.unlock_count).all()
+    }
+    return Rarity(total_users=total_users, counts=counts, total_unlocks=total_unlocks)
+
+
+class RarityCache:
+    """
+    整份稀有度的行程內快取（每個 worker 各一份）。
+    每次 get 都先讀 DB 的 (total_users, total_unlocks)，快取裡的那份是同一組數字才用；
+    counts 跟這兩個數字在同一個 transaction 裡讀，所以回傳的內容一定對得上它帶的版本。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: Rarity | None = None
+
+    def get(self, db: Session) -> Rarity:
+        totals = get_rarity_totals(db)
+        data = self._data
+        if data is not None and (data.total_users, data.total_unlocks) == totals:
+            return data
+        with self._lock:
+            data = self._data
+            if data is None or (data.total_users, data.total_unlocks) != totals:
+                data = _load_rarity(db, *totals)
+                self._data = data
+            return data
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._data = None
+
+
+rarity_cache = RarityCache()
@@ -1,102 +1,311 @@
+from bisect import bisect_right
 from datetime import datetime
+from typing import Callable, Iterable, NamedTuple
+from sqlalchemy import Select, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
-from app.models.economy import (
-    Achievement, UserAchievement,
-    Checkin, CheckinStatus, Run, RunStatus,
-)
+from app.models.economy import Achievement, UserAchievement, UserStats, UserStreak
 from app.models.user import User
-from app.services.ledger import add_ledger_entry
-from app.services.level import apply_exp_and_update
-from app.services.chicken_status import get_all_activity_dates, calc_current_streak
-
-def _get_basic_stats(db: Session, user_id: int) -> dict:
-    total_checkins = (
-        db.query(func.count(Checkin.id))
-        .filter(
-            Checkin.user_id == user_id,
-            Checkin.status.in_([CheckinStatus.verified, CheckinStatus.awarded]),
+from app.services.ledger import add_ledger_entries
+from app.services.exp_ledger import award_exp
+from app.services.chicken_status import get_current_streak
+from app.services.user_state import mark_user_changed
+from app.services.catalog import VersionedCatalog
+from app.services.user_stats import STAT_FIELDS, get_user_stats
+from app.services.achievement_stats import bump_unlock_count
+
+# ---------------------------------------------------------------
+# 條件種類 → 「這個人目前的數值」
+# 新增一種成就條件：寫一個 provider 註冊上去，再把它加進 EVENT_CONDITIONS 對應的事件
+# provider 的第三個參數是這次檢查共用的 ctx（例如 user_stats 只讀一次）
+# ---------------------------------------------------------------
+ConditionProvider = Callable[[Session, User, dict], int]
+CONDITION_PROVIDERS: dict[str, ConditionProvider] = {}
+
+
+def register_condition(condition_type: str):
+    def deco(fn: ConditionProvider) -> ConditionProvider:
+        CONDITION_PROVIDERS[condition_type] = fn
+        return fn
+    return deco
+
+
+def _stats(db: Session, user: User, ctx: dict) -> dict:
+    if "stats" not in ctx:
+        ctx["stats"] = get_user_stats(db, user.id)
+    return ctx["stats"]
+
+
+def _register_stat(field: str) -> None:
+    # user_stats 的欄位直接當條件數值（距離取整數公里）
+    register_condition(field)(lambda db, user, ctx: int(_stats(db, user, ctx)[field]))
+
+
+for _field in STAT_FIELDS:
+    _register_stat(_field)
+
+
+@register_condition("streak")
+def _streak(db: Session, user: User, ctx: dict) -> int:
+    return get_current_streak(db, user.id)
+
+
+@register_condition("level")
+def _level(db: Session, user: User, ctx: dict) -> int:
+    return user.level or 1
+
+
+# ---------------------------------------------------------------
+# 條件種類 → 「數值 >= value 的 user_id」的 SQL（整批補發成就用，見 jobs/backfill_achievement）
+# 新增條件種類時也要在這裡註冊一個，規則要跟上面的 provider 一樣
+# ---------------------------------------------------------------
+ConditionSql = Callable[[int, int, int], Select]
+CONDITION_SQL: dict[str, ConditionSql] = {}
+
+
+def register_condition_sql(condition_type: str):
+    def deco(fn: ConditionSql) -> ConditionSql:
+        CONDITION_SQL[condition_type] = fn
+        return fn
+    return deco
+
+
+def _register_stat_sql(field: str) -> None:
+    col = getattr(UserStats, field)
+
+    @register_condition_sql(field)
+    def _sql(value: int, lo: int, hi: int) -> Select:
+        return select(UserStats.user_id.label("user_id")).where(
+            UserStats.user_id > lo, UserStats.user_id <= hi, col >= value,
         )
-        .scalar() or 0
+
+
+for _field in STAT_FIELDS:
+    _register_stat_sql(_field)
+
+
+@register_condition_sql("streak")
+def _streak_sql(value: int, lo: int, hi: int) -> Select:
+    # 跟 get_current_streak 一樣：last_active_day 不是今天就是 0
+    return select(UserStreak.user_id.label("user_id")).where(
+        UserStreak.user_id > lo,
+        UserStreak.user_id <= hi,
+        UserStreak.last_active_day == datetime.utcnow().date(),
+        UserStreak.current_streak >= value,
     )
-    total_runs = (
-        db.query(func.count(Run.id))
-        .filter(
-            Run.user_id == user_id,
-            Run.status == RunStatus.awarded,
-        )
-        .scalar() or 0
+
+
+@register_condition_sql("level")
+def _level_sql(value: int, lo: int, hi: int) -> Select:
+    return select(User.id.label("user_id")).where(User.id > lo, User.id <= hi, User.level >= value)
+
+
+def get_condition_values(db: Session, user_id: int) -> dict[str, int]:
+    """
+    這個人每一種條件目前的數值（規則跟 provider 一樣），給成就進度用。
+    users / user_stats / user_streaks 都是 user_id 主鍵，一個 LEFT JOIN 讀完；沒有這個 user 回 {}。
+    """
+    stat_cols = [getattr(UserStats, name) for name in STAT_FIELDS]
+    row = (
+        db.query(User.level, UserStreak.current_streak, UserStreak.last_active_day, *stat_cols)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .outerjoin(UserStreak, UserStreak.user_id == User.id)
+        .filter(User.id == user_id)
+        .first()
     )
-    dates = get_all_activity_dates(db, user_id)
-    current_streak = calc_current_streak(dates)
+    if row is None:
+        return {}
+    level, streak, last_day, *stats = row
+    values = {name: int(v or 0) for name, v in zip(STAT_FIELDS, stats)}
+    values["streak"] = int(streak or 0) if last_day == datetime.utcnow().date() else 0
+    values["level"] = level or 1
+    return values
 
-    return {
-        "total_checkins": total_checkins,
-        "total_runs": total_runs,
-        "streak": current_streak,
-    }
+
+# 事件 → 可能被它改變的條件種類（其它種類這次不用算）
+EVENT_CONDITIONS: dict[str, tuple[str, ...]] = {
+    "checkin": ("total_checkins", "streak", "level"),
+    "run": ("total_runs", "total_distance_km", "streak", "level"),
+    "item_use": ("items_used", "level"),
+    "purchase": ("purchases",),
+    "training": ("total_training_volume",),
+    "level": ("level",),
+}
+
+
+class AchievementEntry(NamedTuple):
+    """快取裡的成就定義（唯讀，不是 ORM 物件）。"""
+    id: int
+    code: str
+    name: str
+    description: str | None
+    condition_type: str
+    condition_value: int
+    reward_coins: int
+    reward_exp: int
 
 
-def check_and_unlock_achievements(db: Session, user: User) -> list[UserAchievement]:
+class AchievementIndex:
     """
-    在「有新活動」後呼叫：
-      - 打卡成功
-      - 跑步成功
-      - 升級 / 吃道具後
+    成就依 condition_type 分組、每組依 condition_value 排序。
+    數值 v 跨過了哪些門檻 = bisect_right(thresholds, v) 之前的那一段。
     """
-    stats = _get_basic_stats(db, user.id)
 
-    # 目前已解鎖的成就 id
-    unlocked_ids = {
-        ua.achievement_id
-        for ua in db.query(UserAchievement).filter(UserAchievement.user_id == user.id).all()
-    }
+    def __init__(self, achievements: Iterable[AchievementEntry]) -> None:
+        grouped: dict[str, list[AchievementEntry]] = {}
+        for a in achievements:
+            grouped.setdefault(a.condition_type, []).append(a)
+        self._by_type: dict[str, tuple[list[int], list[AchievementEntry]]] = {}
+        for ctype, items in grouped.items():
+            items.sort(key=lambda a: (a.condition_value, a.id))
+            self._by_type[ctype] = ([a.condition_value for a in items], items)
 
-    new_unlocked: list[UserAchievement] = []
+    def types(self) -> set[str]:
+        return set(self._by_type)
 
-    # 撈所有成就定義
-    all_ach = db.query(Achievement).all()
+    def reached(self, condition_type: str, value: int) -> list[AchievementEntry]:
+        """這個種類裡，門檻 <= value 的成就。"""
+        entry = self._by_type.get(condition_type)
+        if not entry:
+            return []
+        thresholds, items = entry
+        return items[:bisect_right(thresholds, value)]
 
-    for ach in all_ach:
-        if ach.id in unlocked_ids:
-            continue
 
-        ok = False
-        if ach.condition_type == "total_checkins":
-            ok = stats["total_checkins"] >= ach.condition_value
-        elif ach.condition_type == "total_runs":
-            ok = stats["total_runs"] >= ach.condition_value
-        elif ach.condition_type == "streak":
-            ok = stats["streak"] >= ach.condition_value
-        elif ach.condition_type == "level":
-            ok = (user.level or 1) >= ach.condition_value
-
-        if not ok:
-            continue
+class AchievementCatalog(NamedTuple):
+    items: list[AchievementEntry]        # 依 id 排序
+    index: AchievementIndex
 
-        ua = UserAchievement(
-            user_id=user.id,
-            achievement_id=ach.id,
-            unlocked_at=datetime.utcnow(),
+
+def _load_achievement_catalog(db: Session) -> AchievementCatalog:
+    items = [
+        AchievementEntry(
+            id=int(a.id),
+            code=a.code,
+            name=a.name,
+            description=a.description,
+            condition_type=a.condition_type,
+            condition_value=a.condition_value,
+            reward_coins=a.reward_coins or 0,
+            reward_exp=a.reward_exp or 0,
         )
-        db.add(ua)
-        new_unlocked.append(ua)
-
-        # 發獎勵：coins + exp
-        if ach.reward_coins != 0:
-            add_ledger_entry(
-                db=db,
-                user_id=user.id,
-                delta=ach.reward_coins,
-                source="achievement",
-                ref_id=ach.id,
-                idempotency_key=f"achievement:{user.id}:{ach.id}",
+        for a in db.query(Achievement).order_by(Achievement.id.asc()).all()
+    ]
+    return AchievementCatalog(items=items, index=AchievementIndex(items))
+
+
+achievement_catalog: VersionedCatalog[AchievementCatalog] = VersionedCatalog(
+    "achievements", _load_achievement_catalog
+)
+
+
+def _unlock(
+    db: Session,
+    user: User,
+    index: AchievementIndex,
+    condition_types: Iterable[str],
+    exclude: set[int],
+    ctx: dict,
+) -> list[AchievementEntry]:
+    """
+    算這幾種條件，回傳這次新達成（還沒解鎖過）的成就，並寫入 user_achievements。
+    exclude：這次呼叫裡已經解鎖的成就 id（不用再查一次）。
+    """
+    candidates: list[AchievementEntry] = []
+    for ctype in condition_types:
+        provider = CONDITION_PROVIDERS.get(ctype)
+        if provider is None or ctype not in index.types():
+            continue
+        candidates.extend(a for a in index.reached(ctype, provider(db, user, ctx)) if a.id not in exclude)
+    if not candidates:
+        return []
+
+    # 只查候選的那幾個有沒有解鎖過
+    unlocked_ids = {
+        aid
+        for (aid,) in (
+            db.query(UserAchievement.achievement_id)
+            .filter(
+                UserAchievement.user_id == user.id,
+                UserAchievement.achievement_id.in_([a.id for a in candidates]),
             )
-        if ach.reward_exp != 0:
-            apply_exp_and_update(user, ach.reward_exp)
+            .all()
+        )
+    }
+    # uq_user_achievement 擋著：補發成就的 job 剛好同時寫進去的話，這邊就不算新解鎖
+    now = datetime.utcnow()
+    newly: list[AchievementEntry] = []
+    for a in candidates:
+        if a.id in unlocked_ids:
+            continue
+        res = db.execute(
+            mysql_insert(UserAchievement)
+            .values(user_id=user.id, achievement_id=a.id, unlocked_at=now)
+            .prefix_with("IGNORE")
+        )
+        if res.rowcount:
+            newly.append(a)
+    return newly
+
+
+def check_and_unlock_achievements(db: Session, user: User, event: str | None = None) -> list[AchievementEntry]:
+    """
+    在「有新活動」後呼叫，event 決定要算哪些條件（見 EVENT_CONDITIONS）：
+      - "checkin"：打卡成功
+      - "run"：跑步成功
+      - "item_use" / "level"：吃道具、升級後
+    event=None 代表全部條件都算一次。
+    成就的 EXP 獎勵讓等級跨過門檻時，會再補算一次 level 條件。
+    """
+    if event is None:
+        condition_types: tuple[str, ...] = tuple(CONDITION_PROVIDERS)
+    else:
+        condition_types = EVENT_CONDITIONS.get(event, ())
+    if not condition_types:
+        return []
+
+    index = achievement_catalog.get(db).index
+    if not index.types() & set(condition_types):
+        return []
+    ctx: dict = {}
+
+    new_unlocked: list[AchievementEntry] = []
+    pending = condition_types
+    while pending:
+        newly = _unlock(db, user, index, pending, {a.id for a in new_unlocked}, ctx)
+        if not newly:
+            break
+        new_unlocked.extend(newly)
+        level_before = user.level or 1
+
+        # 發獎勵：coins（一次批次入帳）+ exp（金幣之後，鎖的順序跟購買一樣）
+        coin_rewards = [
+            {
+                "user_id": user.id,
+                "delta": a.reward_coins,
+                "source": "achievement",
+                "ref_id": a.id,
+                "idempotency_key": f"achievement:{user.id}:{a.id}",
+            }
+            for a in newly
+            if a.reward_coins != 0
+        ]
+        if coin_rewards:
+            add_ledger_entries(db, coin_rewards)
+        for a in newly:
+            if a.reward_exp != 0:
+                award_exp(db, user, a.reward_exp, "achievement", a.id, f"achievement:{user.id}:{a.id}")
+
+        # 獎勵的 EXP 升級了 → 再看一次 level 條件
+        pending = ("level",) if (user.level or 1) > level_before else ()
 
-    if new_unlocked:
-        db.commit()
+    if not new_unlocked:
+        return []
 
+    # 稀有度計數是大家共用的熱門列，放在 commit 前最後才更新，鎖住的時間最短
+    for a in new_unlocked:
+        bump_unlock_count(db, a.id)
+    mark_user_changed(db, user.id)
+    db.commit()
     return new_unlocked
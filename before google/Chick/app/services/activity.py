@@ -0,0 +1,81 @@
+# app/services/activity.py
+"""
+「有效運動」發生時要一起更新的每人狀態，全部在呼叫端的 transaction 裡寫，不 commit。
+
+有效運動 = 打卡變成 verified（有沒有發幣都算）/ 跑步 awarded，
+跟 chicken_status.get_weekly_activity_count（user_week_activity）的定義一致。
+"""
+from __future__ import annotations
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.models.economy import UserActivityDay, UserStreak, UserActivityYear, UserWeekActivity
+from app.services.chicken_status import day_mask, week_start_of
+from app.services.user_state import mark_user_changed
+
+
+def _bump_streak(db: Session, user_id: int, day: date) -> None:
+    """
+    新的一天有運動：一個 upsert 更新連續天數。
+    - last_active_day 是前一天 → current + 1
+    - 更早（中間斷過）或第一次 → 重新從 1 開始
+    - 補登過去的日期（比 last_active_day 還早）→ 不動，交給 rebuild 工具
+    MySQL 的 ON DUPLICATE KEY UPDATE 由左到右套用，longest 看到的是新的 current。
+    """
+    t = UserStreak.__table__.c
+    stmt = mysql_insert(UserStreak).values(
+        user_id=user_id,
+        current_streak=1,
+        longest_streak=1,
+        last_active_day=day,
+    )
+    stmt = stmt.on_duplicate_key_update([
+        ("current_streak", case(
+            (t.last_active_day == day - timedelta(days=1), t.current_streak + 1),
+            (t.last_active_day >= day, t.current_streak),
+            else_=1,
+        )),
+        ("longest_streak", func.greatest(t.longest_streak, t.current_streak)),
+        ("last_active_day", func.greatest(func.coalesce(t.last_active_day, day), day)),
+    ])
+    db.execute(stmt)
+
+
+def _set_year_bit(db: Session, user_id: int, day: date) -> None:
+    """把年度點陣圖上這一天的 bit 設成 1（MySQL 8 的 binary string OR）。"""
+    mask = day_mask(day)
+    stmt = mysql_insert(UserActivityYear).values(user_id=user_id, year=day.year, bits=mask)
+    stmt = stmt.on_duplicate_key_update(
+        bits=UserActivityYear.__table__.c.bits.op("|")(stmt.inserted.bits),
+    )
+    db.execute(stmt)
+
+
+def _bump_week_count(db: Session, user_id: int, day: date) -> None:
+    """這週的運動次數 +1（每一次有效運動都算，不是每天一次）。"""
+    stmt = mysql_insert(UserWeekActivity).values(user_id=user_id, week_start=week_start_of(day), count=1)
+    stmt = stmt.on_duplicate_key_update(count=UserWeekActivity.__table__.c.count + 1)
+    db.execute(stmt)
+
+
+def record_activity(db: Session, user_id: int, occurred_at: datetime) -> bool:
+    """
+    記錄一次有效運動，回傳這天是不是「今天第一次」（新的一天）。
+    - 打卡用 started_at、跑步用 created_at（UTC）
+    - 每次都 +1 週次數；新的一天才需要動 streak / 年度點陣圖
+    """
+    day = occurred_at.date()
+    mark_user_changed(db, user_id)
+    _bump_week_count(db, user_id, day)
+    res = db.execute(
+        mysql_insert(UserActivityDay)
+        .values(user_id=user_id, day=day)
+        .prefix_with("IGNORE")
+    )
+    is_new_day = bool(res.rowcount)
+    if is_new_day:
+        _bump_streak(db, user_id, day)
+        _set_year_bit(db, user_id, day)
+    return is_new_day
@@ -0,0 +1,156 @@
+# app/services/catalog.py
+"""
+靜態目錄（商店商品、成就定義）的行程內快取。
+
+- 每個目錄在 catalog_versions 有一列 version；改了目錄內容就把它 +1
+  （POST /admin/catalog/{name}/bump，或直接 SQL：
+   UPDATE catalog_versions SET version = version + 1 WHERE name = 'store_items';）
+- 每個 worker 最多每 CATALOG_CHECK_SECONDS 秒查一次 version（一次 PK 查詢），
+  變了才整份重載；所以多個 uvicorn worker 最晚幾秒內都會換成新版，不用互相通知
+- 快取的是 NamedTuple 之類的唯讀資料，不是 ORM 物件（不會因為 session commit 而 expire）
+- 資料跟 version 存成同一個 tuple，一次換掉；要做 ETag 的請用 get_versioned，
+  不要分開呼叫 get / version（中間剛好重載的話，body 跟 ETag 會是不同版本）
+"""
+from __future__ import annotations
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Generic, NamedTuple, TypeVar
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.models.economy import CatalogVersion, StoreItem
+
+CATALOG_CHECK_SECONDS = 5.0
+
+T = TypeVar("T")
+
+
+def get_catalog_version(db: Session, name: str) -> int:
+    version = db.query(CatalogVersion.version).filter(CatalogVersion.name == name).scalar()
+    return int(version or 0)
+
+
+def bump_catalog_version(db: Session, name: str) -> None:
+    """目錄內容改了：version +1（不 commit）。"""
+    stmt = mysql_insert(CatalogVersion).values(name=name, version=1, updated_at=datetime.utcnow())
+    stmt = stmt.on_duplicate_key_update(
+        version=CatalogVersion.__table__.c.version + 1,
+        updated_at=stmt.inserted.updated_at,
+    )
+    db.execute(stmt)
+
+
+class VersionedCatalog(Generic[T]):
+    """一份目錄：loader(db) 讀出整份資料，version 變了才重新呼叫。"""
+
+    def __init__(self, name: str, loader: Callable[[Session], T], check_seconds: float = CATALOG_CHECK_SECONDS) -> None:
+        self.name = name
+        self.check_seconds = check_seconds
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._current: tuple[T, int] | None = None   # (資料, version)，一起換
+        self._checked_at = 0.0
+        self.reset_metrics()
+        CATALOGS[name] = self
+
+    def reset_metrics(self) -> None:
+        with self._metrics_lock:
+            self.hits = 0
+            self.version_checks = 0
+            self.reloads = 0
+            self.last_reload_ms = 0.0
+            self.last_reload_at: datetime | None = None
+
+    def get_versioned(self, db: Session) -> tuple[T, int]:
+        """(資料, version)，兩個一定是同一版；回應 body 跟 ETag 都要用到目錄時用這個。"""
+        now = time.monotonic()
+        current = self._current
+        if current is not None and now - self._checked_at < self.check_seconds:
+            # 讀快取不用鎖；hits 用另一把小鎖（_lock 重載時會拿著去查 DB，不能讓命中的 request 等它）
+            with self._metrics_lock:
+                self.hits += 1
+            return current
+
+        with self._lock:
+            # 等鎖的時候別的 thread 可能已經查過了
+            if self._current is not None and time.monotonic() - self._checked_at < self.check_seconds:
+                with self._metrics_lock:
+                    self.hits += 1
+                return self._current
+
+            self.version_checks += 1
+            version = get_catalog_version(db, self.name)
+            if self._current is None or version != self._current[1]:
+                t0 = time.perf_counter()
+                self._current = (self._loader(db), version)
+                self.reloads += 1
+                self.last_reload_ms = (time.perf_counter() - t0) * 1000
+                self.last_reload_at = datetime.utcnow()
+            self._checked_at = time.monotonic()
+            return self._current
+
+    def get(self, db: Session) -> T:
+        return self.get_versioned(db)[0]
+
+    def version(self, db: Session) -> int:
+        """目前快取裡的 version（順便確認是不是最新的）；同時要資料的話用 get_versioned。"""
+        return self.get_versioned(db)[1]
+
+    def invalidate(self) -> None:
+        """下一次 get 一定會去查 version。"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def snapshot(self) -> dict:
+        current = self._current
+        return {
+            "version": current[1] if current is not None else None,
+            "loaded": current is not None,
+            "check_seconds": self.check_seconds,
+            "hits": self.hits,
+            "version_checks": self.version_checks,
+            "reloads": self.reloads,
+            "last_reload_ms": round(self.last_reload_ms, 2),
+            "last_reload_at": self.last_reload_at,
+        }
+
+
+# name -> catalog，admin 的 bump / metrics 用
+CATALOGS: dict[str, VersionedCatalog] = {}
+
+
+# ---------------------------------------------------------------
+# 商店商品
+# ---------------------------------------------------------------
+class StoreItemEntry(NamedTuple):
+    id: int
+    name: str
+    price_coins: int
+    exp_min: int
+    exp_max: int
+    description: str | None
+
+
+class StoreCatalog(NamedTuple):
+    items: list[StoreItemEntry]          # 依 id 排序
+    by_id: dict[int, StoreItemEntry]
+
+
+def _load_store_catalog(db: Session) -> StoreCatalog:
+    items = [
+        StoreItemEntry(
+            id=int(r.id),
+            name=r.name,
+            price_coins=r.price_coins,
+            exp_min=r.exp_min,
+            exp_max=r.exp_max,
+            description=r.description,
+        )
+        for r in db.query(StoreItem).order_by(StoreItem.id.asc()).all()
+    ]
+    return StoreCatalog(items=items, by_id={i.id: i for i in items})
+
+
+store_catalog: VersionedCatalog[StoreCatalog] = VersionedCatalog("store_items", _load_store_catalog)
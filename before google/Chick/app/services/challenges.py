@@ -1,88 +1,382 @@
 # app/services/challenges.py
+"""
+每週挑戰。
 
-from datetime import datetime
+- 挑戰內容來自 challenge_templates（目錄快取），每個 active 範本每週每人一列 weekly_challenges，
+  同一週可以同時有好幾個挑戰；uq_weekly_challenge_user_week_template 擋重複
+- 本週的列由 jobs/rollover_weekly_challenges 在換週時整批先建好（最近有活動的人），
+  沒被涵蓋到的人在這週第一次有事件時補建；週中新增的範本，重跑一次 rollover 就會補上
+- 進度是每列的 progress：事件（打卡、跑步、重訓）發生時 bump_challenge_progress
+  在同一個 transaction 裡用一個 UPDATE 把這週所有相關挑戰一起累加，不會重算歷史資料
+- 事件 commit 之後 check_weekly_challenge 讀一次「事件那週」的列，progress >= condition_value 的就完成 + 發獎勵
+  （跟 bump_challenge_progress 一樣用事件的日期決定是哪一週：週日開始、週一才送出的打卡算上週）
+- GET /challenges/weekly 只讀：沒有列就回傳範本內容、進度 0（不寫入）
+- 歷史統計（完成率、最長連續完成週數）在 user_challenge_stats 一列，見 UserChallengeStats
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import NamedTuple
+from sqlalchemy import case, func, literal, select, true, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.orm import Session
 
-from app.models.economy import WeeklyChallenge
-from app.services.chicken_status import get_week_range_utc, get_weekly_activity_count
-from app.services.ledger import add_ledger_entry
-from app.services.level import apply_exp_and_update
+from app.models.economy import ChallengeTemplate, UserChallengeStats, WeeklyChallenge
+from app.services.catalog import VersionedCatalog
+from app.services.chicken_status import get_week_range_utc, week_start_of
+from app.services.ledger import add_ledger_entries
+from app.services.exp_ledger import award_exp
 from app.models.user import User
+from app.services.user_state import mark_user_changed
 
+# 條件種類 → 進度怎麼更新
+#   "add"：事件的量累加（次數、公里、公斤、分鐘）
+#   "max"：事件帶的是「目前值」，取較大的（連續天數斷了也不會讓進度倒退）
+CHALLENGE_CONDITIONS: dict[str, str] = {
+    "weekly_activity_count": "add",   # 有效打卡 + 跑步次數
+    "run_distance_km": "add",         # 跑步距離
+    "training_volume": "add",         # 重訓 volume（kg × reps × sets）
+    "checkin_minutes": "add",         # 打卡停留分鐘
+    "streak_days": "max",             # 連續運動天數
+}
 
-def get_or_create_this_week_challenge(db: Session, user: User) -> WeeklyChallenge:
+
+# ---------------------------------------------------------------
+# 範本目錄
+# ---------------------------------------------------------------
+class ChallengeTemplateEntry(NamedTuple):
+    id: int
+    code: str
+    title: str
+    description: str | None
+    condition_type: str
+    condition_value: int
+    reward_coins: int
+    reward_exp: int
+
+
+class ChallengeTemplateCatalog(NamedTuple):
+    items: list[ChallengeTemplateEntry]      # active 的範本，依 id 排序
+    types: frozenset[str]
+
+
+def _load_challenge_templates(db: Session) -> ChallengeTemplateCatalog:
+    items = [
+        ChallengeTemplateEntry(
+            id=int(t.id),
+            code=t.code,
+            title=t.title,
+            description=t.description,
+            condition_type=t.condition_type,
+            condition_value=t.condition_value,
+            reward_coins=t.reward_coins or 0,
+            reward_exp=t.reward_exp or 0,
+        )
+        for t in (
+            db.query(ChallengeTemplate)
+            .filter(ChallengeTemplate.active.is_(True))
+            .order_by(ChallengeTemplate.id.asc())
+            .all()
+        )
+    ]
+    return ChallengeTemplateCatalog(items=items, types=frozenset(t.condition_type for t in items))
+
+
+challenge_template_catalog: VersionedCatalog[ChallengeTemplateCatalog] = VersionedCatalog(
+    "challenge_templates", _load_challenge_templates
+)
+
+
+def current_week_start() -> date:
     week_start, _ = get_week_range_utc()
-    ws_date = week_start.date()
+    return week_start.date()
+
+
+def new_week_challenge(user_id: int, week_start: date, t: ChallengeTemplateEntry) -> WeeklyChallenge:
+    """範本內容、進度 0 的挑戰（transient，不加進 session）。"""
+    return WeeklyChallenge(
+        user_id=user_id,
+        week_start=week_start,
+        template_id=t.id,
+        title=t.title,
+        description=t.description,
+        condition_type=t.condition_type,
+        condition_value=t.condition_value,
+        target_count=t.condition_value,
+        reward_coins=t.reward_coins,
+        reward_exp=t.reward_exp,
+        progress=Decimal("0"),
+        completed_at=None,
+    )
+
 
-    row = (
+def get_week_challenges(db: Session, user_id: int, week_start: date, *, for_update: bool = False) -> list[WeeklyChallenge]:
+    """這個人這週的挑戰（uq 索引的前綴，一次讀完），依範本 id 排序。"""
+    q = (
         db.query(WeeklyChallenge)
-        .filter(WeeklyChallenge.user_id == user.id, WeeklyChallenge.week_start == ws_date)
-        .first()
+        .filter(WeeklyChallenge.user_id == user_id, WeeklyChallenge.week_start == week_start)
+        .order_by(WeeklyChallenge.template_id.asc())
+        .populate_existing()
     )
-    if row:
-        return row
-
-    row = WeeklyChallenge(
-        user_id=user.id,
-        week_start=ws_date,
-
-        # 任務文案 + 條件
-        title="本週挑戰：運動達標",
-        description="本週累積完成 3 次運動（打卡或跑步都算）",
-        condition_type="weekly_activity_count",
-        condition_value=3,
-
-        # 你原本的欄位（先保留相容）
-        target_count=3,
-        reward_coins=50,
-        reward_exp=100,
+    if for_update:
+        q = q.with_for_update()
+    return q.all()
+
+
+def get_this_week_challenges(
+    db: Session, user_id: int, templates: ChallengeTemplateCatalog | None = None
+) -> list[WeeklyChallenge]:
+    """
+    本週挑戰（唯讀）：還沒有列就用目前的範本回傳進度 0 的內容。
+    templates：呼叫端已經拿來做 ETag 的那份範本目錄，傳進來才不會跟 ETag 版本不一致。
+    """
+    ws = current_week_start()
+    rows = get_week_challenges(db, user_id, ws)
+    if rows:
+        return rows
+    if templates is None:
+        templates = challenge_template_catalog.get(db)
+    return [new_week_challenge(user_id, ws, t) for t in templates.items]
+
+
+def ensure_week_challenges(db: Session, user_id_select, week_start: date) -> int:
+    """
+    INSERT IGNORE ... SELECT：幫 user_id_select 選出來的人，用每個 active 範本建 week_start 那週的挑戰（不 commit）。
+    user_id_select 是只有一個 user_id 欄位的 SELECT；已經有的 (人, 週, 範本) 由 unique key 略過。
+    回傳新建幾列。
+    """
+    t = ChallengeTemplate
+    sub = user_id_select.subquery()
+    cols = [
+        "user_id", "week_start", "template_id", "title", "description",
+        "condition_type", "condition_value", "target_count", "reward_coins", "reward_exp", "progress",
+    ]
+    src = (
+        select(
+            sub.c[0], literal(week_start), t.id, t.title, t.description,
+            t.condition_type, t.condition_value, t.condition_value, t.reward_coins, t.reward_exp, literal(0),
+        )
+        .select_from(sub.join(t, true()))
+        .where(t.active.is_(True))
     )
+    res = db.execute(mysql_insert(WeeklyChallenge).from_select(cols, src).prefix_with("IGNORE"))
+    return int(res.rowcount or 0)
 
-    db.add(row)
-    db.commit()
-    db.refresh(row)
-    return row
 
+def bump_challenge_progress(db: Session, user_id: int, day: date, **amounts) -> None:
+    """
+    事件發生時更新 day 那週的挑戰進度（不 commit），例如：
+        bump_challenge_progress(db, uid, day, weekly_activity_count=1, run_distance_km=3.2, streak_days=5)
+    不管同時有幾個挑戰，都是「有沒有列」一次 + UPDATE 一次；沒有相關範本時不查 DB。
+    """
+    unknown = set(amounts) - set(CHALLENGE_CONDITIONS)
+    if unknown:
+        raise ValueError(f"unknown challenge condition types: {sorted(unknown)}")
+    amounts = {k: v for k, v in amounts.items() if v}
+    if not amounts or not set(amounts) & challenge_template_catalog.get(db).types:
+        return
+
+    ws = week_start_of(day)
+    wc = WeeklyChallenge
+    has_rows = (
+        db.query(wc.id).filter(wc.user_id == user_id, wc.week_start == ws).limit(1).first()
+    )
+    if has_rows is None:
+        ensure_week_challenges(db, select(literal(user_id).label("user_id")), ws)
+
+    whens = [
+        (
+            wc.condition_type == ctype,
+            func.greatest(wc.progress, amount) if CHALLENGE_CONDITIONS[ctype] == "max" else wc.progress + amount,
+        )
+        for ctype, amount in amounts.items()
+    ]
+    db.execute(
+        update(wc)
+        .where(
+            wc.user_id == user_id,
+            wc.week_start == ws,
+            wc.completed_at.is_(None),
+            wc.condition_type.in_(list(amounts)),
+        )
+        .values(progress=case(*whens, else_=wc.progress))
+        .execution_options(synchronize_session=False)
+    )
 
-def check_weekly_challenge(db: Session, user: User) -> WeeklyChallenge | None:
+
+def check_weekly_challenge(db: Session, user: User, day: date) -> list[WeeklyChallenge]:
     """
-    在每次運動成功（打卡 or 跑步）後呼叫。
-    如果達成條件而且尚未完成，就發獎勵。
+    在事件 commit 之後呼叫（打卡、跑步、重訓），day 跟傳給 bump_challenge_progress 的是同一天。
+    讀一次 day 那週的挑戰（FOR UPDATE），進度達標但還沒完成的標記完成 + 發獎勵（同一個 transaction），
+    回傳這次完成的挑戰。
     """
-    wc = get_or_create_this_week_challenge(db, user)
-    if wc.completed_at is not None:
-        return wc
-
-    # === 計算進度 / 判斷是否達成 ===
-    if wc.condition_type == "weekly_activity_count":
-        count = get_weekly_activity_count(db, user.id)
-        goal = wc.condition_value
-        if count < goal:
-            return wc
-    else:
-        # 先保留：未來擴充其它規則
-        return wc
-
-    # === 達成：標記完成 ===
-    wc.completed_at = datetime.utcnow()
+    ws = week_start_of(day)
+    rows = get_week_challenges(db, user.id, ws, for_update=True)
+    done = [r for r in rows if r.completed_at is None and (r.progress or 0) >= r.condition_value]
+    if not done:
+        db.rollback()  # 放掉 FOR UPDATE 的鎖
+        return []
+
+    first_in_week = all(r.completed_at is None for r in rows)
+    now = datetime.utcnow()
+    for r in done:
+        r.completed_at = now
+    record_challenge_completions(db, user.id, ws, len(done), first_in_week=first_in_week)
+    mark_user_changed(db, user.id)
+
+    def key(r: WeeklyChallenge) -> str:
+        return f"weekly_challenge:{user.id}:{r.week_start.isoformat()}:{r.template_id}"
+
+    # === 發獎勵：Coins（一次批次入帳）→ EXP ===
+    coin_rewards = [
+        {
+            "user_id": user.id,
+            "delta": r.reward_coins,
+            "source": "weekly_challenge",
+            "ref_id": r.id,
+            "idempotency_key": key(r),
+        }
+        for r in done
+        if r.reward_coins
+    ]
+    if coin_rewards:
+        add_ledger_entries(db, coin_rewards)
+    for r in done:
+        if r.reward_exp:
+            award_exp(db, user, r.reward_exp, "weekly_challenge", r.id, key(r))
+
     db.commit()
+    return done
+
 
-    # === 發獎勵：Coins ===
-    if wc.reward_coins:
-        add_ledger_entry(
-            db=db,
-            user_id=user.id,
-            delta=wc.reward_coins,
-            source="weekly_challenge",
-            ref_id=wc.id,
-            idempotency_key=f"weekly_challenge:{user.id}:{wc.week_start.isoformat()}",
+# ---------------------------------------------------------------
+# 歷史統計（user_challenge_stats）
+# ---------------------------------------------------------------
+def record_challenge_completions(
+    db: Session, user_id: int, week_start: date, n: int, *, first_in_week: bool = True
+) -> None:
+    """
+    week_start 那週又完成了 n 個挑戰（不 commit）：累計數 +n，這週第一次完成時更新連續週數。
+    first_in_week：這週在這次之前一個都還沒完成（呼叫端 FOR UPDATE 讀過這週的列才知道）。
+    晚到的事件可能完成的是比 last_completed_week 還早的週：只加累計數，連續週數不動；
+    那週已經被 rollover 併進 closed_* 的話，closed_completed 也一起 +n。
+    ON DUPLICATE KEY UPDATE 由左到右套用，後面的欄位看到的是前面已經更新過的值，
+    所以 last_completed_week 一定要放最後。
+    """
+    if n <= 0:
+        return
+    s = UserChallengeStats.__table__.c
+    same_week = s.last_completed_week == week_start
+    prev_week = s.last_completed_week == week_start - timedelta(days=7)
+    older_week = s.last_completed_week > week_start
+    now = datetime.utcnow()
+    stmt = mysql_insert(UserChallengeStats).values(
+        user_id=user_id,
+        completed_total=n,
+        weeks_completed=1,
+        current_week_run=1,
+        longest_week_run=1,
+        last_completed_week=week_start,
+        closed_challenges=0,
+        closed_completed=0,
+        updated_at=now,
+    )
+    stmt = stmt.on_duplicate_key_update([
+        ("completed_total", s.completed_total + n),
+        ("weeks_completed", s.weeks_completed + (1 if first_in_week else 0)),
+        ("closed_completed", s.closed_completed + case((s.closed_through_week >= week_start, n), else_=0)),
+        ("current_week_run", case(
+            (same_week | older_week, s.current_week_run),
+            (prev_week, s.current_week_run + 1),
+            else_=1,
+        )),
+        ("longest_week_run", func.greatest(s.longest_week_run, s.current_week_run)),
+        ("last_completed_week", case((older_week, s.last_completed_week), else_=week_start)),
+        ("updated_at", now),
+    ])
+    db.execute(stmt)
+
+
+def fold_closed_weeks(db: Session, lo: int, hi: int, before_week: date) -> list[int]:
+    """
+    把 user_id 在 (lo, hi] 的人、week_start < before_week 且還沒併過的週，
+    一個 INSERT ... SELECT ... GROUP BY 併進 closed_*（不 commit）。
+    只看 closed_through_week 之後的週，重跑不會重複加；漏跑幾週下次也會一起補上。
+    回傳這次有併到的 user_id（呼叫端拿去 bump state_version）。
+    """
+    wc = WeeklyChallenge
+    st = UserChallengeStats
+    pending = (
+        wc.user_id > lo,
+        wc.user_id <= hi,
+        wc.week_start < before_week,
+        wc.week_start > func.coalesce(st.closed_through_week, date(1970, 1, 1)),
+    )
+    # 先挑出要併的人，INSERT 只併這些人：回傳的名單跟實際併到的一致
+    user_ids = [
+        int(uid)
+        for uid in db.execute(
+            select(wc.user_id).distinct().select_from(wc).outerjoin(st, st.user_id == wc.user_id).where(*pending)
+        ).scalars()
+    ]
+    if not user_ids:
+        return []
+
+    now = datetime.utcnow()
+    src = (
+        select(
+            wc.user_id,
+            func.count(wc.id),
+            func.count(wc.completed_at),
+            func.max(wc.week_start),
+            literal(now),
         )
-        db.commit()
+        .select_from(wc)
+        .outerjoin(st, st.user_id == wc.user_id)
+        .where(wc.user_id.in_(user_ids), *pending)
+        .group_by(wc.user_id)
+    )
+    stmt = mysql_insert(st).from_select(
+        ["user_id", "closed_challenges", "closed_completed", "closed_through_week", "updated_at"], src
+    )
+    c = st.__table__.c
+    stmt = stmt.on_duplicate_key_update([
+        ("closed_challenges", c.closed_challenges + stmt.inserted.closed_challenges),
+        ("closed_completed", c.closed_completed + stmt.inserted.closed_completed),
+        ("closed_through_week", stmt.inserted.closed_through_week),
+        ("updated_at", stmt.inserted.updated_at),
+    ])
+    db.execute(stmt)
+    return user_ids
 
-    # === 發獎勵：EXP ===
-    if wc.reward_exp:
-        # 依你專案函式定義調整，但通常需要 db
-        apply_exp_and_update(db=db, user=user, exp_gain=wc.reward_exp)
-        db.commit()
 
-    return wc
+def get_challenge_summary(db: Session, user_id: int) -> dict:
+    """
+    讀 user_challenge_stats 一列。
+    連續完成週數跟 streak 一樣：最後完成的那週不是本週也不是上週，就已經斷了（current = 0）。
+    """
+    row = db.query(UserChallengeStats).filter(UserChallengeStats.user_id == user_id).first()
+    if row is None:
+        return {
+            "completion_rate": None,
+            "closed_challenges": 0,
+            "closed_completed": 0,
+            "completed_total": 0,
+            "weeks_completed": 0,
+            "current_week_run": 0,
+            "longest_week_run": 0,
+            "last_completed_week": None,
+        }
+    ws = current_week_start()
+    alive = row.last_completed_week is not None and row.last_completed_week >= ws - timedelta(days=7)
+    return {
+        "completion_rate": (
+            round(row.closed_completed / row.closed_challenges, 4) if row.closed_challenges else None
+        ),
+        "closed_challenges": row.closed_challenges,
+        "closed_completed": row.closed_completed,
+        "completed_total": row.completed_total,
+        "weeks_completed": row.weeks_completed,
+        "current_week_run": row.current_week_run if alive else 0,
+        "longest_week_run": row.longest_week_run,
+        "last_completed_week": row.last_completed_week,
+    }
@@ -3,7 +3,11 @@ from __future__ import annotations
 from datetime import datetime, timedelta, date
 from sqlalchemy.orm import Session
 
-from app.models.economy import Checkin, CheckinStatus, Run, RunStatus
+from app.models.economy import (
+    UserActivityDay, UserStreak, UserActivityYear, UserWeekActivity,
+)
+
+YEAR_BITMAP_BYTES = 46  # 366 bits
 
 
 def get_week_range_utc() -> tuple[datetime, datetime]:
@@ -18,39 +22,26 @@ def get_week_range_utc() -> tuple[datetime, datetime]:
     return week_start, week_end
 
 
+def week_start_of(d: date) -> date:
+    """d 所在那週的週一。"""
+    return d - timedelta(days=d.weekday())
+
+
 def get_weekly_activity_count(db: Session, user_id: int) -> int:
     """
-    計算本週運動次數：
-    - 有效打卡（status in [verified, awarded]）
-    - 有效跑步（status = awarded）
+    本週運動次數（有效打卡 verified / awarded + 有效跑步 awarded）。
+    讀 user_week_activity 的一列，由 activity.record_activity 在同一個 transaction 裡 +1。
     """
-    week_start, week_end = get_week_range_utc()
-
-    # 打卡次數
-    checkin_count = (
-        db.query(Checkin)
-        .filter(
-            Checkin.user_id == user_id,
-            Checkin.status.in_([CheckinStatus.verified, CheckinStatus.awarded]),
-            Checkin.started_at >= week_start,
-            Checkin.started_at < week_end,
-        )
-        .count()
-    )
-
-    # 跑步次數
-    run_count = (
-        db.query(Run)
+    week_start, _ = get_week_range_utc()
+    count = (
+        db.query(UserWeekActivity.count)
         .filter(
-            Run.user_id == user_id,
-            Run.status == RunStatus.awarded,
-            Run.created_at >= week_start,
-            Run.created_at < week_end,
+            UserWeekActivity.user_id == user_id,
+            UserWeekActivity.week_start == week_start.date(),
         )
-        .count()
+        .scalar()
     )
-
-    return checkin_count + run_count
+    return int(count or 0)
 
 
 def calc_chicken_status(activity_count: int) -> str:
@@ -93,34 +84,63 @@ def chicken_exp_multiplier(status: str) -> float:
 
 def get_all_activity_dates(db: Session, user_id: int) -> set[date]:
     """
-    回傳該使用者「有運動」的所有日期集合（UTC 的日期）
+    回傳該使用者「有運動」的所有日期集合（UTC 的日期），讀 user_activity_days。
     - 有效打卡：status in [verified, awarded] → 使用 started_at.date()
     - 有效跑步：status = awarded → 使用 created_at.date()
+    只需要一段期間的話用 get_activity_dates_between。
     """
-    q1 = (
-        db.query(Checkin.started_at)
+    rows = db.query(UserActivityDay.day).filter(UserActivityDay.user_id == user_id).all()
+    return {d for (d,) in rows}
+
+
+def day_bit(d: date) -> tuple[int, int]:
+    """日期 → (第幾個 byte, mask)。"""
+    n = d.timetuple().tm_yday - 1
+    return n // 8, 0x80 >> (n % 8)
+
+
+def day_mask(d: date) -> bytes:
+    """只有這一天是 1 的年度點陣圖（寫入時拿來 OR）。"""
+    idx, mask = day_bit(d)
+    buf = bytearray(YEAR_BITMAP_BYTES)
+    buf[idx] = mask
+    return bytes(buf)
+
+
+def bitmap_days(year: int, bits: bytes) -> list[date]:
+    """年度點陣圖 → 有運動的日期（舊 → 新）。"""
+    start = date(year, 1, 1)
+    out: list[date] = []
+    for idx, byte in enumerate(bits or b""):
+        if not byte:
+            continue
+        for j in range(8):
+            if byte & (0x80 >> j):
+                d = start + timedelta(days=idx * 8 + j)
+                if d.year == year:
+                    out.append(d)
+    return out
+
+
+def get_activity_bitmaps(db: Session, user_id: int, from_year: int, to_year: int) -> dict[int, bytes]:
+    """[from_year, to_year] 每年的點陣圖；沒運動的年份不會有列。"""
+    rows = (
+        db.query(UserActivityYear.year, UserActivityYear.bits)
         .filter(
-            Checkin.user_id == user_id,
-            Checkin.status.in_([CheckinStatus.verified, CheckinStatus.awarded]),
-        )
-        .all()
-    )
-    q2 = (
-        db.query(Run.created_at)
-        .filter(
-            Run.user_id == user_id,
-            Run.status == RunStatus.awarded,
+            UserActivityYear.user_id == user_id,
+            UserActivityYear.year >= from_year,
+            UserActivityYear.year <= to_year,
         )
         .all()
     )
+    return {int(y): bytes(b) for y, b in rows}
+
 
+def get_activity_dates_between(db: Session, user_id: int, start: date, end: date) -> set[date]:
+    """[start, end] 之間有運動的日期（讀年度點陣圖，一年一列）。"""
     dates: set[date] = set()
-    for (dt,) in q1:
-        if dt:
-            dates.add(dt.date())
-    for (dt,) in q2:
-        if dt:
-            dates.add(dt.date())
+    for year, bits in get_activity_bitmaps(db, user_id, start.year, end.year).items():
+        dates.update(d for d in bitmap_days(year, bits) if start <= d <= end)
     return dates
 
 
@@ -141,3 +161,51 @@ def calc_current_streak(activity_dates: set[date]) -> int:
         cur = cur - timedelta(days=1)
 
     return streak
+
+
+def get_streak_state(db: Session, user_id: int) -> tuple[int, int]:
+    """
+    讀 user_streaks 一列，回傳 (current_streak, longest_streak)。
+    「從今天往回算」：last_active_day 不是今天就代表今天還沒運動 → current = 0，
+    不用掃任何日期就知道斷了。
+    """
+    row = (
+        db.query(UserStreak.current_streak, UserStreak.longest_streak, UserStreak.last_active_day)
+        .filter(UserStreak.user_id == user_id)
+        .first()
+    )
+    if not row:
+        return 0, 0
+    current, longest, last_day = row
+    return (current if last_day == datetime.utcnow().date() else 0), longest
+
+
+def get_current_streak(db: Session, user_id: int) -> int:
+    """跟 calc_current_streak 一樣的規則，讀 user_streaks（O(1)）。"""
+    return get_streak_state(db, user_id)[0]
+
+
+def scan_current_streak(db: Session, user_id: int, page_size: int = 31) -> int:
+    """
+    跟 calc_current_streak 一樣的規則，但直接從 user_activity_days 由今天往回讀，
+    一次讀 page_size 天，遇到斷掉就停，只會讀到 streak + 1 天左右。
+    user_streaks 的對照 / 除錯用。
+    """
+    expect = datetime.utcnow().date()
+    streak = 0
+
+    while True:
+        rows = (
+            db.query(UserActivityDay.day)
+            .filter(UserActivityDay.user_id == user_id, UserActivityDay.day <= expect)
+            .order_by(UserActivityDay.day.desc())
+            .limit(page_size)
+            .all()
+        )
+        for (d,) in rows:
+            if d != expect:
+                return streak
+            streak += 1
+            expect = expect - timedelta(days=1)
+        if len(rows) < page_size:
+            return streak
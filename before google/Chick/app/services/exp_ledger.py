@@ -0,0 +1,143 @@
+# app/services/exp_ledger.py
+"""
+EXP 入帳：exp_ledger 一筆 + users.exp / users.level 快取，同一個 transaction（不 commit）。
+
+跟金幣一樣用 idempotency_key 的 unique key 擋重複：
+client 重送、或同一個事件被處理兩次，都只會加一次 EXP。
+"""
+from __future__ import annotations
+from datetime import datetime
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.models.economy import ExpLedger
+from app.models.user import User
+from app.services.level import apply_exp_and_update, calc_levels_from_exp
+from app.services.user_state import mark_user_changed
+
+
+def _exp_key(user_id: int, source: str, ref_id: int | None, idempotency_key: str | None) -> str:
+    return idempotency_key or f"{source}:{user_id}:{ref_id}"
+
+
+def award_exp(
+    db: Session,
+    user: User,
+    delta: int,
+    source: str,
+    ref_id: int | None,
+    idempotency_key: str | None,
+) -> int:
+    """
+    加 / 扣 EXP，回傳這次真的套用的量（key 重複、或已經是 0 還要扣時回傳 0）。
+
+    先 SELECT ... FOR UPDATE 鎖住 users 這一列再讀 exp，
+    ledger 記的是「實際套用」的 delta（扣到 0 為止），所以 SUM(exp_ledger.delta) == users.exp。
+    呼叫端如果同一個 transaction 也要動金幣，請先入帳金幣再呼叫這裡
+    （跟購買流程一樣先鎖 user_balances、後鎖 users，避免互相卡住）。
+    """
+    if delta == 0:
+        return 0
+
+    # session 是 autoflush=False：同一個 transaction 裡前一次 award_exp 改的 exp / level 還沒寫進 DB，
+    # 不先 flush 的話下面的 refresh 會把它蓋回 DB 的舊值（ledger 有兩筆、users.exp 只加到一筆）
+    db.flush()
+    db.refresh(user, attribute_names=["exp", "level"], with_for_update=True)
+    current = user.exp or 0
+    applied = max(0, current + delta) - current
+    if applied == 0:
+        return 0
+
+    res = db.execute(
+        mysql_insert(ExpLedger).values(
+            user_id=user.id,
+            delta=applied,
+            source=source,
+            ref_id=ref_id,
+            idempotency_key=_exp_key(user.id, source, ref_id, idempotency_key),
+            created_at=datetime.utcnow(),
+        ).prefix_with("IGNORE")
+    )
+    if not res.rowcount:
+        return 0
+
+    apply_exp_and_update(user, applied)
+    return applied
+
+
+def award_exp_bulk(db: Session, entries: list[dict]) -> int:
+    """
+    批次版 award_exp（不 commit），給背景 job 一次發一大批人用。
+    entries 每筆是 user_id / delta / source / ref_id / idempotency_key。
+
+    一次 SELECT ... FOR UPDATE 鎖住這批 users（依 id 排序），一個 INSERT 寫 exp_ledger，
+    一個 executemany 的 UPDATE 寫回 exp / level。
+    跟 add_ledger_entries 一樣：有部分 key 已經發過的話退回 savepoint，改成逐筆 award_exp。
+    直接寫 users 表，session 裡已經載入的 User 物件不會跟著變。
+    回傳這次真的套用的 EXP 總和。
+    """
+    rows: dict[str, dict] = {}
+    for e in entries:
+        key = _exp_key(e["user_id"], e["source"], e.get("ref_id"), e.get("idempotency_key"))
+        if e["delta"] != 0:
+            rows.setdefault(key, {**e, "idempotency_key": key})
+    if not rows:
+        return 0
+
+    user_ids = sorted({r["user_id"] for r in rows.values()})
+    current = {
+        int(uid): int(exp or 0)
+        for uid, exp in (
+            db.query(User.id, User.exp)
+            .filter(User.id.in_(user_ids))
+            .order_by(User.id.asc())
+            .with_for_update()
+            .all()
+        )
+    }
+
+    now = datetime.utcnow()
+    values: list[dict] = []
+    for r in rows.values():
+        uid = r["user_id"]
+        if uid not in current:
+            continue
+        applied = max(0, current[uid] + r["delta"]) - current[uid]
+        if applied == 0:
+            continue
+        current[uid] += applied
+        values.append({
+            "user_id": uid,
+            "delta": applied,
+            "source": r["source"],
+            "ref_id": r.get("ref_id"),
+            "idempotency_key": r["idempotency_key"],
+            "created_at": now,
+        })
+    if not values:
+        return 0
+
+    savepoint = db.begin_nested()
+    res = db.execute(mysql_insert(ExpLedger).values(values).prefix_with("IGNORE"))
+    if res.rowcount != len(values):
+        savepoint.rollback()
+        total = 0
+        for v in values:
+            user = db.get(User, v["user_id"])
+            total += award_exp(db, user, v["delta"], v["source"], v["ref_id"], v["idempotency_key"])
+        return total
+    savepoint.commit()
+
+    touched = sorted({v["user_id"] for v in values})
+    levels = calc_levels_from_exp([current[uid] for uid in touched])
+    _users = User.__table__
+    db.execute(
+        update(_users)
+        .where(_users.c.id == bindparam("b_id"))
+        .values(exp=bindparam("b_exp"), level=bindparam("b_level")),
+        [{"b_id": uid, "b_exp": current[uid], "b_level": lv} for uid, lv in zip(touched, levels)],
+    )
+    for uid in touched:
+        mark_user_changed(db, uid)
+    return sum(v["delta"] for v in values)
@@ -1,14 +1,123 @@
 # path: app/services/ledger.py
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime
-from app.models.economy import CoinsLedger
+from sqlalchemy import func, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from datetime import datetime, timedelta
+from app.models.economy import CoinsLedger, UserBalance, CoinsBalanceCheckpoint
+from app.services.user_state import mark_user_changed
 
-def get_coins_balance(db: Session, user_id: int) -> int:
-    total = db.query(func.coalesce(func.sum(CoinsLedger.delta), 0)).filter(
-        CoinsLedger.user_id == user_id
+
+def sum_ledger_balance(db: Session, user_id: int) -> int:
+    """
+    從 coins_ledger 算餘額（唯一真相）：
+    最近一個 checkpoint 的 balance + 之後的 ledger 加總，
+    只會掃 checkpoint 之後的那一段（idx_coins_user_id）。
+    """
+    cp = (
+        db.query(CoinsBalanceCheckpoint.as_of_id, CoinsBalanceCheckpoint.balance)
+        .filter(CoinsBalanceCheckpoint.user_id == user_id)
+        .order_by(CoinsBalanceCheckpoint.as_of_id.desc())
+        .first()
+    )
+    as_of_id, base = (int(cp[0]), int(cp[1])) if cp else (0, 0)
+
+    tail = db.query(func.coalesce(func.sum(CoinsLedger.delta), 0)).filter(
+        CoinsLedger.user_id == user_id,
+        CoinsLedger.id > as_of_id,
     ).scalar()
-    return int(total or 0)
+    return base + int(tail or 0)
+
+
+def safe_max_ledger_id(db: Session, lag_minutes: int) -> int:
+    """
+    建立時間早於 now - lag 的最大 ledger id（從 PK 尾端往回找，只掃最近那一段）。
+
+    auto increment 的 id 不保證依 commit 順序出現：太新的 id 前面可能還有沒 commit 的交易。
+    checkpoint / rollup 這種「處理過就不回頭」的背景工作，只處理到這個 id 為止。
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=lag_minutes)
+    row = (
+        db.query(CoinsLedger.id)
+        .filter(CoinsLedger.created_at < cutoff)
+        .order_by(CoinsLedger.id.desc())
+        .first()
+    )
+    return int(row[0]) if row else 0
+
+
+def get_coins_balance(db: Session, user_id: int) -> int:
+    """
+    讀 user_balances 的一列；還沒有這列（舊帳號、尚未對帳）才退回加總 ledger。
+    """
+    row = db.query(UserBalance.balance).filter(UserBalance.user_id == user_id).first()
+    if row is not None:
+        return int(row[0])
+    return sum_ledger_balance(db, user_id)
+
+
+def lock_balance_row(db: Session, user_id: int) -> int:
+    """
+    SELECT ... FOR UPDATE 鎖住這個人的 user_balances 列，回傳目前餘額。
+    同一個人的扣款會在這裡排隊，直到持有鎖的 transaction commit / rollback。
+    還沒有餘額列的話先用 ledger 建一列再鎖。
+    """
+    row = (
+        db.query(UserBalance.balance)
+        .filter(UserBalance.user_id == user_id)
+        .with_for_update()
+        .first()
+    )
+    if row is not None:
+        return int(row[0])
+
+    seed = mysql_insert(UserBalance).values(
+        user_id=user_id,
+        balance=sum_ledger_balance(db, user_id),
+        updated_at=datetime.utcnow(),
+    ).prefix_with("IGNORE")
+    db.execute(seed)
+    row = (
+        db.query(UserBalance.balance)
+        .filter(UserBalance.user_id == user_id)
+        .with_for_update()
+        .one()
+    )
+    return int(row[0])
+
+
+def _apply_balance_delta(db: Session, user_id: int, delta: int) -> None:
+    """
+    在「同一個 transaction」裡把 delta 加到 user_balances。
+    必須在 ledger 那筆 INSERT 之後呼叫（第一次建立餘額列時會用 ledger 總和當初始值）。
+    """
+    if delta == 0:
+        return
+
+    mark_user_changed(db, user_id)
+    now = datetime.utcnow()
+    res = db.execute(
+        update(UserBalance)
+        .where(UserBalance.user_id == user_id)
+        .values(balance=UserBalance.balance + delta, updated_at=now)
+    )
+    if res.rowcount:
+        return
+
+    # 第一次寫入：ledger 總和已經包含剛剛那筆
+    # 若同時有別的 request 先建好這列，就退回成 +delta
+    total = sum_ledger_balance(db, user_id)
+    stmt = mysql_insert(UserBalance).values(user_id=user_id, balance=total, updated_at=now)
+    stmt = stmt.on_duplicate_key_update(
+        balance=UserBalance.__table__.c.balance + delta,
+        updated_at=now,
+    )
+    db.execute(stmt)
+
+
+def _ledger_key(user_id: int, source: str, ref_id: int | None, idempotency_key: str | None) -> str:
+    # 沒給 key 的呼叫端，用 (source, user, ref) 組一個，維持原本的去重規則
+    return idempotency_key or f"{source}:{user_id}:{ref_id}"
+
 
 def add_ledger_entry(
     db: Session,
@@ -18,21 +127,74 @@ def add_ledger_entry(
     ref_id: int | None,
     idempotency_key: str | None,
 ) -> int:
-    exists = db.query(CoinsLedger).filter(
-        CoinsLedger.user_id == user_id,
-        CoinsLedger.source == source,
-        CoinsLedger.ref_id == ref_id
-    ).first()
-    if exists:
-        return 0
-    row = CoinsLedger(
+    """
+    入帳一筆（不 commit，由呼叫端決定 transaction 範圍）。
+    idempotency_key 有 unique key 擋著，重送 / 並行時只有一筆會寫進去；
+    回傳這次真的入帳的 delta，重複就回傳 0。
+    """
+    stmt = mysql_insert(CoinsLedger).values(
         user_id=user_id,
         delta=delta,
         source=source,
         ref_id=ref_id,
-        idempotency_key=idempotency_key,
-        created_at=datetime.utcnow()
-    )
-    db.add(row)
-    db.commit()
+        idempotency_key=_ledger_key(user_id, source, ref_id, idempotency_key),
+        created_at=datetime.utcnow(),
+    ).prefix_with("IGNORE")
+    res = db.execute(stmt)
+    if not res.rowcount:
+        return 0
+
+    # 餘額表跟 ledger 同一個 transaction
+    _apply_balance_delta(db, user_id, delta)
     return delta
+
+
+def add_ledger_entries(db: Session, entries: list[dict]) -> int:
+    """
+    批次入帳（一個 INSERT，不 commit）。
+    entries 每筆是 add_ledger_entry 的參數：user_id / delta / source / ref_id / idempotency_key。
+
+    正常情況全部都是新的，一次寫完；
+    如果有部分已經入帳過（重送 / 並行），退回 savepoint 改成逐筆寫，
+    這樣才知道哪幾筆真的有進去、餘額才不會多加。
+    回傳這次真的入帳的 delta 總和。
+    """
+    now = datetime.utcnow()
+    rows: dict[str, dict] = {}
+    for e in entries:
+        key = _ledger_key(e["user_id"], e["source"], e.get("ref_id"), e.get("idempotency_key"))
+        rows.setdefault(key, {
+            "user_id": e["user_id"],
+            "delta": e["delta"],
+            "source": e["source"],
+            "ref_id": e.get("ref_id"),
+            "idempotency_key": key,
+            "created_at": now,
+        })
+    if not rows:
+        return 0
+
+    values = list(rows.values())
+    savepoint = db.begin_nested()
+    res = db.execute(mysql_insert(CoinsLedger).values(values).prefix_with("IGNORE"))
+    if res.rowcount != len(values):
+        savepoint.rollback()
+        return sum(
+            add_ledger_entry(
+                db=db,
+                user_id=v["user_id"],
+                delta=v["delta"],
+                source=v["source"],
+                ref_id=v["ref_id"],
+                idempotency_key=v["idempotency_key"],
+            )
+            for v in values
+        )
+    savepoint.commit()
+
+    per_user: dict[int, int] = {}
+    for v in values:
+        per_user[v["user_id"]] = per_user.get(v["user_id"], 0) + v["delta"]
+    for uid in sorted(per_user):
+        _apply_balance_delta(db, uid, per_user[uid])
+    return sum(v["delta"] for v in values)
@@ -1,5 +1,11 @@
 # app/services/level.py
+import hashlib
+from bisect import bisect_right
+from typing import Iterable
+from sqlalchemy.orm import object_session
+
 from app.models.user import User
+from app.services.user_state import mark_user_changed
 
 # 定義每一段的「每升一級需要多少 EXP」
 # (起始等級, 結束等級, 這一段每升 1 級需要的 EXP)
@@ -14,15 +20,34 @@ LEVEL_CONFIG = [
 MAX_LEVEL = 50
 
 
+def compile_level_curve(config: list[tuple[int, int, int]], max_level: int) -> list[int]:
+    """
+    把 LEVEL_CONFIG 攤平成「到達第 lv 級需要的總累積 EXP」表，index = lv - 1：
+      thresholds[0] = 0（1 級）、thresholds[1] = 升到 2 級要的總 EXP ...
+    之後查等級就是在這個遞增陣列上 bisect。
+    """
+    thresholds = [0]
+    for lv in range(1, max_level):
+        need = next((n for start, end, n in config if start <= lv <= end), config[-1][2])
+        thresholds.append(thresholds[-1] + need)
+    return thresholds
+
+
+# import 時編一次；改 LEVEL_CONFIG / MAX_LEVEL 要重啟（已存的 users.level 用 recompute job 重算）
+LEVEL_THRESHOLDS = compile_level_curve(LEVEL_CONFIG, MAX_LEVEL)
+
+# 曲線的指紋：/me 的 ETag 帶著它，改曲線重啟後舊的 ETag 自然失效
+LEVEL_CURVE_FINGERPRINT = hashlib.sha1(repr(LEVEL_THRESHOLDS).encode()).hexdigest()[:12]
+
+
 def get_required_exp_for_level(level: int) -> int:
     """回傳『從目前等級升到下一級』所需要的 EXP。"""
     if level >= MAX_LEVEL:
         return 0
-    for start, end, need in LEVEL_CONFIG:
-        if start <= level <= end:
-            return need
-    # 理論上不會跑到這裡，保底用
-    return LEVEL_CONFIG[-1][2]
+    if level < 1:
+        # 不在 LEVEL_CONFIG 任何一段裡：跟原本逐段比對的保底一樣，用最後一段的需求
+        return LEVEL_CONFIG[-1][2]
+    return LEVEL_THRESHOLDS[level] - LEVEL_THRESHOLDS[level - 1]
 
 
 def cumulative_exp_for_level(level: int) -> int:
@@ -32,27 +57,20 @@ def cumulative_exp_for_level(level: int) -> int:
     """
     if level <= 1:
         return 0
-
-    total = 0
-    # 把 1 ~ (level-1) 的每級需求加總起來
-    for lv in range(1, level):
-        total += get_required_exp_for_level(lv)
-    return total
+    return LEVEL_THRESHOLDS[min(level, MAX_LEVEL) - 1]
 
 
 def calc_level_from_exp(total_exp: int) -> int:
-    """依照『總 EXP』算出等級。"""
-    total_exp = max(0, total_exp or 0)
-    level = 1
+    """依照『總 EXP』算出等級（在累積門檻表上二分搜尋）。"""
+    return bisect_right(LEVEL_THRESHOLDS, max(0, total_exp or 0))
 
-    while level < MAX_LEVEL:
-        need = get_required_exp_for_level(level)
-        if total_exp >= need:
-            total_exp -= need
-            level += 1
-        else:
-            break
-    return level
+
+def calc_levels_from_exp(total_exps: Iterable[int | None]) -> list[int]:
+    """
+    一整批 EXP → 一整批等級（順序不變），給重算等級的 job 用。
+    就是每一個都套 calc_level_from_exp（每個一次 bisect），不會比逐筆呼叫快，只是少寫一個迴圈。
+    """
+    return [calc_level_from_exp(exp) for exp in total_exps]
 
 
 def calc_exp_progress(total_exp: int) -> dict:
@@ -90,7 +108,11 @@ def calc_exp_progress(total_exp: int) -> dict:
 
 
 def apply_exp_and_update(user: User, delta_exp: int) -> None:
-    """給 user 加上 delta_exp，並依照總 EXP 重算 level。"""
+    """
+    給 user 加上 delta_exp，並依照總 EXP 重算 level。
+    只動 users 上的快取欄位；發 EXP 請用 exp_ledger.award_exp（會記帳、擋重複）。
+    """
     new_total = max(0, (user.exp or 0) + delta_exp)
     user.exp = new_total
     user.level = calc_level_from_exp(new_total)
+    mark_user_changed(object_session(user), user.id)
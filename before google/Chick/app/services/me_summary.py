@@ -0,0 +1,146 @@
+# app/services/me_summary.py
+"""
+/me 首頁摘要：一條 SQL 把需要的東西全部帶回來。
+
+    users 一列
+    + user_balances.balance            （純量子查詢）
+    + 最新一筆打卡的 status / started_at（LEFT JOIN 到「最新 id」那一列）
+    + user_week_activity 本週次數      （純量子查詢，PK）
+    + user_streaks 今天還有效的 current（純量子查詢，PK）
+
+只有 user_balances 還沒有列（從沒入帳過的新帳號）時，才會多一次 get_coins_balance。
+舊的多次查詢路徑保留在 bench_me.py 裡做對照。
+"""
+from __future__ import annotations
+from datetime import date, datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+
+from app.models.economy import Checkin, CheckinStatus, UserBalance, UserStreak, UserWeekActivity
+from app.models.user import User
+from app.schemas.economy import MeSummary
+from app.services.chicken_status import calc_chicken_status, week_start_of
+from app.services.ledger import get_coins_balance
+from app.services.level import calc_exp_progress
+from app.services.user_state import me_summary_cache
+
+DEFAULT_CHICKEN_NAME = "無名小雞（稀有）"
+
+
+def today_checkin_status(status: CheckinStatus | None, started_at: datetime | None, today: date) -> str:
+    """最新一筆打卡如果是今天開始的，就回它的狀態，否則 "none"。"""
+    if (
+        status in (CheckinStatus.started, CheckinStatus.verified, CheckinStatus.awarded)
+        and started_at
+        and started_at.date() == today
+    ):
+        return status.name
+    return "none"
+
+
+def build_me_summary(
+    *,
+    user_id: int,
+    status: str | None,
+    exp: int | None,
+    last_login_at: datetime | None,
+    chicken_name: str | None,
+    coins: int,
+    today_status: str,
+    weekly_count: int,
+    current_streak: int,
+) -> MeSummary:
+    progress = calc_exp_progress(exp or 0)
+    return MeSummary(
+        user_id=user_id,
+        status=status if status in ("guest", "user", "admin") else "guest",
+        coins=coins,
+        today_checkin_status=today_status,
+        last_login_at=last_login_at,
+        chicken_name=chicken_name or DEFAULT_CHICKEN_NAME,
+        # 等級用 EXP 算，確保兩者一致
+        exp=progress["current_exp"],
+        level=progress["level"],
+        exp_in_current_level=progress["exp_in_current_level"],
+        exp_for_next_level=progress["required_for_next_level"],
+        exp_remaining_to_next_level=progress["remain_to_next_level"],
+        chicken_status=calc_chicken_status(weekly_count),
+        weekly_activity_count=weekly_count,
+        current_streak=current_streak,
+    )
+
+
+def _summary_stmt(user_id: int, today: date):
+    latest_checkin_id = (
+        select(Checkin.id)
+        .where(Checkin.user_id == user_id)
+        .order_by(Checkin.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    latest = aliased(Checkin)
+
+    return (
+        select(
+            User.id,
+            User.status,
+            User.exp,
+            User.last_login_at,
+            User.chicken_name,
+            select(UserBalance.balance)
+            .where(UserBalance.user_id == user_id)
+            .scalar_subquery()
+            .label("balance"),
+            latest.status.label("checkin_status"),
+            latest.started_at.label("checkin_started_at"),
+            select(UserWeekActivity.count)
+            .where(
+                UserWeekActivity.user_id == user_id,
+                UserWeekActivity.week_start == week_start_of(today),
+            )
+            .scalar_subquery()
+            .label("weekly_count"),
+            # last_active_day 不是今天 → streak 已經斷了，等同 0
+            select(UserStreak.current_streak)
+            .where(UserStreak.user_id == user_id, UserStreak.last_active_day == today)
+            .scalar_subquery()
+            .label("current_streak"),
+        )
+        .select_from(User)
+        .outerjoin(latest, latest.id == latest_checkin_id)
+        .where(User.id == user_id)
+    )
+
+
+def get_me_summary(db: Session, user_id: int) -> MeSummary | None:
+    """回傳 /me 的摘要；找不到 user 回 None。"""
+    today = datetime.utcnow().date()
+    row = db.execute(_summary_stmt(user_id, today)).first()
+    if row is None:
+        return None
+
+    coins = row.balance
+    if coins is None:
+        coins = get_coins_balance(db, user_id)
+
+    return build_me_summary(
+        user_id=user_id,
+        status=row.status,
+        exp=row.exp,
+        last_login_at=row.last_login_at,
+        chicken_name=row.chicken_name,
+        coins=int(coins),
+        today_status=today_checkin_status(row.checkin_status, row.checkin_started_at, today),
+        weekly_count=int(row.weekly_count or 0),
+        current_streak=int(row.current_streak or 0),
+    )
+
+
+def get_me_summary_cached(db: Session, user_id: int, state_version: int, today: date | None = None) -> MeSummary | None:
+    """
+    先查行程內快取（見 user_state.MeSummaryCache），miss 才跑 get_me_summary。
+    state_version：這次回應 ETag 用的 users.state_version，快取裡的版本不同就重讀。
+    """
+    if today is None:
+        today = datetime.utcnow().date()
+    return me_summary_cache.get_or_load(user_id, today, state_version, lambda: get_me_summary(db, user_id))
@@ -0,0 +1,146 @@
+# app/services/purchase.py
+"""
+商店購買：鎖餘額列 → 建購買紀錄 → 背包 +1 → 扣款，全部同一個 commit。
+
+同一個人同時按兩次購買時，第二個 request 會卡在 lock_balance_row，
+等第一個 commit 之後才讀到扣款後的餘額，所以不會雙重花費。
+等鎖逾時 / deadlock 是搶鎖的正常結果：rollback 後丟 PurchaseBusy，router 回 503 + Retry-After。
+"""
+from __future__ import annotations
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.models.economy import InventoryItem, Purchase
+from app.services.catalog import StoreItemEntry
+from app.services.user_stats import bump_stats
+from app.services.ledger import add_ledger_entry, lock_balance_row
+
+# 等鎖超過這個毫秒數，算一次「明顯的搶鎖」
+SLOW_LOCK_WAIT_MS = 50
+
+
+class NotEnoughCoins(Exception):
+    def __init__(self, balance: int, price: int):
+        super().__init__("not enough coins")
+        self.balance = balance
+        self.price = price
+
+
+class PurchaseBusy(Exception):
+    """等鎖逾時或 deadlock（已經 rollback，什麼都沒寫進去），稍後重試就好。"""
+
+    def __init__(self, retry_after_seconds: int = 1):
+        super().__init__("purchase busy, retry later")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class PurchaseMetrics:
+    """行程內的購買 / 搶鎖統計（每個 worker 各自一份）。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.attempts = 0
+            self.succeeded = 0
+            self.not_enough_coins = 0
+            self.lock_errors = 0          # deadlock / lock wait timeout
+            self.slow_lock_waits = 0
+            self.lock_wait_total_ms = 0.0
+            self.lock_wait_max_ms = 0.0
+
+    def record_lock_wait(self, waited_ms: float) -> None:
+        with self._lock:
+            self.attempts += 1
+            self.lock_wait_total_ms += waited_ms
+            self.lock_wait_max_ms = max(self.lock_wait_max_ms, waited_ms)
+            if waited_ms >= SLOW_LOCK_WAIT_MS:
+                self.slow_lock_waits += 1
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg = self.lock_wait_total_ms / self.attempts if self.attempts else 0.0
+            return {
+                "attempts": self.attempts,
+                "succeeded": self.succeeded,
+                "not_enough_coins": self.not_enough_coins,
+                "lock_errors": self.lock_errors,
+                "slow_lock_waits": self.slow_lock_waits,
+                "lock_wait_avg_ms": round(avg, 2),
+                "lock_wait_max_ms": round(self.lock_wait_max_ms, 2),
+            }
+
+
+purchase_metrics = PurchaseMetrics()
+
+
+def purchase_item(db: Session, user_id: int, item: StoreItemEntry) -> tuple[Purchase, int]:
+    """
+    買一個道具，回傳 (購買紀錄, 買完後的餘額)。
+    金幣不夠會 rollback 並丟 NotEnoughCoins；等鎖逾時 / deadlock 會 rollback 並丟 PurchaseBusy。
+    """
+    item_id, price = item.id, item.price_coins
+    try:
+        t0 = time.perf_counter()
+        coins_before = lock_balance_row(db, user_id)
+        purchase_metrics.record_lock_wait((time.perf_counter() - t0) * 1000)
+
+        if coins_before < price:
+            db.rollback()
+            purchase_metrics.incr("not_enough_coins")
+            raise NotEnoughCoins(coins_before, price)
+
+        now = datetime.utcnow()
+
+        # 1) 購買紀錄（flush 拿 id 當 ledger 的 ref）
+        purchase = Purchase(
+            user_id=user_id,
+            item_id=item_id,
+            coins_spent=price,
+            created_at=now,
+        )
+        db.add(purchase)
+        db.flush()
+
+        # 2) 背包 +1（有就加，沒有就新建）
+        inv = mysql_insert(InventoryItem).values(
+            user_id=user_id,
+            item_id=item_id,
+            quantity=1,
+            updated_at=now,
+        )
+        inv = inv.on_duplicate_key_update(
+            quantity=InventoryItem.__table__.c.quantity + 1,
+            updated_at=now,
+        )
+        db.execute(inv)
+
+        # 3) 金幣總帳扣款（餘額列已經被我們鎖著）
+        add_ledger_entry(
+            db=db,
+            user_id=user_id,
+            delta=-price,
+            source="purchase",
+            ref_id=purchase.id,
+            idempotency_key=f"purchase:{purchase.id}",
+        )
+        bump_stats(db, user_id, purchases=1)
+
+        db.commit()
+    except OperationalError as exc:
+        db.rollback()
+        purchase_metrics.incr("lock_errors")
+        raise PurchaseBusy() from exc
+
+    purchase_metrics.incr("succeeded")
+    return purchase, coins_before - price
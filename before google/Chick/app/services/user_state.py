@@ -0,0 +1,184 @@
+# app/services/user_state.py
+"""
+每個使用者「/me 看得到的狀態」變了的時候要通知的地方，以及 /me 摘要的行程內快取。
+
+寫入端（ledger 入帳、打卡狀態改變、跑步發獎、EXP 改變、改名、成就 / 挑戰完成、重訓紀錄）
+呼叫 mark_user_changed：
+  - 立刻把這個人的快取丟掉
+  - 記在 session.info；commit 前一條 UPDATE 把 users.state_version +1（讀取 API 的 ETag），
+    commit 之後再丟一次快取（commit 之前別的 request 可能又讀到舊資料放回快取）
+  - state_version 放到 commit 前才寫，users 列的鎖只在最後一瞬間拿，
+    也不會跟先鎖 user_balances 的購買流程互相卡住
+
+快取是每個 uvicorn worker 各自一份，別的 worker 的寫入通知不到，
+所以每一筆都記著它是在哪個 state_version 讀的：/me 先讀 state_version 做 ETag，
+快取裡的版本跟它不一樣就當 miss 重讀，不會把舊 body 配上新 ETag 回出去。
+TTL 只是控制記憶體的上限。
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Callable
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from app.core.etag import make_etag
+from app.models.user import User
+from app.schemas.economy import MeSummary
+
+ME_CACHE_MAX_USERS = 10000
+ME_CACHE_TTL_SECONDS = 30
+
+_PENDING_KEY = "changed_user_ids"
+
+
+class MeSummaryCache:
+    """
+    LRU + TTL，key 是 user_id。
+    - 值裡記著算出來的那一天：streak / 今天打卡狀態跟日期有關，過了午夜（UTC）就當 miss
+    - 值裡記著讀的時候的 users.state_version：呼叫端傳進來的版本對不上就當 miss
+      （別的 worker commit 過，這個 worker 沒收到 invalidate）
+    - 每個 user 有一個 generation，invalidate 時 +1；
+      讀 DB 前先拿 generation，放回去時對不上就不放（讀的途中被改過）
+    """
+
+    def __init__(self, max_users: int = ME_CACHE_MAX_USERS, ttl_seconds: float = ME_CACHE_TTL_SECONDS) -> None:
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # user_id -> [generation, day, expires_at, summary | None, state_version]
+        self._entries: OrderedDict[int, list] = OrderedDict()
+        self.reset_metrics()
+
+    def reset_metrics(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self.evictions = 0
+
+    def _generation(self, user_id: int) -> int:
+        entry = self._entries.get(user_id)
+        return entry[0] if entry else 0
+
+    def get(self, user_id: int, day: date, state_version: int) -> tuple[MeSummary | None, int]:
+        """回傳 (快取值或 None, 目前的 generation)。"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if (
+                entry and entry[3] is not None and entry[1] == day and entry[2] > now
+                and entry[4] == state_version
+            ):
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[3], entry[0]
+            self.misses += 1
+            return None, self._generation(user_id)
+
+    def put(self, user_id: int, day: date, summary: MeSummary, generation: int, state_version: int) -> None:
+        with self._lock:
+            if self._generation(user_id) != generation:
+                return
+            self._entries[user_id] = [generation, day, time.monotonic() + self.ttl_seconds, summary, state_version]
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self.invalidations += 1
+            entry = self._entries.get(user_id)
+            if entry:
+                entry[0] += 1
+                entry[3] = None
+            else:
+                # 留一個空的 entry 記 generation，讓正在讀的 request 放不回來
+                self._entries[user_id] = [1, None, 0.0, None, None]
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(
+        self, user_id: int, day: date, state_version: int, loader: Callable[[], MeSummary | None]
+    ) -> MeSummary | None:
+        """
+        state_version 是呼叫端剛讀到、拿去做 ETag 的那個版本。
+        loader 在同一個 transaction 裡、讀完 state_version 之後才跑，讀到的內容不會比這個版本舊。
+        """
+        cached, generation = self.get(user_id, day, state_version)
+        if cached is not None:
+            return cached
+        summary = loader()
+        if summary is not None:
+            self.put(user_id, day, summary, generation, state_version)
+        return summary
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": sum(1 for e in self._entries.values() if e[3] is not None),
+                "max_users": self.max_users,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+me_summary_cache = MeSummaryCache()
+
+
+def mark_user_changed(db: Session | None, user_id: int) -> None:
+    """這個人的 /me 狀態變了（在寫入的 transaction 裡呼叫，不 commit）。"""
+    me_summary_cache.invalidate(user_id)
+    if db is not None:
+        db.info.setdefault(_PENDING_KEY, set()).add(user_id)
+
+
+def get_state_version(db: Session, user_id: int) -> int | None:
+    """users.state_version（PK 查一次）；沒有這個 user 回 None。"""
+    version = db.query(User.state_version).filter(User.id == user_id).scalar()
+    return None if version is None else int(version)
+
+
+def user_etag(db: Session, user_id: int, *parts) -> str | None:
+    """
+    per-user 讀取 API 的 weak ETag：state_version + 會影響內容的參數（日期、分頁參數…）。
+    沒有這個 user 回 None。
+    """
+    version = get_state_version(db, user_id)
+    if version is None:
+        return None
+    return make_etag(user_id, version, *parts)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions_before_commit(session: Session) -> None:
+    user_ids = session.info.get(_PENDING_KEY)
+    if user_ids:
+        session.execute(
+            update(User)
+            .where(User.id.in_(sorted(user_ids)))
+            .values(state_version=User.state_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        me_summary_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_after_rollback(session: Session) -> None:
+    # 已經先丟過一次了，沒 commit 就沒有新資料，不用再丟
+    session.info.pop(_PENDING_KEY, None)
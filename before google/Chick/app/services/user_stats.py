@@ -0,0 +1,52 @@
+# app/services/user_stats.py
+"""
+user_stats 累計數字：事件發生時在同一個 transaction 裡 +N（不 commit），讀的時候一列。
+
+    打卡 verified           total_checkins + 1
+    跑步 awarded            total_runs + 1、total_distance_km + 距離
+    新增重訓紀錄            total_training_volume + volume
+    使用道具                items_used + 1
+    購買                    purchases + 1
+"""
+from __future__ import annotations
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.models.economy import UserStats
+
+STAT_FIELDS = (
+    "total_checkins",
+    "total_runs",
+    "total_distance_km",
+    "total_training_volume",
+    "items_used",
+    "purchases",
+)
+
+
+def bump_stats(db: Session, user_id: int, **deltas) -> None:
+    """例如 bump_stats(db, uid, total_runs=1, total_distance_km=3.2)。"""
+    unknown = set(deltas) - set(STAT_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown user_stats fields: {sorted(unknown)}")
+    if not deltas:
+        return
+
+    now = datetime.utcnow()
+    stmt = mysql_insert(UserStats).values(user_id=user_id, updated_at=now, **deltas)
+    t = UserStats.__table__.c
+    stmt = stmt.on_duplicate_key_update(
+        updated_at=now,
+        **{name: t[name] + stmt.inserted[name] for name in deltas},
+    )
+    db.execute(stmt)
+
+
+def get_user_stats(db: Session, user_id: int) -> dict:
+    """一列讀完；還沒有列的人全部是 0。"""
+    row = db.query(UserStats).filter(UserStats.user_id == user_id).first()
+    if row is None:
+        return {name: (Decimal("0") if name == "total_distance_km" else 0) for name in STAT_FIELDS}
+    return {name: getattr(row, name) for name in STAT_FIELDS}
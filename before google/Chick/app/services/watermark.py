@@ -0,0 +1,35 @@
+# app/services/watermark.py
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.models.economy import JobWatermark
+
+
+def lock_watermark(db: Session, name: str) -> int:
+    """
+    鎖住這個 job 的進度列並回傳 last_id（沒有就從 0 開始）。
+    同一個 job 同時跑兩份時，第二份會在這裡等，不會重複處理同一段。
+    """
+    db.execute(
+        mysql_insert(JobWatermark)
+        .values(name=name, last_id=0, updated_at=datetime.utcnow())
+        .prefix_with("IGNORE")
+    )
+    last_id = (
+        db.query(JobWatermark.last_id)
+        .filter(JobWatermark.name == name)
+        .with_for_update()
+        .scalar()
+    )
+    return int(last_id or 0)
+
+
+def set_watermark(db: Session, name: str, last_id: int) -> None:
+    """更新進度（不 commit，跟這一批的結果一起 commit）。"""
+    db.execute(
+        update(JobWatermark)
+        .where(JobWatermark.name == name)
+        .values(last_id=last_id, updated_at=datetime.utcnow())
+    )
@@ -0,0 +1,106 @@
+# /me 新舊路徑對照（只讀，用 .env 的 DATABASE_URL）
+#
+#   python bench_me.py --user-id 123 --iterations 500
+#
+# old：原本 read_me 的做法，user / 餘額 / 今天打卡 / 本週次數 / streak 各查一次
+# new：services/me_summary.get_me_summary，一條組合 SQL
+# 兩邊輪流跑、每次用新的 session（跟 request 一樣），印出每次 SQL 條數與 p50 / p95 / p99，
+# 最後確認兩邊回傳內容一致。
+import argparse
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from sqlalchemy import event  # noqa: E402
+
+from app.core.db import SessionLocal, engine  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.routers.me import get_today_checkin_status  # noqa: E402
+from app.services.chicken_status import get_weekly_activity_count, get_current_streak  # noqa: E402
+from app.services.ledger import get_coins_balance  # noqa: E402
+from app.services.me_summary import build_me_summary, get_me_summary  # noqa: E402
+
+_statements = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    global _statements
+    _statements += 1
+
+
+def old_path(db, user_id: int):
+    user = db.query(User).filter(User.id == user_id).first()
+    return build_me_summary(
+        user_id=user_id,
+        status=user.status,
+        exp=user.exp,
+        last_login_at=user.last_login_at,
+        chicken_name=user.chicken_name,
+        coins=get_coins_balance(db, user_id),
+        today_status=get_today_checkin_status(db, user_id),
+        weekly_count=get_weekly_activity_count(db, user_id),
+        current_streak=get_current_streak(db, user_id),
+    )
+
+
+def new_path(db, user_id: int):
+    return get_me_summary(db, user_id)
+
+
+def run_once(fn, user_id: int) -> tuple[float, int, object]:
+    global _statements
+    db = SessionLocal()
+    try:
+        before = _statements
+        t0 = time.perf_counter()
+        out = fn(db, user_id)
+        elapsed = (time.perf_counter() - t0) * 1000
+        return elapsed, _statements - before, out
+    finally:
+        db.close()
+
+
+def pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = {"old": old_path, "new": new_path}
+    for _ in range(args.warmup):
+        for fn in paths.values():
+            run_once(fn, args.user_id)
+
+    timings = {name: [] for name in paths}
+    statements = {}
+    outputs = {}
+    for _ in range(args.iterations):
+        for name, fn in paths.items():
+            ms, n, out = run_once(fn, args.user_id)
+            timings[name].append(ms)
+            statements[name] = n
+            outputs[name] = out
+
+    for name, values in timings.items():
+        print(
+            f"{name}: sql/request={statements[name]} "
+            f"p50={statistics.median(values):.2f}ms p95={pct(values, 0.95):.2f}ms "
+            f"p99={pct(values, 0.99):.2f}ms max={max(values):.2f}ms"
+        )
+
+    assert outputs["old"] == outputs["new"], f"結果不一致：\nold={outputs['old']}\nnew={outputs['new']}"
+    print("OK: same summary")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# award_exp 的自我檢查（用 .env 的 DATABASE_URL，最後 rollback，不會留下資料）
+#
+#   python check_exp_ledger.py --user-id 123
+#
+# 同一個 transaction 裡連續 award_exp 兩次（例如一次事件解鎖兩個有 EXP 的成就、完成兩個週挑戰），
+# 確認 users.exp 的增加量 == 這次寫進 exp_ledger 的 delta 加總 == 兩筆的和。
+import argparse
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from sqlalchemy import func  # noqa: E402
+
+from app.core.db import SessionLocal  # noqa: E402
+from app.models.economy import ExpLedger  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.exp_ledger import award_exp  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="同一個 transaction 連續 award_exp 兩次的檢查")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--first", type=int, default=30)
+    parser.add_argument("--second", type=int, default=50)
+    args = parser.parse_args()
+
+    tag = uuid.uuid4().hex[:12]
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == args.user_id).one()
+        exp_before = user.exp or 0
+
+        applied = award_exp(db, user, args.first, "self_check", None, f"self_check:{tag}:1")
+        applied += award_exp(db, user, args.second, "self_check", None, f"self_check:{tag}:2")
+        db.flush()
+
+        exp_after = db.query(User.exp).filter(User.id == args.user_id).scalar() or 0
+        ledger = db.query(func.coalesce(func.sum(ExpLedger.delta), 0)).filter(
+            ExpLedger.idempotency_key.like(f"self_check:{tag}:%")
+        ).scalar()
+
+        print(f"exp {exp_before} -> {exp_after}  applied={applied}  ledger={int(ledger)}")
+        assert applied == args.first + args.second, "award_exp 回傳的量不對"
+        assert exp_after - exp_before == int(ledger) == applied, "users.exp 跟 exp_ledger 對不上"
+        print("OK")
+    finally:
+        db.rollback()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ from app.routers.inventory import router as inventory
 from app.routers.achievements import router as achievements  # 👈 新增這行
 from app.routers.challenges import router as challenges
 from app.routers.training_plans import router as training_plans
+from app.routers.admin import router as admin
 from app.models.gym import Gym  # noqa
 #from app.routers.auth_google import router as auth_google  # noqa
 
@@ -43,6 +44,7 @@ app.include_router(inventory)
 app.include_router(achievements)  # 👈 新增這行
 app.include_router(challenges)
 app.include_router(training_plans)
+app.include_router(admin)
 # app.include_router(auth_google)
 
 @app.get("/")
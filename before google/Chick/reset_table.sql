@@ -2,6 +2,19 @@ USE chicken_db;
 SET FOREIGN_KEY_CHECKS = 0;
 
 TRUNCATE TABLE `coins_ledger`;
+TRUNCATE TABLE `user_balances`;
+TRUNCATE TABLE `coins_balance_checkpoints`;
+TRUNCATE TABLE `economy_daily_rollups`;
+TRUNCATE TABLE `job_watermarks`;
+TRUNCATE TABLE `user_activity_days`;
+TRUNCATE TABLE `user_streaks`;
+TRUNCATE TABLE `user_activity_years`;
+TRUNCATE TABLE `user_week_activity`;
+TRUNCATE TABLE `exp_ledger`;
+TRUNCATE TABLE `user_stats`;
+TRUNCATE TABLE `achievement_stats`;
+TRUNCATE TABLE `global_counters`;
+TRUNCATE TABLE `user_challenge_stats`;
 TRUNCATE TABLE `checkins`;
 TRUNCATE TABLE `runs`;
 TRUNCATE TABLE `refresh_tokens`;
@@ -0,0 +1,342 @@
+-- 既有資料庫的結構升級（依序執行；新環境可以整份跑一次）
+USE chicken_db;
+
+-- ============================
+-- 金幣餘額表（coins_ledger 的快取）
+-- 建好後跑一次：python -m app.jobs.reconcile_balances --fix
+-- ============================
+CREATE TABLE IF NOT EXISTS `user_balances` (
+  `user_id`    BIGINT   NOT NULL,
+  `balance`    INT      NOT NULL DEFAULT 0,
+  `updated_at` DATETIME NOT NULL,
+  PRIMARY KEY (`user_id`)
+);
+
+-- ============================
+-- coins_ledger 冪等 key（INSERT IGNORE 靠這個去重）
+-- 舊資料如果有 NULL key 不影響；有重複 key 的話先處理掉，不然 ALTER 會失敗、後面都不會跑：
+-- 每個 key 留 id 最小那筆，其他筆的 key 設成 NULL。
+-- 流水帳一筆都不刪（source / ref_id 還在，查得到重複發的是哪些），餘額也就不用動。
+-- ============================
+UPDATE `coins_ledger` l
+JOIN (
+  SELECT `idempotency_key`, MIN(`id`) AS `keep_id`
+  FROM `coins_ledger`
+  WHERE `idempotency_key` IS NOT NULL
+  GROUP BY `idempotency_key`
+  HAVING COUNT(*) > 1
+) d ON d.`idempotency_key` = l.`idempotency_key` AND l.`id` <> d.`keep_id`
+SET l.`idempotency_key` = NULL;
+
+ALTER TABLE `coins_ledger`
+  ADD UNIQUE KEY `uq_coins_idempotency_key` (`idempotency_key`);
+
+-- ============================
+-- 餘額檢查點（python -m app.jobs.compact_ledger_checkpoints 定期寫入）
+-- ============================
+CREATE TABLE IF NOT EXISTS `coins_balance_checkpoints` (
+  `user_id`    BIGINT   NOT NULL,
+  `as_of_id`   BIGINT   NOT NULL,
+  `balance`    INT      NOT NULL,
+  `created_at` DATETIME NOT NULL,
+  PRIMARY KEY (`user_id`, `as_of_id`)
+);
+
+ALTER TABLE `coins_ledger`
+  ADD INDEX `idx_coins_user_id` (`user_id`, `id`);
+
+-- ============================
+-- 背包一人一種道具一列（購買時用 upsert 加數量）
+-- 舊資料若有重複列，先合併：
+--   CREATE TEMPORARY TABLE inv_merge AS
+--     SELECT MIN(id) AS id, user_id, item_id, SUM(quantity) AS quantity
+--     FROM inventory_items GROUP BY user_id, item_id;
+--   DELETE FROM inventory_items WHERE id NOT IN (SELECT id FROM inv_merge);
+--   UPDATE inventory_items i JOIN inv_merge m ON m.id = i.id SET i.quantity = m.quantity;
+-- ============================
+ALTER TABLE `inventory_items`
+  ADD UNIQUE KEY `uq_inventory_user_item` (`user_id`, `item_id`);
+
+-- ============================
+-- 金幣經濟日報 + 背景工作進度
+-- python -m app.jobs.rollup_economy 定期跑（第一次會從 ledger 開頭一路補完）
+-- ============================
+CREATE TABLE IF NOT EXISTS `economy_daily_rollups` (
+  `day`        DATE        NOT NULL,
+  `source`     VARCHAR(32) NOT NULL,
+  `minted`     BIGINT      NOT NULL DEFAULT 0,
+  `burned`     BIGINT      NOT NULL DEFAULT 0,
+  `entries`    INT         NOT NULL DEFAULT 0,
+  `updated_at` DATETIME    NOT NULL,
+  PRIMARY KEY (`day`, `source`)
+);
+
+CREATE TABLE IF NOT EXISTS `job_watermarks` (
+  `name`       VARCHAR(64) NOT NULL,
+  `last_id`    BIGINT      NOT NULL DEFAULT 0,
+  `updated_at` DATETIME    NOT NULL,
+  PRIMARY KEY (`name`)
+);
+
+-- ============================
+-- 每人有運動的日期（streak / 火焰牆用）
+-- 建好後跑一次：python -m app.jobs.backfill_activity
+-- ============================
+CREATE TABLE IF NOT EXISTS `user_activity_days` (
+  `user_id` BIGINT NOT NULL,
+  `day`     DATE   NOT NULL,
+  PRIMARY KEY (`user_id`, `day`)
+);
+
+-- ============================
+-- 每人連續運動狀態（O(1) streak）
+-- 建好後跑一次：python -m app.jobs.backfill_activity --state-only
+-- ============================
+CREATE TABLE IF NOT EXISTS `user_streaks` (
+  `user_id`         BIGINT NOT NULL,
+  `current_streak`  INT    NOT NULL DEFAULT 0,
+  `longest_streak`  INT    NOT NULL DEFAULT 0,
+  `last_active_day` DATE   NULL,
+  PRIMARY KEY (`user_id`)
+);
+
+-- ============================
+-- 每人每年的運動點陣圖（366 bits，火焰牆 compact API 用）
+-- 寫入時用 bits | VALUES(bits)，需要 MySQL 8 的 binary string 位元運算
+-- 建好後跑一次：python -m app.jobs.backfill_activity --state-only
+-- ============================
+CREATE TABLE IF NOT EXISTS `user_activity_years` (
+  `user_id` BIGINT     NOT NULL,
+  `year`    INT        NOT NULL,
+  `bits`    BINARY(46) NOT NULL,
+  PRIMARY KEY (`user_id`, `year`)
+);
+
+-- ============================
+-- 每人每週運動次數（get_weekly_activity_count 一次 PK 查詢）
+-- 建好後跑一次：python -m app.jobs.rebuild_week_activity
+-- ============================
+CREATE TABLE IF NOT EXISTS `user_week_activity` (
+  `user_id`    BIGINT NOT NULL,
+  `week_start` DATE   NOT NULL,
+  `count`      INT    NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`, `week_start`)
+);
+
+-- ============================
+-- 每人狀態版本號（讀取 API 的 ETag / If-None-Match）
+-- ============================
+ALTER TABLE `users`
+  ADD COLUMN `state_version` BIGINT NOT NULL DEFAULT 0;
+
+-- ============================
+-- EXP 流水帳（users.exp / level 變成它的快取）
+-- 建好後跑一次開帳：python -m app.jobs.rebuild_exp_ledger
+-- ============================
+CREATE TABLE IF NOT EXISTS `exp_ledger` (
+  `id`              BIGINT      NOT NULL AUTO_INCREMENT,
+  `user_id`         BIGINT      NOT NULL,
+  `delta`           INT         NOT NULL,
+  `source`          VARCHAR(32) NOT NULL,
+  `ref_id`          BIGINT      NULL,
+  `idempotency_key` VARCHAR(64) NULL,
+  `created_at`      DATETIME    NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `idx_exp_user_id` (`user_id`, `id`),
+  UNIQUE KEY `uq_exp_idempotency_key` (`idempotency_key`)
+);
+
+-- ============================
+-- 靜態目錄版本號（store_items / achievements 的行程內快取用）
+-- 改了目錄內容後：POST /admin/catalog/{name}/bump
+-- 或 UPDATE catalog_versions SET version = version + 1 WHERE name = 'store_items';
+-- ============================
+CREATE TABLE IF NOT EXISTS `catalog_versions` (
+  `name`       VARCHAR(32) NOT NULL,
+  `version`    BIGINT      NOT NULL DEFAULT 0,
+  `updated_at` DATETIME    NOT NULL,
+  PRIMARY KEY (`name`)
+);
+
+INSERT IGNORE INTO `catalog_versions` (`name`, `version`, `updated_at`) VALUES
+  ('store_items', 1, UTC_TIMESTAMP()),
+  ('achievements', 1, UTC_TIMESTAMP());
+
+-- ============================
+-- 每人累計數字（成就條件 / 個人頁）
+-- 建好後跑一次：python -m app.jobs.rebuild_user_stats --fix
+-- ============================
+CREATE TABLE IF NOT EXISTS `user_stats` (
+  `user_id`               BIGINT        NOT NULL,
+  `total_checkins`        INT           NOT NULL DEFAULT 0,
+  `total_runs`            INT           NOT NULL DEFAULT 0,
+  `total_distance_km`     DECIMAL(12,3) NOT NULL DEFAULT 0,
+  `total_training_volume` BIGINT        NOT NULL DEFAULT 0,
+  `items_used`            INT           NOT NULL DEFAULT 0,
+  `purchases`             INT           NOT NULL DEFAULT 0,
+  `updated_at`            DATETIME      NOT NULL,
+  PRIMARY KEY (`user_id`)
+);
+
+-- ============================
+-- user_achievements：同一個成就每人只能有一列（補發成就的 job 用 INSERT IGNORE）
+-- 先清掉舊資料裡重複的（留最早那筆）
+-- ============================
+DELETE ua FROM `user_achievements` ua
+JOIN `user_achievements` keep
+  ON keep.user_id = ua.user_id
+ AND keep.achievement_id = ua.achievement_id
+ AND keep.id < ua.id;
+
+ALTER TABLE `user_achievements`
+  ADD UNIQUE KEY `uq_user_achievement` (`user_id`, `achievement_id`);
+
+-- ============================
+-- 成就稀有度計數（分子：每個成就解鎖人數；分母：global_counters.total_users）
+-- global_counters.total_unlocks 是全部解鎖數的加總，跟 total_users 一起當稀有度的版本（ETag）
+-- 建好後跑一次：python -m app.jobs.rebuild_achievement_stats --fix
+-- ============================
+CREATE TABLE IF NOT EXISTS `achievement_stats` (
+  `achievement_id` BIGINT   NOT NULL,
+  `unlock_count`   BIGINT   NOT NULL DEFAULT 0,
+  `updated_at`     DATETIME NOT NULL,
+  PRIMARY KEY (`achievement_id`)
+);
+
+CREATE TABLE IF NOT EXISTS `global_counters` (
+  `name`       VARCHAR(32) NOT NULL,
+  `value`      BIGINT      NOT NULL DEFAULT 0,
+  `updated_at` DATETIME    NOT NULL,
+  PRIMARY KEY (`name`)
+);
+
+INSERT INTO `global_counters` (`name`, `value`, `updated_at`)
+SELECT 'total_unlocks', COALESCE(SUM(`unlock_count`), 0), UTC_TIMESTAMP()
+FROM `achievement_stats`
+ON DUPLICATE KEY UPDATE `value` = VALUES(`value`), `updated_at` = VALUES(`updated_at`);
+
+-- ============================
+-- weekly_challenges：同一個人同一週只能有一列（rollover job / 請求路徑都用 INSERT IGNORE）
+-- 先清掉舊資料裡重複的（同一週留已完成的那筆，都沒完成就留最早的）
+-- ============================
+DELETE wc FROM `weekly_challenges` wc
+JOIN `weekly_challenges` keep
+  ON keep.user_id = wc.user_id
+ AND keep.week_start = wc.week_start
+ AND keep.id <> wc.id
+ AND (
+      (keep.completed_at IS NOT NULL AND wc.completed_at IS NULL)
+   OR ((keep.completed_at IS NULL) = (wc.completed_at IS NULL) AND keep.id < wc.id)
+ );
+
+ALTER TABLE `weekly_challenges`
+  ADD UNIQUE KEY `uq_weekly_challenge_user_week` (`user_id`, `week_start`);
+
+-- ============================
+-- 每週挑戰範本：同一週可以同時有好幾個挑戰，進度存在 weekly_challenges.progress
+-- condition_type：weekly_activity_count / run_distance_km / training_volume / checkin_minutes / streak_days
+-- 改了範本記得 bump：UPDATE catalog_versions SET version = version + 1 WHERE name = 'challenge_templates';
+-- ============================
+CREATE TABLE IF NOT EXISTS `challenge_templates` (
+  `id`              BIGINT       NOT NULL AUTO_INCREMENT,
+  `code`            VARCHAR(64)  NOT NULL,
+  `title`           VARCHAR(64)  NOT NULL,
+  `description`     VARCHAR(255) NULL,
+  `condition_type`  VARCHAR(32)  NOT NULL,
+  `condition_value` INT          NOT NULL,
+  `reward_coins`    INT          NOT NULL DEFAULT 0,
+  `reward_exp`      INT          NOT NULL DEFAULT 0,
+  `active`          TINYINT(1)   NOT NULL DEFAULT 1,
+  `created_at`      DATETIME     NOT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `code` (`code`)
+);
+
+-- 原本寫死的那個挑戰變成第一個範本
+INSERT IGNORE INTO `challenge_templates`
+  (`code`, `title`, `description`, `condition_type`, `condition_value`, `reward_coins`, `reward_exp`, `active`, `created_at`)
+VALUES
+  ('weekly_activity_3', '本週挑戰：運動達標', '本週累積完成 3 次運動（打卡或跑步都算）',
+   'weekly_activity_count', 3, 50, 100, 1, UTC_TIMESTAMP());
+
+INSERT IGNORE INTO `catalog_versions` (`name`, `version`, `updated_at`) VALUES
+  ('challenge_templates', 1, UTC_TIMESTAMP());
+
+ALTER TABLE `weekly_challenges`
+  ADD COLUMN `template_id` BIGINT NULL AFTER `week_start`,
+  ADD COLUMN `progress` DECIMAL(14,3) NOT NULL DEFAULT 0;
+
+-- 舊資料都掛到預設範本，本週的進度用 user_week_activity 補上
+UPDATE `weekly_challenges` wc
+JOIN `challenge_templates` t ON t.code = 'weekly_activity_3'
+SET wc.template_id = t.id
+WHERE wc.template_id IS NULL;
+
+UPDATE `weekly_challenges` wc
+JOIN `user_week_activity` w ON w.user_id = wc.user_id AND w.week_start = wc.week_start
+SET wc.progress = w.count
+WHERE wc.condition_type = 'weekly_activity_count';
+
+ALTER TABLE `weekly_challenges`
+  MODIFY COLUMN `template_id` BIGINT NOT NULL,
+  ADD CONSTRAINT `fk_weekly_challenges_template` FOREIGN KEY (`template_id`) REFERENCES `challenge_templates` (`id`),
+  ADD UNIQUE KEY `uq_weekly_challenge_user_week_template` (`user_id`, `week_start`, `template_id`),
+  DROP INDEX `uq_weekly_challenge_user_week`;
+
+-- ============================
+-- 每人每週挑戰統計（/challenges/history 的 summary）
+-- 完成時增量更新；已結束的週由 rollover job 併進 closed_*
+-- 下面先用已完成的紀錄補上完成總數和連續週數（完成過的週依週序相減分段，每段就是一串連續週），
+-- 之後跑一次 python -m app.jobs.rollover_weekly_challenges 把過去的週併進 closed_*
+-- ============================
+CREATE TABLE IF NOT EXISTS `user_challenge_stats` (
+  `user_id`             BIGINT   NOT NULL,
+  `completed_total`     INT      NOT NULL DEFAULT 0,
+  `weeks_completed`     INT      NOT NULL DEFAULT 0,
+  `current_week_run`    INT      NOT NULL DEFAULT 0,
+  `longest_week_run`    INT      NOT NULL DEFAULT 0,
+  `last_completed_week` DATE     NULL,
+  `closed_challenges`   INT      NOT NULL DEFAULT 0,
+  `closed_completed`    INT      NOT NULL DEFAULT 0,
+  `closed_through_week` DATE     NULL,
+  `updated_at`          DATETIME NOT NULL,
+  PRIMARY KEY (`user_id`)
+);
+
+INSERT INTO `user_challenge_stats`
+  (`user_id`, `completed_total`, `weeks_completed`, `current_week_run`, `longest_week_run`, `last_completed_week`, `updated_at`)
+WITH `done_weeks` AS (
+  SELECT `user_id`, `week_start`, COUNT(*) AS `completed`
+  FROM `weekly_challenges`
+  WHERE `completed_at` IS NOT NULL
+  GROUP BY `user_id`, `week_start`
+),
+`runs` AS (
+  -- 週序（1970-01-05 是週一）減掉名次：連續的週會得到同一個 grp
+  SELECT `user_id`, COUNT(*) AS `run_len`, MAX(`week_start`) AS `run_end`
+  FROM (
+    SELECT `user_id`, `week_start`,
+           DATEDIFF(`week_start`, '1970-01-05') DIV 7
+             - ROW_NUMBER() OVER (PARTITION BY `user_id` ORDER BY `week_start`) AS `grp`
+    FROM `done_weeks`
+  ) d
+  GROUP BY `user_id`, `grp`
+),
+`totals` AS (
+  SELECT `user_id`, SUM(`completed`) AS `completed_total`, COUNT(*) AS `weeks_completed`,
+         MAX(`week_start`) AS `last_week`
+  FROM `done_weeks`
+  GROUP BY `user_id`
+)
+SELECT t.`user_id`, t.`completed_total`, t.`weeks_completed`,
+       cur.`run_len`,
+       (SELECT MAX(r.`run_len`) FROM `runs` r WHERE r.`user_id` = t.`user_id`),
+       t.`last_week`, UTC_TIMESTAMP()
+FROM `totals` t
+JOIN `runs` cur ON cur.`user_id` = t.`user_id` AND cur.`run_end` = t.`last_week`
+ON DUPLICATE KEY UPDATE
+  `completed_total`     = VALUES(`completed_total`),
+  `weeks_completed`     = VALUES(`weeks_completed`),
+  `current_week_run`    = VALUES(`current_week_run`),
+  `longest_week_run`    = VALUES(`longest_week_run`),
+  `last_completed_week` = VALUES(`last_completed_week`);
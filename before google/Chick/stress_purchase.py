@@ -0,0 +1,125 @@
+# 購買併發壓力測試（會寫入 .env 的 DATABASE_URL，請用開發 DB）
+#
+#   python stress_purchase.py --threads 16 --attempts 200
+#
+# 建一個測試帳號、先入帳剛好夠買 N 個的金幣，
+# 再開很多 thread 同時買，最後檢查：
+#   - 成功次數 <= N，而且沒有錯誤時剛好 == N
+#   - coins_ledger 加總 == 剩下的錢、從不為負，user_balances 和它一致
+#   - 背包數量 == 成功次數、purchases 筆數 == 成功次數
+import argparse
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from sqlalchemy import func  # noqa: E402
+
+from app.core.db import SessionLocal  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.economy import StoreItem, InventoryItem, Purchase, CoinsLedger, UserBalance  # noqa: E402
+from app.services.ledger import add_ledger_entry  # noqa: E402
+from app.services.purchase import purchase_item, NotEnoughCoins, purchase_metrics  # noqa: E402
+
+
+def setup(affordable: int) -> tuple[int, int, int]:
+    db = SessionLocal()
+    try:
+        item = db.query(StoreItem).order_by(StoreItem.id.asc()).first()
+        if not item:
+            raise SystemExit("store_items 是空的，先建一個商品")
+
+        user = User(status="guest", device_id=f"stress-{uuid.uuid4().hex[:16]}", created_at=datetime.utcnow())
+        db.add(user)
+        db.flush()
+
+        add_ledger_entry(
+            db=db,
+            user_id=user.id,
+            delta=item.price_coins * affordable,
+            source="stress_seed",
+            ref_id=user.id,
+            idempotency_key=f"stress_seed:{user.id}",
+        )
+        db.commit()
+        return user.id, item.id, item.price_coins
+    finally:
+        db.close()
+
+
+def buy_once(user_id: int, item_id: int, barrier: threading.Barrier | None) -> str:
+    db = SessionLocal()
+    try:
+        item = db.query(StoreItem).filter(StoreItem.id == item_id).one()
+        if barrier is not None:
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+        purchase_item(db, user_id, item)
+        return "ok"
+    except NotEnoughCoins:
+        return "not_enough"
+    except Exception as e:  # deadlock / lock wait timeout 也要算進來
+        return f"error:{type(e).__name__}"
+    finally:
+        db.close()
+
+
+def verify(user_id: int, item_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        ledger = db.query(func.coalesce(func.sum(CoinsLedger.delta), 0)).filter(CoinsLedger.user_id == user_id).scalar()
+        cached = db.query(UserBalance.balance).filter(UserBalance.user_id == user_id).scalar()
+        qty = db.query(InventoryItem.quantity).filter(
+            InventoryItem.user_id == user_id, InventoryItem.item_id == item_id
+        ).scalar()
+        purchases = db.query(func.count(Purchase.id)).filter(Purchase.user_id == user_id).scalar()
+        return {
+            "ledger_balance": int(ledger or 0),
+            "cached_balance": int(cached or 0),
+            "inventory_qty": int(qty or 0),
+            "purchases": int(purchases or 0),
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=200)
+    parser.add_argument("--affordable", type=int, default=25, help="測試帳號的金幣剛好夠買幾個")
+    args = parser.parse_args()
+
+    user_id, item_id, price = setup(args.affordable)
+    barrier = threading.Barrier(args.threads)
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda _: buy_once(user_id, item_id, barrier), range(args.attempts)))
+
+    ok = results.count("ok")
+    state = verify(user_id, item_id)
+    print("user_id =", user_id)
+    print("results =", {r: results.count(r) for r in sorted(set(results))})
+    print("state   =", state)
+    print("metrics =", purchase_metrics.snapshot())
+
+    errors = sum(1 for r in results if r.startswith("error:"))
+    assert ok <= args.affordable, f"成功 {ok} 次，超過買得起的 {args.affordable} 次（雙重花費）"
+    assert state["ledger_balance"] == price * (args.affordable - ok), "ledger 餘額和成功次數對不上"
+    assert state["ledger_balance"] >= 0, "餘額變成負的"
+    if errors == 0 and args.attempts >= args.affordable:
+        assert ok == args.affordable, f"成功 {ok} 次，應該剛好 {args.affordable} 次"
+    assert state["cached_balance"] == state["ledger_balance"], "user_balances 和 ledger 不一致"
+    assert state["inventory_qty"] == ok, "背包數量和成功次數不一致"
+    assert state["purchases"] == ok, "購買紀錄和成功次數不一致"
+    print("OK: no double-spend")
+
+
+if __name__ == "__main__":
+    main()
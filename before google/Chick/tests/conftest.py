@@ -0,0 +1,39 @@
+# tests/conftest.py
+"""
+pytest 共用設定：不連真的 MySQL，用 in-memory SQLite 建表（只測不依賴 MySQL 語法的部分）。
+
+    python -m pytest -q
+"""
+import os
+
+# app.core.config 一 import 就要讀設定；沒有 .env 的時候給測試用的值
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+
+from datetime import datetime  # noqa: E402
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import app.models.economy  # noqa: E402,F401  （註冊所有表）
+from app.core.db import Base  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    engine.dispose()
+
+
+@pytest.fixture
+def user_id(session_factory) -> int:
+    db = session_factory()
+    db.add(User(id=1, status="user", exp=0, created_at=datetime.utcnow()))
+    db.commit()
+    db.close()
+    return 1
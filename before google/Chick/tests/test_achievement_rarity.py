@@ -0,0 +1,36 @@
+# tests/test_achievement_rarity.py
+"""成就稀有度：版本在 DB，兩個 worker 對同樣的資料給同樣的 ETag，body 也跟 ETag 的版本一致。"""
+from datetime import datetime
+
+from app.models.economy import AchievementStat, GlobalCounter
+from app.services.achievement_stats import TOTAL_UNLOCKS, TOTAL_USERS, RarityCache
+
+
+def _set_counts(db, total_users: int, unlocks: dict[int, int]) -> None:
+    now = datetime.utcnow()
+    db.merge(GlobalCounter(name=TOTAL_USERS, value=total_users, updated_at=now))
+    db.merge(GlobalCounter(name=TOTAL_UNLOCKS, value=sum(unlocks.values()), updated_at=now))
+    for aid, n in unlocks.items():
+        db.merge(AchievementStat(achievement_id=aid, unlock_count=n, updated_at=now))
+    db.commit()
+
+
+def test_workers_agree_on_rarity_version(session_factory):
+    worker_a = RarityCache()
+    worker_b = RarityCache()
+    db = session_factory()
+
+    _set_counts(db, 10, {1: 2})
+    a0 = worker_a.get(db)
+    assert a0.percent(1) == 20.0
+
+    # 新玩家 + 新解鎖之後，B 第一次讀、A 之前讀過：兩邊都要是新的那一版
+    _set_counts(db, 20, {1: 3, 2: 1})
+    a1, b1 = worker_a.get(db), worker_b.get(db)
+    assert (a1.total_users, a1.total_unlocks) == (b1.total_users, b1.total_unlocks) == (20, 4)
+    assert a1.counts == b1.counts == {1: 3, 2: 1}
+    assert a1.percent(1) == b1.percent(1) == 15.0
+
+    # 沒有變化的時候沿用快取
+    assert worker_a.get(db) is a1
+    db.close()
@@ -0,0 +1,43 @@
+# tests/test_level.py
+"""等級曲線查表版跟原本逐級累加的算法結果一致。"""
+from app.services.level import (
+    LEVEL_CONFIG,
+    MAX_LEVEL,
+    calc_level_from_exp,
+    calc_levels_from_exp,
+    cumulative_exp_for_level,
+    get_required_exp_for_level,
+)
+
+
+def _required_by_loop(level: int) -> int:
+    if level >= MAX_LEVEL:
+        return 0
+    for start, end, need in LEVEL_CONFIG:
+        if start <= level <= end:
+            return need
+    return LEVEL_CONFIG[-1][2]
+
+
+def _level_by_loop(total_exp: int) -> int:
+    total_exp = max(0, total_exp or 0)
+    level = 1
+    while level < MAX_LEVEL:
+        need = _required_by_loop(level)
+        if total_exp < need:
+            break
+        total_exp -= need
+        level += 1
+    return level
+
+
+def test_required_exp_matches_loop_including_out_of_range_levels():
+    for level in range(-3, MAX_LEVEL + 3):
+        assert get_required_exp_for_level(level) == _required_by_loop(level), level
+
+
+def test_levels_match_loop_across_the_curve():
+    exps = [None, -5, 0, 99, 100] + list(range(0, cumulative_exp_for_level(MAX_LEVEL) + 2000, 37))
+    expected = [_level_by_loop(e) for e in exps]
+    assert [calc_level_from_exp(e) for e in exps] == expected
+    assert calc_levels_from_exp(exps) == expected
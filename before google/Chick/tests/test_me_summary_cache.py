@@ -0,0 +1,53 @@
+# tests/test_me_summary_cache.py
+"""/me 摘要快取：別的 worker commit 過之後，不能把舊 body 配上新的 ETag。"""
+from datetime import datetime
+
+from app.core.etag import make_etag
+from app.models.user import User
+from app.schemas.economy import MeSummary
+from app.services import user_state
+from app.services.user_state import MeSummaryCache, get_state_version, mark_user_changed
+
+
+def _read_me(db, cache: MeSummaryCache, user_id: int):
+    """照 routers/me.read_me 的順序：先讀 state_version 做 ETag，再拿 body。"""
+    day = datetime.utcnow().date()
+    version = get_state_version(db, user_id)
+    etag = make_etag(user_id, version, "me", day)
+
+    def load():
+        exp = db.query(User.exp).filter(User.id == user_id).scalar()
+        return MeSummary.model_construct(user_id=user_id, exp=int(exp))
+
+    body = cache.get_or_load(user_id, day, version, load)
+    db.rollback()
+    return etag, body
+
+
+def test_other_worker_commit_is_not_served_under_fresh_etag(session_factory, user_id, monkeypatch):
+    worker_a = MeSummaryCache()
+    worker_b = MeSummaryCache()
+    # mark_user_changed / after_commit 只丟得到自己這個 worker 的快取
+    monkeypatch.setattr(user_state, "me_summary_cache", worker_a)
+
+    db = session_factory()
+    etag_a0, body_a0 = _read_me(db, worker_a, user_id)
+    etag_b0, body_b0 = _read_me(db, worker_b, user_id)
+    assert etag_a0 == etag_b0 and body_a0.exp == body_b0.exp == 0
+
+    # worker A 寫入並 commit：state_version +1，只有 A 的快取被丟掉
+    user = db.get(User, user_id)
+    user.exp = 30
+    mark_user_changed(db, user_id)
+    db.commit()
+
+    etag_b1, body_b1 = _read_me(db, worker_b, user_id)
+    assert etag_b1 != etag_b0
+    assert body_b1.exp == 30          # B 的舊 body 版本對不上，重讀
+
+    # 版本沒變的時候還是命中
+    hits = worker_b.hits
+    etag_b2, body_b2 = _read_me(db, worker_b, user_id)
+    assert etag_b2 == etag_b1 and body_b2.exp == 30
+    assert worker_b.hits == hits + 1
+    db.close()
@@ -0,0 +1,43 @@
+# tests/test_store_purchase.py
+"""POST /store/purchase：搶鎖失敗要回可以重試的 503，不是 500。"""
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+import main
+from app.core.db import get_db
+from app.core.deps import get_current_user_id
+from app.models.economy import StoreItem
+from app.services import purchase
+from app.services.catalog import store_catalog
+from app.services.purchase import purchase_metrics
+
+
+def test_lock_wait_timeout_is_retryable(session_factory, user_id, monkeypatch):
+    db = session_factory()
+    db.add(StoreItem(id=1, name="飼料", price_coins=5, exp_min=1, exp_max=2, created_at=datetime.utcnow()))
+    db.commit()
+    db.close()
+    store_catalog.invalidate()
+
+    def get_test_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def lock_wait_timeout(db, uid):
+        raise OperationalError("SELECT ... FOR UPDATE", {}, Exception(1205, "Lock wait timeout exceeded"))
+
+    monkeypatch.setattr(purchase, "lock_balance_row", lock_wait_timeout)
+    monkeypatch.setitem(main.app.dependency_overrides, get_db, get_test_db)
+    monkeypatch.setitem(main.app.dependency_overrides, get_current_user_id, lambda: user_id)
+    lock_errors = purchase_metrics.lock_errors
+
+    r = TestClient(main.app).post("/store/purchase", json={"item_id": 1})
+
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+    assert purchase_metrics.lock_errors == lock_errors + 1
@@ -0,0 +1,62 @@
+# tests/test_weekly_challenges.py
+"""每週挑戰：進度算在哪一週，就在哪一週檢查完成。"""
+from datetime import date, datetime
+
+from app.models.economy import ChallengeTemplate, WeeklyChallenge
+from app.models.user import User
+from app.services import challenges
+from app.services.challenges import (
+    bump_challenge_progress,
+    challenge_template_catalog,
+    check_weekly_challenge,
+    get_week_challenges,
+)
+
+SUNDAY = date(2025, 6, 8)          # 2025-06-02 那週的最後一天
+LAST_WEEK = date(2025, 6, 2)
+THIS_WEEK = date(2025, 6, 9)       # 週一才送出
+
+
+def _seed_weeks(db, user_id: int) -> None:
+    db.add(ChallengeTemplate(
+        id=1, code="weekly_3", title="本週運動 3 次", condition_type="weekly_activity_count",
+        condition_value=3, reward_coins=10, reward_exp=5, active=True, created_at=datetime.utcnow(),
+    ))
+    # 兩週的列都已經由 rollover 建好；上週差一次達標
+    for i, (ws, progress) in enumerate([(LAST_WEEK, 2), (THIS_WEEK, 0)], start=1):
+        db.add(WeeklyChallenge(
+            id=i, user_id=user_id, week_start=ws, template_id=1, title="本週運動 3 次",
+            condition_type="weekly_activity_count", condition_value=3, target_count=3,
+            reward_coins=10, reward_exp=5, progress=progress,
+        ))
+    db.commit()
+    challenge_template_catalog.invalidate()
+
+
+def test_event_across_week_boundary_completes_the_week_it_counted_toward(session_factory, user_id, monkeypatch):
+    # 統計、金幣、EXP 的寫入是 MySQL 專用語法（ON DUPLICATE KEY / INSERT IGNORE），這裡只記下呼叫
+    recorded = []
+    monkeypatch.setattr(
+        challenges, "record_challenge_completions",
+        lambda db, uid, ws, n, **kw: recorded.append((uid, ws, n)),
+    )
+    monkeypatch.setattr(challenges, "add_ledger_entries", lambda db, entries: None)
+    monkeypatch.setattr(challenges, "award_exp", lambda *a, **kw: 0)
+
+    db = session_factory()
+    _seed_weeks(db, user_id)
+
+    # 週日開始、週一才送出的打卡：進度跟檢查都用事件那天
+    bump_challenge_progress(db, user_id, SUNDAY, weekly_activity_count=1)
+    db.commit()
+    user = db.get(User, user_id)
+    done = check_weekly_challenge(db, user, SUNDAY)
+
+    assert [(r.week_start, r.template_id) for r in done] == [(LAST_WEEK, 1)]
+    assert recorded == [(user_id, LAST_WEEK, 1)]
+
+    last_week, = get_week_challenges(db, user_id, LAST_WEEK)
+    this_week, = get_week_challenges(db, user_id, THIS_WEEK)
+    assert last_week.completed_at is not None and int(last_week.progress) == 3
+    assert this_week.completed_at is None and int(this_week.progress) == 0
+    db.close()